@@ -0,0 +1,333 @@
+"""
+A python module that consolidates the ADP of every provider and every ADP snapshot into one consensus ADP per player.
+
+SOURCES:
+- The provider columns of PLAYER_ADPS (PROVIDER_COLUMNS). Its AVG column is left out: it is itself an average of the
+  providers.
+- The PPR ADP of PLAYER_AGE (AGE_FILE_ADP), matched to the other players through player_identity. That file ranks
+  about 2,000 players, defenders and kickers included, so its ADPs only line up with the providers' up to their
+  deepest ADP. A player's PLAYER_AGE row is only used within that depth, or for players no provider lists, and the
+  source has a lower weight than a provider.
+- ADP snapshots: every CSV in the ADP_SNAPSHOTS folder, with 'timestamp', 'player' and 'ADP' columns (one file per
+  scrape, thousands per season). Snapshots are ingested incrementally into ADP_SNAPSHOT_STATE: only the files added
+  since the last run are read, and their points are added to running least-squares sums per player. The 'snapshots'
+  source is a player's fitted ADP at their last snapshot. A changed or removed snapshot file rebuilds the state.
+
+CONSENSUS (one row per player, as matrix operations over a players x sources matrix):
+- ADP: the mean of the player's sources, weighted by SOURCE_WEIGHTS. adpStdDev: the weighted standard deviation of
+  the sources. adpSources: the number of sources. adpLow and adpHigh: the earliest and latest ADP of any source,
+  including the highest and lowest ADP of PLAYER_AGE.
+- adpTrend: the change in ADP per TREND_DAYS, from the least-squares line through the player's snapshots, or through
+  the weekly ADPs of PLAYER_AGE (AGE_FILE_WEEKS) for players with fewer than two snapshot times. A negative trend is a
+  player being drafted earlier.
+
+The consensus is written to CONSENSUS_ADPS. With season_config.ADP_SOURCE set to 'consensus', the compiled tables take
+their 'ADP' column, and so the tier ADP windows, from it.
+"""
+
+
+# Imports
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import build_graph as bg
+import columnar_store as cs
+import player_identity as pi
+import profiler
+import season_config
+import table_schema as sch
+
+
+# Constants
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+PROVIDER_COLUMNS = ['ESPN', 'RTSports', 'MFL', 'Fantrax', 'FFC', 'Sleeper']
+AGE_FILE_ADP = 'AverageDraftPositionPPR'
+AGE_FILE_RANGE = ['HighestADP', 'LowestADP']
+AGE_FILE_WEEKS = ['Week1ADP', 'Week2ADP', 'Week3ADP']
+SNAPSHOT_SOURCE = 'snapshots'
+SOURCE_WEIGHTS = {'ESPN': 1.0, 'RTSports': 1.0, 'MFL': 1.0, 'Fantrax': 1.0, 'FFC': 1.0, 'Sleeper': 1.0, AGE_FILE_ADP: 0.5, SNAPSHOT_SOURCE: 2.0}
+TREND_DAYS = 7
+CONSENSUS_COLUMNS = ['Player', 'ADP', 'adpStdDev', 'adpLow', 'adpHigh', 'adpSources', 'adpTrend']
+SNAPSHOT_COLUMNS = ['timestamp', 'player', 'ADP']
+STATISTIC_COLUMNS = ['count', 'sumT', 'sumTT', 'sumY', 'sumTY']
+STATE_COLUMNS = ['player'] + STATISTIC_COLUMNS + ['lastT']
+
+
+def line_statistics(rows: np.ndarray, times: np.ndarray, values: np.ndarray, row_count: int) -> np.ndarray:
+    """
+    Sum, per player, the statistics of a least-squares line through their (time, ADP) points. The sums of two sets of
+    points are the sums of the statistics of each set.
+
+    :param rows: An int array of the player of every point.
+    :param times: A float array of the time of every point, in days.
+    :param values: A float array of the ADP of every point, with NaN for missing points.
+    :param row_count: An integer representing the number of players.
+    :return: A float array with one row per player and one column per STATISTIC_COLUMNS.
+    """
+    present = ~np.isnan(values)
+    rows, times, values = rows[present], times[present], values[present]
+    weights = [np.ones(len(rows)), times, times * times, values, times * values]
+    return np.stack([np.bincount(rows, weights=weight, minlength=row_count) for weight in weights], axis=1)
+
+
+def fitted_line(statistics: np.ndarray) -> tuple:
+    """
+    Fit the least-squares line of every player from their statistics.
+
+    :param statistics: A float array returned by line_statistics.
+    :return: A tuple containing float arrays of slopes (NaN for fewer than two distinct times) and of mean ADPs.
+    """
+    count, sum_t, sum_tt, sum_y, sum_ty = statistics.T
+    spread = count * sum_tt - sum_t * sum_t
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(spread > 1e-9 * np.maximum(count * sum_tt, 1), (count * sum_ty - sum_t * sum_y) / spread, np.nan)
+        return slope, np.where(count > 0, sum_y / count, np.nan)
+
+
+def weighted_consensus(matrix: np.ndarray, weights: np.ndarray) -> tuple:
+    """
+    Combine the ADP of every source into a weighted consensus, for every player at once.
+
+    :param matrix: A float array with one row per player and one column per source, NaN where a source has no ADP.
+    :param weights: A float array with one weight per source.
+    :return: A tuple containing float arrays of the consensus ADP and of its weighted standard deviation (NaN for
+             players without a source), and an int array of the number of sources.
+    """
+    present = ~np.isnan(matrix)
+    player_weights = np.where(present, weights, 0.0)
+    values = np.where(present, matrix, 0.0)
+    total = player_weights.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        consensus = (player_weights * values).sum(axis=1) / total
+        variance = (player_weights * (values - consensus[:, None]) ** 2).sum(axis=1) / total
+    return consensus, np.sqrt(variance), present.sum(axis=1)
+
+
+def aligned_rows(universe: pd.Series, names: pd.Series) -> tuple:
+    """
+    Find the row of every name in a list of players, adding the names that match no player. When a source lists a
+    player more than once, only its first row is kept, as the datapoint merges do.
+
+    :param universe: A series of the player names found so far.
+    :param names: A series of player names, spelled by another source.
+    :return: A tuple containing an int array with the row of the kept rows of names, an int array with the player row
+             of every kept row, and the extended series of player names.
+    """
+    names = names.reset_index(drop=True)
+    positions, _ = pi.PlayerIdentityIndex(universe, 'player').resolve(names)
+    added = np.flatnonzero(positions == -1)
+    codes, new_names = pd.factorize(names.iloc[added])
+    positions[added] = len(universe.index) + codes
+    _, kept = np.unique(positions, return_index=True)
+    kept.sort()
+    return kept, positions[kept], pd.concat([universe, pd.Series(new_names)], ignore_index=True)
+
+
+def snapshot_days(timestamps: pd.Series) -> np.ndarray:
+    """
+    Turn snapshot timestamps into days since the Unix epoch.
+
+    :param timestamps: A series of ISO 8601 timestamps.
+    :return: A float array.
+    """
+    parsed = pd.to_datetime(timestamps, utc=True, format='ISO8601')
+    return ((parsed - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64)
+
+
+def empty_state() -> pd.DataFrame:
+    """
+    Create the snapshot state of a season without snapshots.
+
+    :return: A DataFrame with the STATE_COLUMNS and no rows.
+    """
+    return pd.DataFrame({column: pd.Series(dtype='str' if column == 'player' else np.float64) for column in STATE_COLUMNS})
+
+
+def state_statistics(state: pd.DataFrame) -> np.ndarray:
+    """
+    Return the least-squares statistics of a snapshot state as a float array.
+
+    :param state: A DataFrame with the STATE_COLUMNS.
+    :return: A float array with one row per player and one column per STATISTIC_COLUMNS.
+    """
+    return np.column_stack([sch.column_values(state[column]).astype(np.float64) for column in STATISTIC_COLUMNS]).reshape(len(state.index), len(STATISTIC_COLUMNS))
+
+
+def ingest_snapshots(snapshot_folder: str, state_file: str, index_file: str) -> tuple:
+    """
+    Add the snapshot files created since the last run to the snapshot state of a season.
+
+    :param snapshot_folder: A string containing the name of the folder of snapshot CSVs.
+    :param state_file: A string containing the name of the CSV holding the statistics of every player.
+    :param index_file: A string containing the name of the JSON file listing the ingested snapshot files.
+    :return: A tuple containing the state DataFrame and the number of snapshot files read.
+    """
+    listing = {}
+    if os.path.isdir(snapshot_folder):
+        for name in sorted(os.listdir(snapshot_folder)):
+            if name.endswith('.csv'):
+                stat = os.stat(os.path.join(snapshot_folder, name))
+                listing[name] = [stat.st_mtime_ns, stat.st_size]
+    index = {'origin': None, 'files': {}}
+    if os.path.exists(index_file) and os.path.exists(state_file):
+        with open(index_file) as file:
+            index = json.load(file)
+    if any(listing.get(name) != signature for name, signature in index['files'].items()):
+        index = {'origin': None, 'files': {}}
+    state = cs.read_table(state_file, index_col=0) if index['files'] else empty_state()
+    added = [name for name in listing if name not in index['files']]
+    if not added and os.path.exists(state_file):
+        return state, 0
+
+    if added:
+        with profiler.stage(f'ingest {len(added)} ADP snapshots', 'read') as details:
+            points = pd.concat([pd.read_csv(os.path.join(snapshot_folder, name), usecols=SNAPSHOT_COLUMNS) for name in added], ignore_index=True)
+            days = snapshot_days(points['timestamp'])
+            if index['origin'] is None:
+                index['origin'] = float(np.nanmin(days, initial=np.inf)) if len(days) else 0.0
+            times = days - index['origin']
+            players = pd.Index(state['player'].astype(str))
+            new_players = pd.Index(points['player'].astype(str).unique()).difference(players, sort=False)
+            players = players.append(new_players)
+            rows = players.get_indexer(points['player'].astype(str))
+            statistics = np.zeros((len(players), len(STATISTIC_COLUMNS)))
+            statistics[:len(state.index)] = state_statistics(state)
+            statistics += line_statistics(rows, times, points['ADP'].to_numpy(dtype=np.float64, na_value=np.nan), len(players))
+            last = np.full(len(players), -np.inf)
+            last[:len(state.index)] = sch.column_values(state['lastT']).astype(np.float64)
+            np.maximum.at(last, rows, times)
+            state = pd.DataFrame(statistics, columns=STATISTIC_COLUMNS).assign(lastT=last)
+            state.insert(0, 'player', players.to_numpy())
+            details['rowsOut'] = len(points.index)
+    index['files'] = listing
+    os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+    cs.write_table(state, state_file)
+    with open(index_file, 'w') as file:
+        json.dump(index, file)
+    return state, len(added)
+
+
+def consolidate(adp_table: pd.DataFrame, age_table: pd.DataFrame, state: pd.DataFrame, weights: dict=SOURCE_WEIGHTS) -> pd.DataFrame:
+    """
+    Build the consensus ADP of every player listed by a source.
+
+    :param adp_table: A DataFrame containing PLAYER_ADPS, with 'Player' and the PROVIDER_COLUMNS.
+    :param age_table: A DataFrame containing PLAYER_AGE, with 'Name', AGE_FILE_ADP, AGE_FILE_RANGE and AGE_FILE_WEEKS.
+    :param state: A DataFrame returned by ingest_snapshots.
+    :param weights: A dictionary mapping source names to weights (default SOURCE_WEIGHTS)
+    :return: A DataFrame with the CONSENSUS_COLUMNS, one row per player with an ADP, sorted by ADP.
+    """
+    players = pd.Series(adp_table['Player'].astype(str).unique())
+    adp_kept, adp_rows, players = aligned_rows(players, adp_table['Player'].astype(str))
+    age_kept, age_rows, players = aligned_rows(players, age_table['Name'].astype(str))
+    snapshot_kept, snapshot_rows, players = aligned_rows(players, state['player'].astype(str))
+
+    sources = [column for column in PROVIDER_COLUMNS if column in adp_table.columns] + [AGE_FILE_ADP, SNAPSHOT_SOURCE]
+    matrix = np.full((len(players.index), len(sources)), np.nan)
+    for source_index, column in enumerate(sources[:-2]):
+        matrix[adp_rows, source_index] = sch.column_values(adp_table[column]).astype(np.float64)[adp_kept]
+    age_adps = sch.column_values(age_table[AGE_FILE_ADP]).astype(np.float64)[age_kept]
+    provider_adps = matrix[age_rows, :-2]
+    deepest = np.where(np.isnan(matrix[:, :-2]), -np.inf, matrix[:, :-2]).max(initial=-np.inf)
+    aligned = (age_adps <= deepest) | np.isnan(provider_adps).all(axis=1)
+    age_kept, age_rows = age_kept[aligned], age_rows[aligned]
+    matrix[age_rows, -2] = age_adps[aligned]
+    statistics = state_statistics(state)[snapshot_kept]
+    snapshot_slope, snapshot_mean = fitted_line(statistics)
+    count, sum_t = statistics[:, 0], statistics[:, 1]
+    with np.errstate(invalid='ignore'):
+        fitted = np.where(np.isnan(snapshot_slope), snapshot_mean, snapshot_mean + snapshot_slope * (sch.column_values(state['lastT']).astype(np.float64)[snapshot_kept] - sum_t / np.maximum(count, 1)))
+    matrix[snapshot_rows, -1] = fitted
+    consensus, dispersion, source_count = weighted_consensus(matrix, np.array([weights.get(source, 1.0) for source in sources]))
+
+    ranges = np.full((len(players.index), len(AGE_FILE_RANGE)), np.nan)
+    ranges[age_rows] = np.column_stack([sch.column_values(age_table[column]).astype(np.float64) for column in AGE_FILE_RANGE])[age_kept]
+    extremes = np.concatenate([matrix, ranges], axis=1)
+    present = ~np.isnan(extremes)
+    low = np.where(present, extremes, np.inf).min(axis=1)
+    high = np.where(present, extremes, -np.inf).max(axis=1)
+
+    weekly = np.full((len(players.index), len(AGE_FILE_WEEKS)), np.nan)
+    weekly[age_rows] = np.column_stack([sch.column_values(age_table[column]).astype(np.float64) for column in AGE_FILE_WEEKS])[age_kept]
+    week_days = np.tile(np.arange(len(AGE_FILE_WEEKS), dtype=np.float64) * 7, len(players.index))
+    week_slope, _ = fitted_line(line_statistics(np.repeat(np.arange(len(players.index)), len(AGE_FILE_WEEKS)), week_days, weekly.ravel(), len(players.index)))
+    trend = week_slope
+    trend[snapshot_rows] = np.where(np.isnan(snapshot_slope), week_slope[snapshot_rows], snapshot_slope)
+
+    consolidated = pd.DataFrame({
+        'Player': players.to_numpy(),
+        'ADP': np.round(consensus, sch.FLOAT32_DECIMALS),
+        'adpStdDev': np.round(dispersion, sch.FLOAT32_DECIMALS),
+        'adpLow': np.where(np.isfinite(low), low, np.nan),
+        'adpHigh': np.where(np.isfinite(high), high, np.nan),
+        'adpSources': source_count,
+        'adpTrend': np.round(trend * TREND_DAYS, sch.FLOAT32_DECIMALS),
+    })
+    consolidated = consolidated[consolidated['ADP'].notna().to_numpy()]
+    return consolidated.sort_values('ADP', kind='stable').reset_index(drop=True)[CONSENSUS_COLUMNS]
+
+
+def build_consensus(files: dict=SEASON_FILES, weights: dict=SOURCE_WEIGHTS, manifest: dict=None) -> tuple:
+    """
+    Ingest the new ADP snapshots of a season, then create its consensus ADP CSV, unless it was already built from the
+    current sources and weights.
+
+    :param files: A dictionary returned by season_config.season_files (default SEASON_FILES)
+    :param weights: A dictionary mapping source names to weights (default SOURCE_WEIGHTS)
+    :param manifest: A build manifest shared with the other pipelines, or None to load and save the manifest file (default None)
+    :return: A tuple containing True if the consensus CSV was rebuilt (otherwise False), the snapshot state DataFrame
+             and the number of snapshot files ingested.
+    """
+    with profiler.stage('adp_consensus'):
+        state, snapshot_count = ingest_snapshots(files['ADP_SNAPSHOTS'], files['ADP_SNAPSHOT_STATE'], files['ADP_SNAPSHOT_INDEX'])
+        build_manifest = bg.load_manifest() if manifest is None else manifest
+        consensus_file = files['CONSENSUS_ADPS']
+        inputs = [files['PLAYER_ADPS'], files['PLAYER_AGE'], files['ADP_SNAPSHOT_STATE']]
+        parameters = {'weights': weights, 'trend_days': TREND_DAYS}
+        if not bg.is_stale(build_manifest, consensus_file, inputs, parameters):
+            return False, state, snapshot_count
+        adp_table = cs.read_table(files['PLAYER_ADPS'])
+        age_table = cs.read_table(files['PLAYER_AGE'], usecols=['Name', AGE_FILE_ADP] + AGE_FILE_RANGE + AGE_FILE_WEEKS)
+        with profiler.stage('consolidate ADP', 'merge', len(adp_table.index)) as details:
+            consolidated = sch.apply_schema(consolidate(adp_table, age_table, state, weights))
+            details['rowsOut'] = len(consolidated.index)
+        # Written without its index, like the provider CSVs, so datapoint specs index its columns the same way.
+        consolidated.to_csv(consensus_file, index=False)
+        if cs.ENABLED:
+            cs.write_sidecar(consolidated, consensus_file)
+        bg.record(build_manifest, consensus_file, inputs, parameters)
+        if manifest is None:
+            bg.save_manifest(build_manifest)
+        return True, state, snapshot_count
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Consolidate the ADP of every provider and snapshot into a consensus ADP.')
+    parser.add_argument('--weight', action = 'append', default = [], metavar = 'SOURCE=WEIGHT', help = f'The weight of a source, one of {", ".join(SOURCE_WEIGHTS)}.')
+    arguments = parser.parse_args()
+    weights = dict(SOURCE_WEIGHTS)
+    for argument in arguments.weight:
+        source, _, weight = argument.partition('=')
+        if source not in weights:
+            parser.error(f'Unknown source {source!r}')
+        weights[source] = float(weight)
+
+    start = time.perf_counter()
+    rebuilt, state, snapshot_count = build_consensus(SEASON_FILES, weights)
+    elapsed = time.perf_counter() - start
+    consolidated = cs.read_table(SEASON_FILES['CONSENSUS_ADPS'])
+    print(f'{snapshot_count} new snapshot files ingested, {len(state.index)} players with snapshots')
+    print(f'{SEASON_FILES["CONSENSUS_ADPS"]}: {len(consolidated.index)} players ({"built" if rebuilt else "up to date"}) in {elapsed:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
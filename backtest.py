@@ -0,0 +1,248 @@
+"""
+A python module that backtests the breakout tiers by sweeping grids of thresholds against labelled outcomes.
+
+GRID FORMAT:
+- The grid JSON maps tier names from breakout_rules.json to a dictionary of threshold paths and candidate values.
+- A threshold path is 'adp.0' or 'adp.1' (the ADP window bounds), 'all.<i>' (the i-th condition of 'all'), or
+  'any.<i>.<j>' (the j-th condition of the i-th clause of 'any').
+- Candidate values are either a list, or a dictionary with 'start', 'stop' and 'step' (stop inclusive).
+
+REQUIREMENTS FOR THE OUTCOMES CSV:
+- The CSV must have a 'player' column and a 'brokeOut' column containing 1 for players that broke out and 0 otherwise.
+- Players are matched to the outcomes CSV like the pipeline's joins (see player_identity), using its team column if it
+  has one. Players without an outcome are reported and left out of the sweep rather than counted as players that did
+  not break out.
+"""
+
+
+# Imports
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import merge_dataframes as md
+import rule_engine
+import season_config
+import table_schema as sch
+
+
+# Constants
+YEAR = season_config.YEAR
+BACKTEST_GRID = './backtest_grid.json'
+BACKTEST_FOLDER = f"{season_config.season_files(YEAR)['CALCULATIONS_FOLDER']}/backtests"
+BATCH_SIZE = 4096
+TOP_RESULTS = 100
+
+# Worker state, set once per process by initialize_worker.
+_WORKER_STATE = {}
+
+
+def grid_values(candidates) -> np.ndarray:
+    """
+    Expand the candidate values of a threshold.
+
+    :param candidates: A list of values, or a dictionary with 'start', 'stop' and 'step'.
+    :return: A float64 array containing the candidate values.
+    """
+    if isinstance(candidates, dict):
+        count = int(round((candidates['stop'] - candidates['start']) / candidates['step'])) + 1
+        return candidates['start'] + candidates['step'] * np.arange(count, dtype='float64')
+    return np.asarray(candidates, dtype='float64')
+
+
+def condition_paths(tier_spec: dict) -> list:
+    """
+    List every condition of a tier with its threshold path and the clause it belongs to.
+
+    :param tier_spec: A dictionary describing a tier.
+    :return: A list of (path, clause, condition) tuples, where clause is None for conditions that must all hold.
+    """
+    minimum, maximum = tier_spec.get('adp', [None, None])
+    conditions = [('adp.0', None, ['ADP', '>=', minimum]), ('adp.1', None, ['ADP', '<=', maximum])]
+    conditions += [(f'all.{index}', None, condition) for index, condition in enumerate(tier_spec.get('all', []))]
+    for clause_index, clause in enumerate(tier_spec.get('any', [])):
+        conditions += [(f'any.{clause_index}.{index}', clause_index, condition) for index, condition in enumerate(clause)]
+    return conditions
+
+
+def prepare_sweep(dataframe: pd.DataFrame, tier_spec: dict, features: dict, grid: dict) -> dict:
+    """
+    Evaluate every condition of a tier once, as a single row for fixed thresholds or one row per candidate threshold.
+
+    :param dataframe: A DataFrame containing compiled player data.
+    :param tier_spec: A dictionary describing a tier.
+    :param features: A dictionary mapping feature names to formulas.
+    :param grid: A dictionary mapping threshold paths to candidate values.
+    :return: A dictionary describing the sweep, used by evaluate_batch.
+    """
+    arrays = rule_engine.column_arrays(dataframe, [tier_spec], features)
+    arrays.setdefault('ADP', dataframe['ADP'].to_numpy(dtype='float64', na_value=np.nan))
+    row_count = len(dataframe.index)
+    paths = list(grid)
+    unknown = set(paths) - {path for path, _, _ in condition_paths(tier_spec)}
+    if unknown:
+        raise ValueError(f'Unknown threshold paths: {sorted(unknown)}')
+    required = np.ones(row_count, dtype=bool)
+    clauses = {index: np.ones(row_count, dtype=bool) for index in range(len(tier_spec.get('any', [])))}
+    swept = []
+    for path, clause, (column, comparison, value) in condition_paths(tier_spec):
+        compare = rule_engine.COMPARISONS[comparison]
+        if path in grid:
+            values = grid_values(grid[path])
+            swept.append((paths.index(path), clause, compare(arrays[column][np.newaxis, :], values[:, np.newaxis])))
+        elif value is not None:
+            target = required if clause is None else clauses[clause]
+            target &= compare(arrays[column], value)
+    return {
+        'shape': tuple(len(grid_values(grid[path])) for path in paths),
+        'required': required,
+        'clauses': clauses,
+        'swept': swept,
+    }
+
+
+def evaluate_batch(sweep: dict, labels: np.ndarray, start: int, stop: int) -> tuple:
+    """
+    Score a contiguous range of threshold combinations at once.
+
+    :param sweep: A dictionary returned by prepare_sweep.
+    :param labels: A boolean array, True for players that broke out.
+    :param start: An integer representing the first combination to score.
+    :param stop: An integer representing the combination to stop before.
+    :return: A tuple of int arrays containing the number of flagged players and true positives for each combination.
+    """
+    choices = np.unravel_index(np.arange(start, stop), sweep['shape'])
+    selected = np.broadcast_to(sweep['required'], (stop - start, len(labels))).copy()
+    clauses = {index: np.broadcast_to(mask, selected.shape).copy() for index, mask in sweep['clauses'].items()}
+    for parameter, clause, matrix in sweep['swept']:
+        target = selected if clause is None else clauses[clause]
+        target &= matrix[choices[parameter]]
+    if clauses:
+        matched = np.zeros(selected.shape, dtype=bool)
+        for mask in clauses.values():
+            matched |= mask
+        selected &= matched
+    return np.count_nonzero(selected, axis=1), np.count_nonzero(selected & labels, axis=1)
+
+
+def initialize_worker(sweep: dict, labels: np.ndarray) -> None:
+    """
+    Store the sweep in a worker process, so that it is sent once per process rather than once per batch.
+
+    :param sweep: A dictionary returned by prepare_sweep.
+    :param labels: A boolean array, True for players that broke out.
+    """
+    _WORKER_STATE['sweep'] = sweep
+    _WORKER_STATE['labels'] = labels
+
+
+def evaluate_range(bounds: tuple) -> tuple:
+    """
+    Score a range of threshold combinations in a worker process, in batches of BATCH_SIZE.
+
+    :param bounds: A tuple containing the first combination and the combination to stop before.
+    :return: A tuple of int arrays containing the number of flagged players and true positives for each combination.
+    """
+    start, stop = bounds
+    results = [
+        evaluate_batch(_WORKER_STATE['sweep'], _WORKER_STATE['labels'], batch_start, min(batch_start + BATCH_SIZE, stop))
+        for batch_start in range(start, stop, BATCH_SIZE)
+    ]
+    return np.concatenate([flagged for flagged, _ in results]), np.concatenate([hits for _, hits in results])
+
+
+def sweep_tier(dataframe: pd.DataFrame, labels: np.ndarray, tier_spec: dict, features: dict, grid: dict, jobs: int=1) -> pd.DataFrame:
+    """
+    Score every combination of candidate thresholds for a tier.
+
+    :param dataframe: A DataFrame containing compiled player data for the tier's position.
+    :param labels: A boolean array, True for players that broke out.
+    :param tier_spec: A dictionary describing a tier.
+    :param features: A dictionary mapping feature names to formulas.
+    :param grid: A dictionary mapping threshold paths to candidate values.
+    :param jobs: An integer representing the number of worker processes to use (default 1)
+    :return: A DataFrame with a column per threshold path, 'flagged', 'truePositives', 'precision' and 'recall'.
+    """
+    sweep = prepare_sweep(dataframe, tier_spec, features, grid)
+    combinations = int(np.prod(sweep['shape']))
+    chunk = max(BATCH_SIZE, -(-combinations // (jobs * 4)))
+    bounds = [(start, min(start + chunk, combinations)) for start in range(0, combinations, chunk)]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initialize_worker, initargs=(sweep, labels)) as executor:
+            results = list(executor.map(evaluate_range, bounds))
+    else:
+        initialize_worker(sweep, labels)
+        results = [evaluate_range(bound) for bound in bounds]
+    flagged = np.concatenate([flagged for flagged, _ in results])
+    hits = np.concatenate([hits for _, hits in results])
+    choices = np.unravel_index(np.arange(combinations), sweep['shape'])
+    scores = pd.DataFrame({path: grid_values(grid[path])[choices[index]] for index, path in enumerate(grid)})
+    scores['flagged'] = flagged
+    scores['truePositives'] = hits
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores['precision'] = hits / flagged
+        scores['recall'] = hits / max(int(labels.sum()), 1)
+    return scores
+
+
+def outcome_labels(dataframe: pd.DataFrame, outcomes_csv: str) -> tuple:
+    """
+    Match players to their labelled outcome through the same identity index as the pipeline's joins.
+
+    :param dataframe: A DataFrame containing compiled player data, with a 'player' column.
+    :param outcomes_csv: A string containing the name of the outcomes CSV.
+    :return: A tuple containing a boolean array, True for players that broke out, a boolean array, True for players
+             with an outcome, and a DataFrame reporting the players that did not match exactly (see
+             player_identity.PlayerIdentityIndex.resolve).
+    """
+    outcomes = pd.read_csv(outcomes_csv)
+    outcome_teams = md.team_column(outcomes.columns, 'player')
+    index = md.identity_index(outcomes['player'], None if outcome_teams is None else outcomes[outcome_teams])
+    player_teams = md.team_column(dataframe.columns, 'player')
+    report = []
+    labelled = md.join_datapoints(dataframe[['player'] + ([] if player_teams is None else [player_teams])].copy(), outcomes, 'player', {'brokeOut': 'brokeOut'}, index = index, report = report)
+    known = labelled['brokeOut'].notna().to_numpy()
+    return labelled['brokeOut'].fillna(0).to_numpy() == 1, known, report[0]
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Sweep threshold grids for the breakout tiers.')
+    parser.add_argument('--features', action = 'append', required = True, metavar = 'POSITION=CSV', help = 'A compiled feature CSV for a position, e.g. WR=./2021_data/compiled_wr_data.csv')
+    parser.add_argument('--outcomes', required = True, help = 'A CSV with player and brokeOut columns.')
+    parser.add_argument('--grid', default = BACKTEST_GRID, help = 'A JSON file mapping tiers to threshold grids.')
+    parser.add_argument('--rules', default = rule_engine.RULES_FILE, help = 'The rule specification to start from.')
+    parser.add_argument('--jobs', type = int, default = os.cpu_count(), help = 'The number of worker processes.')
+    parser.add_argument('--top', type = int, default = TOP_RESULTS, help = 'The number of best combinations to keep per tier.')
+    arguments = parser.parse_args()
+
+    rules = rule_engine.load_rules(arguments.rules)
+    feature_files = dict(argument.split('=', 1) for argument in arguments.features)
+    with open(arguments.grid) as file:
+        grids = json.load(file)
+    if not os.path.exists(BACKTEST_FOLDER):
+        os.makedirs(BACKTEST_FOLDER)
+
+    for tier_name, grid in grids.items():
+        tier_spec = rules['tiers'][tier_name]
+        if tier_spec['position'] not in feature_files:
+            continue
+        dataframe = sch.apply_schema(pd.read_csv(feature_files[tier_spec['position']], low_memory = True))
+        labels, known, report = outcome_labels(dataframe, arguments.outcomes)
+        missing = report[report['status'].isin(['unmatched', 'ambiguous'])]
+        if len(missing.index):
+            print(f"{tier_name}: {len(missing.index):,} players without an outcome left out: {', '.join(missing['identifier'].astype('str'))}")
+        scores = sweep_tier(dataframe[known].reset_index(drop=True), labels[known], tier_spec, rules['features'], grid, arguments.jobs)
+        scores = scores.sort_values(['precision', 'recall'], ascending=False, kind='stable').head(arguments.top)
+        scores.reset_index(drop=True).to_csv(os.path.join(BACKTEST_FOLDER, f'{tier_name}.csv'))
+        print(f'{tier_name}: {int(np.prod([len(grid_values(values)) for values in grid.values()])):,} combinations scored')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+A python module that analyzes several seasons, for several league configurations, in a single process.
+
+Every season's position data is stacked into one DataFrame with a 'season' column, so that merges and tier masks run
+once over all seasons rather than once per season. Sources shared by every season (the same file name) are parsed
+and joined once. Other sources are matched against each season's own file, then joined in one pass over the stacked
+seasons (see merge_dataframes.add_grouped_datapoints). Batch runs always rebuild.
+
+SOURCES CONFIG (optional JSON):
+- Maps a season to a dictionary of season_config file keys and file names, e.g. {"2023": {"PLAYER_AGE": "./age.csv"}}.
+
+LEAGUES CONFIG (optional JSON):
+- A list of {"name": ..., "rules": ...} dictionaries, where rules is a rule specification like breakout_rules.json.
+- The league named 'default' writes to the season's calculations folder; other leagues write to a subfolder of it.
+"""
+
+
+# Imports
+import argparse
+import json
+import os
+
+import pandas as pd
+
+import adp_consensus as ac
+import columnar_store as cs
+import fantasy_football_analyzer as ffa
+import merge_dataframes as md
+import rule_engine
+import season_config
+import table_schema as sch
+
+
+# Constants
+SEASON_COLUMN = 'season'
+DEFAULT_LEAGUE = 'default'
+DEFAULT_LEAGUES = [{'name': DEFAULT_LEAGUE, 'rules': rule_engine.RULES_FILE}]
+
+
+def league_file(file_name: str, league: str) -> str:
+    """
+    Return the name of a calculations file for a league.
+
+    :param file_name: A string containing the name of the file for the default league.
+    :param league: A string naming the league.
+    :return: A string containing the name of the file for the league.
+    """
+    if league == DEFAULT_LEAGUE:
+        return file_name
+    return os.path.join(os.path.dirname(file_name), league, os.path.basename(file_name))
+
+
+def compile_seasons(position_pipeline: tuple, files_by_season: dict, table_cache: md.SourceTableCache) -> pd.DataFrame:
+    """
+    Create one DataFrame containing the compiled position data of every season, sorted by season and ADP.
+
+    :param position_pipeline: A tuple from fantasy_football_analyzer.POSITION_PIPELINES.
+    :param files_by_season: A dictionary mapping seasons to dictionaries returned by season_config.season_files.
+    :param table_cache: A SourceTableCache used to read the source CSVs.
+    :return: A DataFrame with a 'season' column.
+    """
+    _, main_key, necessary_columns, datapoint_specs, _, _, _ = position_pipeline
+    primary_dataframe = pd.concat([
+        cs.read_table(files[main_key], usecols = necessary_columns).assign(**{SEASON_COLUMN: season})
+        for season, files in files_by_season.items()
+    ], ignore_index=True)
+    for file_key, identifier_index, added_indexes, base_index in datapoint_specs:
+        paths = {season: files[file_key] for season, files in files_by_season.items()}
+        if len(set(paths.values())) == 1:
+            primary_dataframe = md.add_extra_datapoints_bulk(primary_dataframe, next(iter(paths.values())), identifier_index, added_indexes, base_index = base_index, table_cache = table_cache)
+        else:
+            primary_dataframe = md.add_grouped_datapoints(primary_dataframe, paths, identifier_index, added_indexes, SEASON_COLUMN, base_index = base_index, table_cache = table_cache)
+    primary_dataframe = sch.apply_schema(primary_dataframe)
+    primary_dataframe = primary_dataframe.sort_values([SEASON_COLUMN, 'ADP'], kind='stable')
+    primary_dataframe = primary_dataframe.dropna(subset=['ADP'])
+    return primary_dataframe.reset_index(drop=True)
+
+
+def split_seasons(dataframe: pd.DataFrame, seasons: list) -> dict:
+    """
+    Split a stacked DataFrame into one DataFrame per season, without the 'season' column.
+
+    :param dataframe: A DataFrame with a 'season' column.
+    :param seasons: A list of the seasons to return, including seasons with no rows.
+    :return: A dictionary mapping seasons to DataFrames.
+    """
+    positions = dataframe.groupby(SEASON_COLUMN, sort=False).indices
+    season_rows = dataframe.drop(columns=SEASON_COLUMN)
+    return {season: season_rows.iloc[positions.get(season, [])].reset_index(drop=True) for season in seasons}
+
+
+def analyze_seasons(compiled: pd.DataFrame, position_pipeline: tuple, files_by_season: dict, leagues: list) -> dict:
+    """
+    Evaluate every tier of a position for every league over the stacked seasons, and create each tier CSV.
+
+    :param compiled: A DataFrame returned by compile_seasons.
+    :param position_pipeline: A tuple from fantasy_football_analyzer.POSITION_PIPELINES.
+    :param files_by_season: A dictionary mapping seasons to dictionaries returned by season_config.season_files.
+    :param leagues: A list of (league name, rule specification) tuples.
+    :return: A dictionary mapping (season, league) to lists of (position, file_name, DataFrame) tuples.
+    """
+    position, _, _, _, _, _, tiers = position_pipeline
+    output_columns = [column for column in compiled.columns if column in ffa.OUTPUT_COLUMNS]
+    seasons = list(files_by_season)
+    tier_results = {(season, league): [] for season in seasons for league, _ in leagues}
+    for league, rules in leagues:
+        tier_specs = [rules['tiers'][tier_name] for _, tier_name in tiers]
+        arrays = rule_engine.column_arrays(compiled, tier_specs, rules['features'])
+        for (file_key, _), tier_spec in zip(tiers, tier_specs):
+            mask = rule_engine.compile_tier(tier_spec, rules['features'])(arrays)
+            qualified_players = compiled.loc[mask, output_columns + [SEASON_COLUMN]]
+            for season, season_players in split_seasons(qualified_players, seasons).items():
+                file_name = league_file(files_by_season[season][file_key], league)
+                os.makedirs(os.path.dirname(file_name), exist_ok=True)
+                cs.write_table(season_players, file_name)
+                tier_results[(season, league)].append((position, file_name, season_players))
+    return tier_results
+
+
+def run_batch(seasons: list, leagues: list=DEFAULT_LEAGUES, overrides: dict=None, table_cache: md.SourceTableCache=None) -> None:
+    """
+    Create the compiled, tier and master CSVs of several seasons and leagues.
+
+    :param seasons: A list of integers representing the seasons to analyze.
+    :param leagues: A list of {'name': ..., 'rules': ...} dictionaries (default DEFAULT_LEAGUES)
+    :param overrides: A dictionary mapping seasons to file overrides for season_config.season_files (default None)
+    :param table_cache: A SourceTableCache shared by every season, or None to create one (default None)
+    :return: None.
+    """
+    overrides = overrides or {}
+    files_by_season = {season: season_config.season_files(season, overrides.get(season)) for season in seasons}
+    league_rules = [(league['name'], rule_engine.load_rules(league['rules'])) for league in leagues]
+    table_cache = table_cache or md.SourceTableCache()
+    if season_config.ADP_SOURCE == 'consensus':
+        for files in files_by_season.values():
+            ac.build_consensus(files)
+    for position_pipeline in ffa.POSITION_PIPELINES:
+        for files in files_by_season.values():
+            table_cache.request_datapoints(season_config.resolve_datapoints(position_pipeline[3], files))
+
+    tier_results = {(season, league): [] for season in seasons for league, _ in league_rules}
+    for position_pipeline in ffa.POSITION_PIPELINES:
+        compiled = compile_seasons(position_pipeline, files_by_season, table_cache)
+        for season, season_compiled in split_seasons(compiled, seasons).items():
+            cs.write_table(season_compiled, files_by_season[season][position_pipeline[4]])
+        for key, results in analyze_seasons(compiled, position_pipeline, files_by_season, league_rules).items():
+            tier_results[key].extend(results)
+
+    for (season, league), results in tier_results.items():
+        ffa.all_breakout_players(results, league_file(files_by_season[season]['ALL_BREAKOUT_PLAYER_FILE'], league))
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Identify breakout players for several seasons and leagues in one run.')
+    parser.add_argument('--seasons', type = int, nargs = '+', default = [season_config.YEAR], help = 'The seasons to analyze.')
+    parser.add_argument('--sources', help = 'A JSON file mapping seasons to source file overrides.')
+    parser.add_argument('--leagues', help = 'A JSON file listing league names and rule specifications.')
+    arguments = parser.parse_args()
+
+    overrides = {}
+    if arguments.sources:
+        with open(arguments.sources) as file:
+            overrides = {int(season): files for season, files in json.load(file).items()}
+    leagues = DEFAULT_LEAGUES
+    if arguments.leagues:
+        with open(arguments.leagues) as file:
+            leagues = json.load(file)
+    run_batch(arguments.seasons, leagues, overrides)
+
+
+if __name__ == '__main__':
+    main()
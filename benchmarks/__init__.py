@@ -0,0 +1,3 @@
+"""
+Benchmarks of the pipeline, run from the repository root with python -m benchmarks.<module>.
+"""
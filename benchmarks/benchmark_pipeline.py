@@ -0,0 +1,233 @@
+"""
+A python module that benchmarks every stage of the pipeline, and the full main(), on synthetic leagues of several sizes.
+
+Run from the repository root with: python -m benchmarks.benchmark_pipeline --sizes 1k 10k 100k
+
+Each size runs in its own workspace (a generated season and a copy of the rules) from a clean build. Stage times come
+from the profiler, so they use the same stage names as --profile. The fastest of several repeats is kept. The weekly
+ingestion (weekly_ingestion.build_recent_tables) runs after main(), as its own WEEKLY_STAGE.
+
+BASELINES:
+- --save-baseline stores the results in benchmarks/baselines/<name>.json, named after the current commit by default.
+- --compare <name> prints the ratio of every stage to a saved baseline and exits with status 1 if any stage that took
+  at least MINIMUM_COMPARED_SECONDS in the baseline became more than --threshold times slower.
+"""
+
+
+# Imports
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+import fantasy_football_analyzer as ffa
+import profiler
+import qb_analysis as qba
+import rb_analysis as rba
+import rule_engine
+import season_config
+import table_schema as sch
+import weekly_ingestion as wi
+import wr_analysis as wra
+from benchmarks import data_generators as dg
+
+
+# Constants
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+WORKSPACE_FOLDER = os.path.join(BENCHMARK_FOLDER, '.workspaces')
+BASELINE_FOLDER = os.path.join(BENCHMARK_FOLDER, 'baselines')
+DEFAULT_SIZES = ['1k', '10k', '100k']
+REPEATS = 3
+REGRESSION_THRESHOLD = 1.25
+MINIMUM_COMPARED_SECONDS = 0.01
+MAIN_STAGE = 'main()'
+WEEKLY_STAGE = 'weekly_ingestion'
+RECENT_FILE_KEYS = [f'{prefix}_{position}_{suffix}' for prefix, suffix in [('RECENT', 'STATS'), ('COMPILED_RECENT', 'DATA')] for position in ['RB', 'WR', 'QB']]
+
+# Legacy filters, by compiled file key: (filter function, relevant columns)
+LEGACY_FILTERS = {
+    'COMPILED_RB_DATA': [
+        (rba.remove_non_legendary_rbs, rba.LEGENDARY_RB_REL_COLUMNS),
+        (rba.remove_deadzone_rbs, rba.DEADZONE_RB_REL_COLUMNS),
+        (rba.remove_non_hero_rb_pairs, rba.HERO_RB_REL_COLUMNS),
+    ],
+    'COMPILED_WR_DATA': [(wra.remove_non_breakout_wr, wra.BREAKOUT_WR_REL_COLUMNS)],
+    'COMPILED_QB_DATA': [(qba.remove_non_breakout_qbs, qba.MUST_DRAFT_QB_REL_COLUMNS)],
+}
+
+
+def prepare_workspace(size: str, seed: int) -> str:
+    """
+    Create the workspace of a league size, with a generated season and a copy of the rules.
+
+    :param size: A key of data_generators.SIZES.
+    :param seed: An integer used to seed the data generator.
+    :return: A string containing the absolute name of the workspace folder.
+    """
+    workspace = os.path.join(WORKSPACE_FOLDER, f'{size}-{seed}')
+    files = season_config.season_files()
+    dg.generate_season(os.path.join(workspace, files['DATA_FOLDER']), dg.SIZES[size], seed)
+    shutil.copy(os.path.join(dg.REPOSITORY_FOLDER, rule_engine.RULES_FILE), workspace)
+    return workspace
+
+
+def clean_workspace() -> None:
+    """
+    Remove everything the pipeline built in the current workspace, so that the next run starts from a clean build.
+    """
+    files = season_config.season_files()
+    for file_key in ['COMPILED_RB_DATA', 'COMPILED_WR_DATA', 'COMPILED_QB_DATA', 'RB_IDENTITY_REPORT', 'WR_IDENTITY_REPORT', 'QB_IDENTITY_REPORT'] + RECENT_FILE_KEYS:
+        if os.path.exists(files[file_key]):
+            os.remove(files[file_key])
+    for folder in [files['CALCULATIONS_FOLDER'], ffa.cs.COLUMNAR_CACHE_FOLDER]:
+        shutil.rmtree(folder, ignore_errors=True)
+    if os.path.exists(ffa.bg.MANIFEST_FILE):
+        os.remove(ffa.bg.MANIFEST_FILE)
+
+
+def stage_times() -> dict:
+    """
+    Total the wall time of the recorded stages by their path, such as 'create_rb_csv / merge data_player_adp.csv'.
+
+    :return: A dictionary mapping stage paths to seconds.
+    """
+    times, path = {}, []
+    for depth, event in profiler.nested_events():
+        path = path[:depth] + [event['name']]
+        name = ' / '.join(path)
+        times[name] = times.get(name, 0.0) + event['dur'] / 1e6
+    return times
+
+
+def run_pipeline(workspace: str, jobs: int) -> dict:
+    """
+    Run main() from a clean build in a workspace, then run the legacy filters on the compiled CSVs and the weekly ingestion.
+
+    :param workspace: A string containing the name of the workspace folder.
+    :param jobs: An integer representing the number of pipeline tasks to run at once.
+    :return: A dictionary mapping stage paths, and MAIN_STAGE, to seconds.
+    """
+    directory, arguments = os.getcwd(), sys.argv
+    os.chdir(workspace)
+    try:
+        clean_workspace()
+        sys.argv = ['fantasy_football_analyzer.py', '--jobs', str(jobs)]
+        profiler.enable(trace_memory=False)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ffa.main()
+        main_seconds = time.perf_counter() - start
+        files = season_config.season_files()
+        for file_key, filters in LEGACY_FILTERS.items():
+            for remove_players, rel_columns in filters:
+                player_candidates = sch.apply_schema(pd.read_csv(files[file_key], usecols = rel_columns, low_memory = True))
+                with profiler.stage(f'legacy {remove_players.__name__}', 'filter', len(player_candidates.index)):
+                    remove_players(player_candidates)
+        with profiler.stage(WEEKLY_STAGE):
+            wi.build_recent_tables()
+        times = stage_times()
+        times[MAIN_STAGE] = main_seconds
+        return times
+    finally:
+        profiler.disable()
+        sys.argv = arguments
+        os.chdir(directory)
+
+
+def benchmark_size(size: str, seed: int, repeats: int, jobs: int) -> dict:
+    """
+    Benchmark a league size several times and keep the fastest time of every stage.
+
+    :param size: A key of data_generators.SIZES.
+    :param seed: An integer used to seed the data generator.
+    :param repeats: An integer representing the number of runs.
+    :param jobs: An integer representing the number of pipeline tasks to run at once.
+    :return: A dictionary mapping stage paths to seconds.
+    """
+    workspace = prepare_workspace(size, seed)
+    runs = [run_pipeline(workspace, jobs) for _ in range(repeats)]
+    return {stage: min(run.get(stage, float('inf')) for run in runs) for stage in runs[0]}
+
+
+def current_commit() -> str:
+    """
+    Return the abbreviated hash of the checked-out commit.
+
+    :return: A string, or 'unknown' outside a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=dg.REPOSITORY_FOLDER, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def format_results(results: dict, baseline: dict=None, threshold: float=REGRESSION_THRESHOLD) -> tuple:
+    """
+    Describe the results of every size, compared to a baseline if there is one.
+
+    :param results: A dictionary mapping sizes to dictionaries mapping stage paths to seconds.
+    :param baseline: A dictionary with the same layout as results, or None (default None)
+    :param threshold: A float representing the slowdown ratio reported as a regression (default REGRESSION_THRESHOLD)
+    :return: A tuple containing the description and a list of (size, stage, ratio) tuples for every regression.
+    """
+    lines, regressions = [], []
+    for size, times in results.items():
+        lines.append(f'{size} players' + ('' if baseline is None else f'{"baseline":>{78 - len(size)}}{"ratio":>10}'))
+        for stage, seconds in times.items():
+            line = f'  {stage[:66]:<66}{seconds:>9.3f}s'
+            previous = (baseline or {}).get(size, {}).get(stage)
+            if previous is not None:
+                ratio = seconds / previous if previous > 0 else float('inf')
+                regressed = previous >= MINIMUM_COMPARED_SECONDS and ratio > threshold
+                line += f'{previous:>9.3f}s{ratio:>9.2f}x' + ('  REGRESSION' if regressed else '')
+                if regressed:
+                    regressions.append((size, stage, ratio))
+            lines.append(line)
+    return '\n'.join(lines), regressions
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Benchmark the pipeline on synthetic leagues.')
+    parser.add_argument('--sizes', nargs = '+', choices = list(dg.SIZES), default = DEFAULT_SIZES, help = 'The league sizes to benchmark.')
+    parser.add_argument('--seed', type = int, default = dg.SEED, help = 'The seed of the data generator.')
+    parser.add_argument('--repeat', type = int, default = REPEATS, help = 'The number of runs per size; the fastest is kept.')
+    parser.add_argument('--jobs', type = int, default = 1, help = 'The number of pipeline tasks to run at once.')
+    parser.add_argument('--save-baseline', nargs = '?', const = '', metavar = 'NAME', help = 'Save the results as a baseline, named after the current commit by default.')
+    parser.add_argument('--compare', metavar = 'NAME', help = 'Compare the results to a saved baseline.')
+    parser.add_argument('--threshold', type = float, default = REGRESSION_THRESHOLD, help = 'The slowdown ratio reported as a regression.')
+    arguments = parser.parse_args()
+
+    results = {size: benchmark_size(size, arguments.seed, arguments.repeat, arguments.jobs) for size in arguments.sizes}
+    baseline = None
+    if arguments.compare:
+        with open(os.path.join(BASELINE_FOLDER, f'{arguments.compare}.json')) as file:
+            baseline = json.load(file)['results']
+    description, regressions = format_results(results, baseline, arguments.threshold)
+    print(description)
+
+    if arguments.save_baseline is not None:
+        name = arguments.save_baseline or current_commit()
+        os.makedirs(BASELINE_FOLDER, exist_ok=True)
+        metadata = {'commit': current_commit(), 'seed': arguments.seed, 'repeat': arguments.repeat, 'jobs': arguments.jobs,
+                    'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine()}
+        with open(os.path.join(BASELINE_FOLDER, f'{name}.json'), 'w') as file:
+            json.dump({'metadata': metadata, 'results': results}, file, indent=4)
+        print(f'Saved baseline {name!r}')
+    if regressions:
+        print(f'{len(regressions)} stage(s) regressed by more than {arguments.threshold:.2f}x')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+A python module that benchmarks player_identity on the identifiers of a large source, a share of them misspelled.
+
+Run from the repository root with: python -m benchmarks.benchmark_player_identity
+
+Every misspelled name has one plain typo (one letter deleted, inserted or replaced, or two neighbouring letters swapped)
+in its first name or surname, the way a provider might misspell it. Misspelled names must go through the approximate
+stage, so the benchmark times the full resolve: the exact and normalized lookups and the approximate matching. It also
+reports how many misspelled names were resolved to their own player, reported as ambiguous (another player's name is
+just as close) or resolved to another player. Before timing, it checks that players missing from a source stay
+unmatched when a near-namesake is listed (NEAR_NAMESAKES), and that real misspellings and short forms still match.
+"""
+
+
+# Imports
+import argparse
+import string
+import time
+
+import numpy as np
+import pandas as pd
+
+import player_identity as pi
+from benchmarks import data_generators as dg
+
+
+# Constants
+PLAYER_COUNT = 100_000
+TYPO_SHARES = [0.01, 0.05]
+NAME_NUMBERS = 24_300_000
+SEED = 2022
+NEAR_NAMESAKES = pd.DataFrame({
+    'source': ['Josh Ross', 'Ty Johnson', 'Darwin Thompson', 'Dile Rebrimi', 'Mike Thomas', 'Malcolm Brown', 'Joshua Kelley'],
+    'sourceTeam': ['NYG', 'BUF', 'KC', 'DAL', 'CIN', 'LAR', 'LAC'],
+    'identifier': ['John Ross', 'Tyler Johnson', 'Darian Thompson', 'Dale Rebrimi', 'Michael Thomas', 'Malcom Brown', 'Josh Kelley'],
+    'team': ['NYG', 'BUF', 'KC', 'SEA', 'NO', 'LAR', 'LAC'],
+    'status': ['unmatched', 'unmatched', 'unmatched', 'unmatched', 'unmatched', 'approximate', 'approximate'],
+})
+
+
+def misspell(name: str, generator: np.random.Generator) -> str:
+    """
+    Add one plain typo to a name, away from the space between its words.
+
+    :param name: A string containing a name.
+    :param generator: A numpy random Generator.
+    :return: A string containing the misspelled name.
+    """
+    positions = [position for position in range(len(name) - 1) if name[position] != ' ' and name[position + 1] != ' ']
+    position = positions[generator.integers(len(positions))]
+    letter = string.ascii_lowercase[generator.integers(len(string.ascii_lowercase))]
+    kind = generator.integers(4)
+    if kind == 0:
+        return name[:position] + name[position + 1:]
+    if kind == 1:
+        return name[:position] + letter + name[position:]
+    if kind == 2:
+        return name[:position] + letter + name[position + 1:]
+    return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+
+
+def check_near_namesakes() -> None:
+    """
+    Check that players missing from a source are not matched to a near-namesake it lists, with and without teams, and
+    that misspellings and short forms of listed players are matched.
+    """
+    index = pi.PlayerIdentityIndex(NEAR_NAMESAKES['source'], teams = NEAR_NAMESAKES['sourceTeam'])
+    for teams in [NEAR_NAMESAKES['team'], None]:
+        positions, report = index.resolve(NEAR_NAMESAKES['identifier'], teams)
+        expected = NEAR_NAMESAKES['status'].to_numpy()
+        if teams is None:
+            # Without teams, only the team tells these players apart from the listed ones.
+            expected = np.where(NEAR_NAMESAKES['identifier'].isin(['Dale Rebrimi', 'Michael Thomas']), 'approximate', expected)
+        assert np.array_equal(report['status'].to_numpy(dtype=object), expected), report
+        assert np.array_equal(positions, np.where(expected == 'approximate', np.arange(len(expected)), -1))
+
+
+def create_identifiers(player_count: int, typo_share: float, seed: int=SEED) -> tuple:
+    """
+    Create the player names of a source and the same names as another provider spells them, in another order.
+
+    :param player_count: An integer representing the number of players.
+    :param typo_share: A float representing the share of names with a typo.
+    :param seed: An integer used to seed the random number generator.
+    :return: A tuple containing a series of source names, a series of identifiers to resolve, an array of the source
+             row of every identifier, and a boolean array marking the misspelled identifiers.
+    """
+    generator = np.random.default_rng(seed)
+    names = dg.player_names(generator.permutation(NAME_NUMBERS)[:player_count])
+    rows = generator.permutation(player_count)
+    identifiers = names[rows]
+    misspelled = generator.random(player_count) < typo_share
+    identifiers[misspelled] = [misspell(name, generator) for name in identifiers[misspelled]]
+    misspelled &= identifiers != names[rows]
+    return pd.Series(names), pd.Series(identifiers), rows, misspelled
+
+
+def main() -> None:
+    """
+    Execute the benchmark and print the build and resolve times and the resolution of the misspelled names.
+    """
+    parser = argparse.ArgumentParser(description = 'Benchmark player identity resolution on misspelled names.')
+    parser.add_argument('--players', type = int, default = PLAYER_COUNT, help = 'The number of players in the source.')
+    parser.add_argument('--typo-shares', type = float, nargs = '+', default = TYPO_SHARES, help = 'The shares of misspelled names.')
+    arguments = parser.parse_args()
+
+    check_near_namesakes()
+    print(f'Players: {arguments.players:,}')
+    for typo_share in arguments.typo_shares:
+        names, identifiers, rows, misspelled = create_identifiers(arguments.players, typo_share)
+        start = time.perf_counter()
+        index = pi.PlayerIdentityIndex(names)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        positions, report = index.resolve(identifiers)
+        resolve_seconds = time.perf_counter() - start
+
+        # Every correctly spelled name must resolve exactly.
+        assert np.array_equal(positions[~misspelled], rows[~misspelled])
+        resolved = positions[misspelled] == rows[misspelled]
+        unresolved = positions[misspelled] == -1
+        print(f'{typo_share:.0%} misspelled ({misspelled.sum():,} names): index {build_seconds:.3f}s, resolve {resolve_seconds:.3f}s')
+        print(f'  resolved {resolved.mean():.2%}, ambiguous or unmatched {unresolved.mean():.2%}, '
+              f'another player {(~resolved & ~unresolved).mean():.2%} ({report["status"].value_counts().to_dict()})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+A python module that generates seeded, synthetic seasons of player data at any league size.
+
+Every generated CSV has the columns, column order, types and missing-value rates of the real CSV it imitates, because
+its rows are drawn (with replacement) from the real CSV and only the identifiers are replaced. Players are shared
+between files the way they are in the real data: every statistics player may have an ADP, an age and PFF grades, a
+small share of them is spelled differently by the ADP and age providers, and the age file lists many extra players.
+
+The weekly files, which have no real counterpart in the repository, spread every statistics player's season over
+random weeks: weekly counts are Poisson draws around their season average, and weekly grades vary around their season
+grade.
+"""
+
+
+# Imports
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import season_config
+
+
+# Constants
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILES = {key: os.path.join(REPOSITORY_FOLDER, name) for key, name in season_config.season_files().items()}
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+SEED = 2022
+GENERATED_MARKER = 'generated.json'
+
+# Shares of the statistics players by position.
+POSITION_FILES = {'RB': 'MAIN_RB_CSV', 'WR': 'MAIN_WR_CSV', 'QB': 'MAIN_QB_CSV'}
+POSITION_SHARES = {'RB': 0.35, 'WR': 0.49, 'QB': 0.16}
+
+# Shares of the statistics players listed by each player file, by position.
+ADP_SHARE = 0.65
+AGE_SHARE = 0.95
+AGE_EXTRA_PLAYERS = 1.0
+GRADE_SHARES = {
+    'PLAYER_RUSH_GRADES': {'RB': 0.9, 'WR': 0.05, 'QB': 0.5},
+    'PLAYER_REC_GRADE': {'RB': 0.6, 'WR': 0.9},
+    'PLAYER_PASS_GRADE': {'QB': 0.95},
+}
+RESPELLED_SHARE = 0.02
+
+# Weekly files: the season grade of every weekly grade, as (file key, column), and the spread of weekly values.
+WEEKS = 17
+WEEKLY_GRADES = {
+    'rushGrade': ('PLAYER_RUSH_GRADES', 'grades_run'),
+    'recGrade': ('PLAYER_REC_GRADE', 'grades_pass_route'),
+    'offenseGrade': ('PLAYER_PASS_GRADE', 'grades_offense'),
+}
+WEEKLY_GRADE_SPREAD = 8.0
+WEEKLY_DEPTH_SPREAD = 2.0
+FORCED_MISSED_TACKLE_RATE = 0.15
+WEEKLY_PLAYER_COLUMNS = ['player', 'team', 'position', 'week', 'recTarg', 'rushCarries', 'forcedMissedTackles', 'depthAim', 'rushGrade', 'recGrade', 'offenseGrade']
+
+# Synthetic names are built from syllables: 900 first names and 27,000 surnames.
+SYLLABLES = ['ka', 'ro', 'mi', 'ta', 'le', 'jo', 'da', 'vi', 'na', 'sha', 'ty', 're', 'ma', 'co', 'bri',
+             'an', 'el', 'is', 'ja', 'de', 'qu', 'lo', 'ne', 'sa', 'ri', 'to', 'ke', 'la', 'mo', 'di']
+NAME_MULTIPLIER = 7919
+
+
+def player_names(numbers: np.ndarray) -> np.ndarray:
+    """
+    Turn distinct player numbers into distinct names.
+
+    :param numbers: An int array of distinct numbers below 24,300,000.
+    :return: An object array of names.
+    """
+    syllables = np.array(SYLLABLES, dtype=object)
+    first_names = np.array([(first + second).capitalize() for first in syllables for second in syllables], dtype=object)
+    surnames = np.array([(first + second + third).capitalize() for first in syllables for second in syllables for third in syllables], dtype=object)
+    # Spread consecutive numbers over every surname; NAME_MULTIPLIER is coprime with the number of names.
+    numbers = (numbers.astype(np.int64) * NAME_MULTIPLIER) % (len(first_names) * len(surnames))
+    return first_names[numbers % len(first_names)] + ' ' + surnames[numbers // len(first_names)]
+
+
+def respell(names: np.ndarray, generator: np.random.Generator) -> np.ndarray:
+    """
+    Spell a share of the names the way another provider might, by adding a suffix.
+
+    :param names: An object array of names.
+    :param generator: A numpy random Generator.
+    :return: An object array of names.
+    """
+    names = names.copy()
+    respelled = generator.random(len(names)) < RESPELLED_SHARE
+    names[respelled] = names[respelled] + ' Jr.'
+    return names
+
+
+def sample_rows(template: pd.DataFrame, count: int, generator: np.random.Generator) -> pd.DataFrame:
+    """
+    Draw rows from a template with replacement.
+
+    :param template: A DataFrame containing a real CSV.
+    :param count: An integer representing the number of rows to draw.
+    :param generator: A numpy random Generator.
+    :return: A DataFrame with count rows and the template's columns.
+    """
+    return template.iloc[generator.integers(0, len(template.index), count)].reset_index(drop=True)
+
+
+def listed_players(players: dict, shares: dict, generator: np.random.Generator) -> np.ndarray:
+    """
+    Choose the statistics players a file lists.
+
+    :param players: A dictionary mapping positions to object arrays of names.
+    :param shares: A dictionary mapping positions to the share of their players listed.
+    :param generator: A numpy random Generator.
+    :return: An object array of names, in random order.
+    """
+    names = np.concatenate([names[generator.random(len(names)) < shares.get(position, 0)] for position, names in players.items()])
+    return names[generator.permutation(len(names))]
+
+
+def player_file(template: pd.DataFrame, names: np.ndarray, name_column: str, generator: np.random.Generator) -> pd.DataFrame:
+    """
+    Create a player file listing the given players, ranked in order if the template has a 'Rank' column.
+
+    :param template: A DataFrame containing a real CSV.
+    :param names: An object array of names.
+    :param name_column: A string naming the template's player column.
+    :param generator: A numpy random Generator.
+    :return: A DataFrame.
+    """
+    dataframe = sample_rows(template, len(names), generator)
+    dataframe[name_column] = names
+    if 'Rank' in dataframe.columns:
+        dataframe['Rank'] = np.arange(1, len(names) + 1)
+    return dataframe
+
+
+def played_weeks(games: np.ndarray, generator: np.random.Generator) -> tuple:
+    """
+    Choose the distinct weeks every player played, as many as their games.
+
+    :param games: An int array of the number of games of every player, between 0 and WEEKS.
+    :param generator: A numpy random Generator.
+    :return: A tuple containing an int array of player positions and an int array of weeks (starting at 1), one per
+             game, sorted by player then week.
+    """
+    ranks = np.argsort(np.argsort(generator.random((len(games), WEEKS)), axis=1), axis=1)
+    players, weeks = np.nonzero(ranks < games[:, None])
+    return players, weeks + 1
+
+
+def weekly_files(files: dict, generator: np.random.Generator) -> tuple:
+    """
+    Spread the season of every statistics player over the weeks they played.
+
+    :param files: A dictionary mapping file keys to the generated DataFrames of the season files.
+    :param generator: A numpy random Generator.
+    :return: A tuple containing the weekly player DataFrame and the weekly team DataFrame.
+    """
+    player_weeks = []
+    for position, file_key in POSITION_FILES.items():
+        season = files[file_key]
+        games = season['games'].fillna(0).to_numpy(dtype=np.int64).clip(0, WEEKS)
+        players, weeks = played_weeks(games, generator)
+        per_game = games[players].clip(1, None)
+        weekly = pd.DataFrame({
+            'player': season['player'].to_numpy()[players],
+            'team': season['team'].to_numpy()[players],
+            'position': position,
+            'week': weeks,
+        })
+        for column in ['recTarg', 'rushCarries']:
+            totals = season[column].fillna(0).to_numpy(dtype=np.float64).clip(0, None) if column in season.columns else np.zeros(len(games))
+            weekly[column] = generator.poisson(totals[players] / per_game)
+        weekly['forcedMissedTackles'] = generator.poisson(weekly['rushCarries'].to_numpy() * FORCED_MISSED_TACKLE_RATE)
+        weekly['depthAim'] = np.nan
+        if 'depthAim' in season.columns:
+            weekly['depthAim'] = np.round(season['depthAim'].to_numpy(dtype=np.float64)[players] + generator.normal(0, WEEKLY_DEPTH_SPREAD, len(players)), 1)
+        for column, (grade_key, grade_column) in WEEKLY_GRADES.items():
+            grades = files[grade_key].drop_duplicates('player').set_index('player')[grade_column].reindex(season['player']).to_numpy(dtype=np.float64)
+            weekly[column] = np.round(grades[players] + generator.normal(0, WEEKLY_GRADE_SPREAD, len(players)), 1).clip(0, 100)
+        player_weeks.append(weekly)
+
+    teams = files['TEAM_TARGETS']
+    team_weeks = pd.DataFrame({
+        'team': np.repeat(teams['Team'].to_numpy(), WEEKS),
+        'week': np.tile(np.arange(1, WEEKS + 1), len(teams.index)),
+        'teamTargets': generator.poisson(np.repeat(teams['Total Targets'].to_numpy(dtype=np.float64), WEEKS) / WEEKS),
+    })
+    return pd.concat(player_weeks, ignore_index=True)[WEEKLY_PLAYER_COLUMNS], team_weeks
+
+
+def generate_season(data_folder: str, player_count: int, seed: int=SEED) -> None:
+    """
+    Write a synthetic season of every data file used by the pipeline, unless the folder already holds that season.
+
+    :param data_folder: A string containing the name of the folder to write the CSVs to.
+    :param player_count: An integer representing the number of players with statistics.
+    :param seed: An integer used to seed the random number generator (default SEED)
+    """
+    marker = os.path.join(data_folder, GENERATED_MARKER)
+    parameters = {'players': player_count, 'seed': seed, 'weeks': WEEKS}
+    if os.path.exists(marker):
+        with open(marker) as file:
+            if json.load(file) == parameters:
+                return
+    os.makedirs(data_folder, exist_ok=True)
+    generator = np.random.default_rng(seed)
+    templates = {key: pd.read_csv(TEMPLATE_FILES[key]) for key in season_config.DATA_FILES if key.startswith(('TEAM_', 'PLAYER_', 'MAIN_'))}
+    files = {}
+
+    # Statistics players, and the extra players only listed by the age file.
+    extra_count = int(player_count * AGE_EXTRA_PLAYERS)
+    names = player_names(generator.permutation(player_count + extra_count))
+    counts = np.floor(np.cumsum([0] + list(POSITION_SHARES.values())) * player_count).astype(int)
+    players = {position: names[start:stop] for position, start, stop in zip(POSITION_SHARES, counts[:-1], counts[1:])}
+    for position, file_key in POSITION_FILES.items():
+        files[file_key] = player_file(templates[file_key], players[position], 'player', generator)
+
+    # Player files, which list a share of the statistics players, partly spelled differently.
+    adp_names = respell(listed_players(players, dict.fromkeys(players, ADP_SHARE), generator), generator)
+    files['PLAYER_ADPS'] = player_file(templates['PLAYER_ADPS'], adp_names, 'Player', generator)
+    age_names = respell(listed_players(players, dict.fromkeys(players, AGE_SHARE), generator), generator)
+    age_names = np.concatenate([age_names, names[player_count:]])
+    files['PLAYER_AGE'] = player_file(templates['PLAYER_AGE'], age_names[generator.permutation(len(age_names))], 'Name', generator)
+    for file_key, shares in GRADE_SHARES.items():
+        files[file_key] = player_file(templates[file_key], listed_players(players, shares, generator), 'player', generator)
+
+    # Team files, which always list the same 32 teams.
+    for file_key in ['TEAM_OL_RANK', 'TEAM_TARGETS']:
+        template = templates[file_key]
+        files[file_key] = sample_rows(template, len(template.index), generator).assign(Team=template['Team'].to_numpy())
+
+    # Weekly files, drawn last so that the season files do not depend on them.
+    files['WEEKLY_PLAYER_STATS'], files['WEEKLY_TEAM_STATS'] = weekly_files(files, generator)
+
+    for file_key, dataframe in files.items():
+        dataframe.to_csv(os.path.join(data_folder, season_config.DATA_FILES[file_key]), index=False)
+    with open(marker, 'w') as file:
+        json.dump(parameters, file)
@@ -0,0 +1,106 @@
+"""
+A python module that tracks the inputs of every generated CSV, so that only the CSVs whose inputs changed are rebuilt.
+
+The manifest records, for every artifact, a key built from the content hashes of its input files and its parameters.
+File hashes are cached by modification time and size, so unchanged files are not re-read to be hashed.
+"""
+
+
+# Imports
+import hashlib
+import json
+import os
+
+
+# Constants
+MANIFEST_FILE = './.build_manifest.json'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def load_manifest(manifest_file: str=MANIFEST_FILE) -> dict:
+    """
+    Read the build manifest, or create an empty one if it does not exist.
+
+    :param manifest_file: A string containing the name of the manifest file (default MANIFEST_FILE)
+    :return: A dictionary with 'files' (cached file hashes) and 'artifacts' (artifact keys).
+    """
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as file:
+            return json.load(file)
+    return {'files': {}, 'artifacts': {}}
+
+
+def save_manifest(manifest: dict, manifest_file: str=MANIFEST_FILE) -> None:
+    """
+    Write the build manifest.
+
+    :param manifest: A dictionary returned by load_manifest.
+    :param manifest_file: A string containing the name of the manifest file (default MANIFEST_FILE)
+    """
+    with open(manifest_file, 'w') as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
+
+
+def file_hash(manifest: dict, path: str) -> str:
+    """
+    Return the SHA-256 hash of a file's contents, reusing the cached hash if the file has not been modified.
+
+    :param manifest: A dictionary returned by load_manifest.
+    :param path: A string containing the name of the file.
+    :return: A string containing the hex digest.
+    """
+    stat = os.stat(path)
+    path = os.path.normpath(path)
+    cached = manifest['files'].get(path)
+    if cached is not None and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        return cached['hash']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    manifest['files'][path] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest.hexdigest()}
+    return digest.hexdigest()
+
+
+def artifact_key(manifest: dict, inputs: list, parameters) -> str:
+    """
+    Build a key identifying the exact inputs and parameters of an artifact.
+
+    :param manifest: A dictionary returned by load_manifest.
+    :param inputs: A list containing the names of the files the artifact is built from.
+    :param parameters: Any JSON-serializable value describing how the artifact is built.
+    :return: A string containing the hex digest of the key.
+    """
+    description = {
+        'inputs': {os.path.normpath(path): file_hash(manifest, path) for path in inputs},
+        'parameters': parameters,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def is_stale(manifest: dict, artifact: str, inputs: list, parameters) -> bool:
+    """
+    Check whether an artifact is missing or was built from different inputs or parameters.
+
+    :param manifest: A dictionary returned by load_manifest.
+    :param artifact: A string containing the name of the artifact file.
+    :param inputs: A list containing the names of the files the artifact is built from.
+    :param parameters: Any JSON-serializable value describing how the artifact is built.
+    :return: True if the artifact must be rebuilt, otherwise False.
+    """
+    if not os.path.exists(artifact):
+        return True
+    return manifest['artifacts'].get(os.path.normpath(artifact)) != artifact_key(manifest, inputs, parameters)
+
+
+def record(manifest: dict, artifact: str, inputs: list, parameters) -> None:
+    """
+    Record that an artifact was rebuilt from its current inputs and parameters.
+
+    :param manifest: A dictionary returned by load_manifest.
+    :param artifact: A string containing the name of the artifact file.
+    :param inputs: A list containing the names of the files the artifact is built from.
+    :param parameters: Any JSON-serializable value describing how the artifact is built.
+    """
+    manifest['files'].pop(os.path.normpath(artifact), None)
+    manifest['artifacts'][os.path.normpath(artifact)] = artifact_key(manifest, inputs, parameters)
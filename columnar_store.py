@@ -0,0 +1,148 @@
+"""
+A python module that keeps a typed, columnar (Arrow/Feather) copy of every CSV the pipeline reads or writes.
+
+The CSV files remain the source of truth and the human-readable export. When pyarrow is installed, each CSV gets a
+Feather sidecar in COLUMNAR_CACHE_FOLDER, which is read memory-mapped with only the requested columns. Sidecars are
+rebuilt whenever their CSV is newer, and are skipped entirely when pyarrow is not installed or ENABLED is False.
+Every table is typed by table_schema when it is read, so sidecars store the compact column types.
+"""
+
+
+# Imports
+import os
+import threading
+
+import pandas as pd
+
+import table_schema as sch
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+    feather = None
+    ipc = None
+
+
+# Constants
+COLUMNAR_CACHE_FOLDER = './.columnar_cache'
+ENABLED = feather is not None
+
+
+def sidecar_path(csv_name: str) -> str:
+    """
+    Return the name of the Feather sidecar for a CSV.
+
+    :param csv_name: A string containing the name of the CSV.
+    :return: A string containing the name of the Feather file.
+    """
+    relative_name = os.path.relpath(os.path.abspath(csv_name))
+    if relative_name.startswith('..'):
+        relative_name = os.path.abspath(csv_name).lstrip(os.sep)
+    return os.path.join(COLUMNAR_CACHE_FOLDER, relative_name + '.feather')
+
+
+def is_fresh(csv_name: str) -> bool:
+    """
+    Check whether the Feather sidecar of a CSV exists and is at least as new as the CSV.
+
+    :param csv_name: A string containing the name of the CSV.
+    :return: True if the sidecar can be read in place of the CSV, otherwise False.
+    """
+    path = sidecar_path(csv_name)
+    return os.path.exists(path) and os.stat(path).st_mtime_ns >= os.stat(csv_name).st_mtime_ns
+
+
+def write_sidecar(dataframe: pd.DataFrame, csv_name: str) -> None:
+    """
+    Write a DataFrame to the Feather sidecar of a CSV.
+
+    :param dataframe: A DataFrame containing the data columns of the CSV.
+    :param csv_name: A string containing the name of the CSV.
+    """
+    path = sidecar_path(csv_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    dataframe.reset_index(drop=True).to_feather(temporary_path)
+    os.replace(temporary_path, path)
+
+
+def read_table(csv_name: str, usecols: list=None, index_col=None, row_filter: tuple=None) -> pd.DataFrame:
+    """
+    Read the data columns of a CSV, from its Feather sidecar when one is available, typed by table_schema.
+
+    :param csv_name: A string containing the name of the CSV.
+    :param usecols: A list of column names or column indexes to read, or None to read every column (default None)
+    :param index_col: The index column of the CSV, for CSVs written with their index such as by write_table (default None)
+    :param row_filter: A tuple containing a list of column names and a function that takes a DataFrame of those
+                       columns and returns a boolean array of the rows to keep, or None to keep every row (default None).
+                       With a sidecar, only the rows kept are converted to pandas.
+    :return: A DataFrame, with a default index.
+    """
+    if not ENABLED:
+        filter_columns = [] if row_filter is None or usecols is None else [column for column in row_filter[0] if column not in usecols]
+        dataframe = pd.read_csv(csv_name, usecols = None if usecols is None else list(usecols) + filter_columns, index_col = index_col, low_memory = True)
+        dataframe = sch.apply_schema(dataframe if index_col is None else dataframe.reset_index(drop=True))
+        if row_filter is not None:
+            dataframe = dataframe[row_filter[1](dataframe[row_filter[0]])].drop(columns = filter_columns).reset_index(drop=True)
+        return dataframe
+    if not is_fresh(csv_name):
+        dataframe = pd.read_csv(csv_name, index_col = index_col, low_memory = True)
+        write_sidecar(sch.apply_schema(dataframe), csv_name)
+    path = sidecar_path(csv_name)
+    columns = None
+    if usecols is not None:
+        names = ipc.open_file(path).schema.names
+        columns = [names[column] if isinstance(column, int) else column for column in usecols]
+        columns = [name for name in names if name in columns]
+    if row_filter is None:
+        # Sidecars written before a schema change are typed again; columns that already have their type are kept as is.
+        return sch.apply_schema(feather.read_feather(path, columns = columns, memory_map = True))
+    filter_columns, keep_rows = row_filter
+    table = feather.read_table(path, memory_map = True)
+    keep = keep_rows(sch.apply_schema(table.select(filter_columns).to_pandas()))
+    table = table.select(columns or table.column_names).filter(pa.array(keep))
+    return sch.apply_schema(table.to_pandas())
+
+
+def write_table(dataframe: pd.DataFrame, csv_name: str) -> None:
+    """
+    Write a DataFrame to a CSV (with its index, as the pipeline always has) and to the CSV's Feather sidecar.
+
+    :param dataframe: A DataFrame.
+    :param csv_name: A string containing the name of the CSV.
+    """
+    dataframe.to_csv(csv_name)
+    if ENABLED:
+        write_sidecar(dataframe, csv_name)
+
+
+def write_table_chunks(chunks, csv_name: str) -> int:
+    """
+    Write a sequence of DataFrames as one table to a CSV and its Feather sidecar, holding a single chunk in memory.
+
+    :param chunks: An iterable of DataFrames with the same columns, where the first chunk may be empty.
+    :param csv_name: A string containing the name of the CSV.
+    :return: An integer representing the number of rows written.
+    """
+    row_count = 0
+    writer = None
+    path = sidecar_path(csv_name)
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(csv_name, 'w', newline='') as csv_file:
+        for chunk_number, chunk in enumerate(chunks):
+            chunk = chunk.set_axis(range(row_count, row_count + len(chunk.index)))
+            chunk.to_csv(csv_file, header = chunk_number == 0)
+            row_count += len(chunk.index)
+            if ENABLED:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = ipc.new_file(temporary_path, table.schema)
+                writer.write_table(table)
+    if writer is not None:
+        writer.close()
+        os.replace(temporary_path, path)
+    return row_count
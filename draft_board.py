@@ -0,0 +1,340 @@
+"""
+A python module that keeps the breakout tiers of a live draft up to date as players are drafted and ADPs move.
+
+Every tier is evaluated once over the compiled tables with the pipeline's rule engine. After that, a pick or an ADP
+change re-evaluates only the player it concerns, on a single row of the tier masks, and updates the board in
+O(log n): the board is a heap of (ADP, tier, row) entries per position plus one across positions, with lazy deletion.
+A drafted player's entries, or the old entries of a player whose ADP moved, stay in the heaps until they reach the top
+and are discarded there. The heaps are rebuilt once most of their entries are stale.
+
+The board is ordered the same way as the master CSV: by ADP, then by tier, then by position in the compiled table.
+"""
+
+
+# Imports
+import argparse
+import heapq
+import time
+
+import numpy as np
+import pandas as pd
+
+import columnar_store as cs
+import fantasy_football_analyzer as ffa
+import feature_registry as fr
+import merge_dataframes as md
+import rule_engine
+import table_schema as sch
+
+
+# Constants
+TEAMS = 12
+ROUNDS = 16
+
+
+class DraftBoard:
+    """
+    The breakout candidates still on the board, by position and across positions.
+    """
+
+    def __init__(self, tables: dict, tiers: list, rules: dict=ffa.RULES):
+        """
+        Evaluate every tier over the compiled tables and build the heaps.
+
+        :param tables: A dictionary mapping positions to compiled DataFrames with an 'ADP' column.
+        :param tiers: A list of (position, tier_name) tuples, in the order of the master CSV.
+        :param rules: A dictionary containing the rule specification (default ffa.RULES)
+        """
+        self.tiers = tiers
+        self._positions = {}
+        self._registry = fr.registry(rules['features'])
+        for position, table in tables.items():
+            tier_specs = [rules['tiers'][tier_name] for tier_position, tier_name in tiers if tier_position == position]
+            arrays = rule_engine.column_arrays(table, tier_specs, rules['features'])
+            arrays = {name: np.array(values, dtype=float) for name, values in arrays.items()}
+            arrays.setdefault('ADP', np.array(sch.column_values(table['ADP']), dtype=float))
+            adp_features = [name for name in self._registry.dependents('ADP') if name in arrays]
+            self._positions[position] = {
+                'arrays': arrays,
+                'features': adp_features,
+                'taken': np.zeros(len(table.index), dtype=bool),
+                'versions': np.zeros(len(table.index), dtype=np.int64),
+            }
+        self._masks = [rule_engine.compile_tier(rules['tiers'][tier_name], rules['features']) for _, tier_name in tiers]
+        self._members = [self._masks[tier_index](self._positions[position]['arrays']) for tier_index, (position, _) in enumerate(tiers)]
+        self._tier_indexes = {position: [tier_index for tier_index, (tier_position, _) in enumerate(tiers) if tier_position == position] for position in tables}
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        Build the heaps from the current members of every tier, dropping every stale entry.
+        """
+        self._heaps = {position: [] for position in self._positions}
+        for tier_index, (position, _) in enumerate(self.tiers):
+            state = self._positions[position]
+            rows = np.flatnonzero(self._members[tier_index] & ~state['taken'])
+            self._heaps[position].extend(zip(adp_keys(state['arrays']['ADP'][rows]), [tier_index] * len(rows), rows.tolist(), state['versions'][rows].tolist()))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+        self._heaps[None] = [entry for position in self._positions for entry in self._heaps[position]]
+        heapq.heapify(self._heaps[None])
+        self._stale = 0
+
+    def take(self, position: str, row: int, taken: bool=True) -> None:
+        """
+        Mark a player as drafted, or put a drafted player back on the board.
+
+        :param position: A string containing the player's position.
+        :param row: An integer representing the player's row in the compiled table of the position.
+        :param taken: True to mark the player as drafted, False to make them available (default True)
+        """
+        state = self._positions[position]
+        if state['taken'][row] == taken:
+            return
+        self._invalidate(position, row)
+        state['taken'][row] = taken
+        if not taken:
+            self._push(position, row)
+        self._compact()
+
+    def set_adp(self, position: str, row: int, adp: float) -> None:
+        """
+        Change the ADP of a player, moving them between tiers if their tier windows no longer hold.
+
+        :param position: A string containing the player's position.
+        :param row: An integer representing the player's row in the compiled table of the position.
+        :param adp: A float representing the new ADP, or NaN if the player no longer has one.
+        """
+        state = self._positions[position]
+        self._invalidate(position, row)
+        arrays = state['arrays']
+        arrays['ADP'][row] = adp
+        player = {name: values[row:row + 1] for name, values in arrays.items()}
+        for name in state['features']:
+            arrays[name][row] = self._registry.evaluate(name, player)[0]
+        for tier_index in self._tier_indexes[position]:
+            self._members[tier_index][row] = self._masks[tier_index](player)[0]
+        if not state['taken'][row]:
+            self._push(position, row)
+        self._compact()
+
+    def _invalidate(self, position: str, row: int) -> None:
+        """
+        Make the entries of a player stale.
+
+        :param position: A string containing the player's position.
+        :param row: An integer representing the player's row in the compiled table of the position.
+        """
+        state = self._positions[position]
+        if not state['taken'][row]:
+            self._stale += sum(bool(self._members[tier_index][row]) for tier_index in self._tier_indexes[position])
+        state['versions'][row] += 1
+
+    def _compact(self) -> None:
+        """
+        Rebuild the heaps if most of their entries are stale.
+        """
+        if self._stale > len(self._heaps[None]) // 2:
+            self.rebuild()
+
+    def _push(self, position: str, row: int) -> None:
+        """
+        Add an entry for every tier a player belongs to.
+
+        :param position: A string containing the player's position.
+        :param row: An integer representing the player's row in the compiled table of the position.
+        """
+        state = self._positions[position]
+        for tier_index in self._tier_indexes[position]:
+            if self._members[tier_index][row]:
+                entry = (adp_keys(state['arrays']['ADP'][row:row + 1])[0], tier_index, row, int(state['versions'][row]))
+                heapq.heappush(self._heaps[position], entry)
+                heapq.heappush(self._heaps[None], entry)
+
+    def _is_live(self, entry: tuple) -> bool:
+        """
+        Check whether a heap entry still describes an available player in one of their tiers.
+
+        :param entry: An (ADP, tier index, row, version) tuple.
+        :return: True if the entry is current, otherwise False.
+        """
+        _, tier_index, row, version = entry
+        return self._positions[self.tiers[tier_index][0]]['versions'][row] == version
+
+    def top(self, limit: int=None, position: str=None, tier: str=None) -> list:
+        """
+        List the best breakout candidates still on the board, by ADP.
+
+        :param limit: An integer representing the maximum number of candidates, or None for all (default None)
+        :param position: A string containing a position to list, or None for every position (default None)
+        :param tier: A string naming a tier to list, or None for every tier (default None)
+        :return: A list of (position, row, tier_name) tuples.
+        """
+        heap = self._heaps[position]
+        popped, candidates = [], []
+        while heap and (limit is None or len(candidates) < limit):
+            entry = heapq.heappop(heap)
+            if not self._is_live(entry):
+                self._stale -= position is None
+                continue
+            popped.append(entry)
+            tier_position, tier_name = self.tiers[entry[1]]
+            if tier in (None, tier_name):
+                candidates.append((tier_position, entry[2], tier_name))
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        return candidates
+
+    def best_remaining(self) -> dict:
+        """
+        Find the best breakout candidate still on the board at every position.
+
+        :return: A dictionary mapping positions to a (row, tier_name) tuple, or None if none is left.
+        """
+        best = {}
+        for position in self._positions:
+            candidates = self.top(1, position)
+            best[position] = candidates[0][1:] if candidates else None
+        return best
+
+    def taken_count(self, position: str) -> int:
+        """
+        Count the players of a position that were drafted.
+
+        :param position: A string containing a position.
+        :return: An integer.
+        """
+        return int(self._positions[position]['taken'].sum())
+
+    def adp(self, position: str, row: int) -> float:
+        """
+        Return the current ADP of a player.
+
+        :param position: A string containing the player's position.
+        :param row: An integer representing the player's row in the compiled table of the position.
+        :return: A float.
+        """
+        return float(self._positions[position]['arrays']['ADP'][row])
+
+    def is_taken(self, position: str, row: int) -> bool:
+        """
+        Check whether a player was drafted.
+
+        :param position: A string containing the player's position.
+        :param row: An integer representing the player's row in the compiled table of the position.
+        :return: True if the player was drafted, otherwise False.
+        """
+        return bool(self._positions[position]['taken'][row])
+
+
+def adp_keys(adps: np.ndarray) -> list:
+    """
+    Turn ADPs into heap keys, ranking players without an ADP last.
+
+    :param adps: A float array of ADPs.
+    :return: A list of floats.
+    """
+    return np.where(np.isnan(adps), np.inf, adps).tolist()
+
+
+def board_tiers() -> list:
+    """
+    List the tiers of every position in the order of the master CSV.
+
+    :return: A list of (position, tier_name) tuples.
+    """
+    return [(position, tier_name) for position, _, _, tiers in ffa.POSITION_ANALYSES for _, tier_name in tiers]
+
+
+def load_tables() -> dict:
+    """
+    Read the compiled table of every position, with the columns used by its tiers.
+
+    :return: A dictionary mapping positions to DataFrames.
+    """
+    return {position: cs.read_table(stat_file, usecols = rel_columns) for position, stat_file, rel_columns, _ in ffa.POSITION_ANALYSES}
+
+
+def load_adp_players() -> pd.DataFrame:
+    """
+    Read every player of the ADP source of the compiled tables (fantasy_football_analyzer.ADP_DATAPOINT_SPEC), at every
+    position, including the positions without a compiled table.
+
+    :return: A DataFrame with 'player' and 'ADP' columns, one row per player with an ADP, in the order of the source.
+    """
+    file_key, identifier_index, added_indexes, _ = ffa.ADP_DATAPOINT_SPEC
+    adp_index = next(index for index, name in added_indexes.items() if name == 'ADP')
+    source, column_names = md.SourceTableCache().read(ffa.SEASON_FILES[file_key], [identifier_index, adp_index])
+    players = pd.DataFrame({
+        'player': source[column_names[identifier_index]].to_numpy(dtype=object),
+        'ADP': np.array(sch.column_values(source[column_names[adp_index]]), dtype=float),
+    })
+    return players.dropna().reset_index(drop=True)
+
+
+def mock_draft(tables: dict, board: DraftBoard, adp_players: pd.DataFrame, teams: int=TEAMS, rounds: int=ROUNDS) -> list:
+    """
+    Run a snake draft where every team takes the player with the best ADP, querying the board after every pick.
+
+    Every player of the ADP source can be drafted. Players of the compiled tables are matched to it through
+    player_identity, as when the tables were compiled, and taken off the board when drafted; the other players, such as
+    tight ends, only use up their pick.
+
+    :param tables: A dictionary mapping positions to compiled DataFrames.
+    :param board: A DraftBoard over the tables.
+    :param adp_players: A DataFrame returned by load_adp_players.
+    :param teams: An integer representing the number of teams (default TEAMS)
+    :param rounds: An integer representing the number of rounds (default ROUNDS)
+    :return: A list of (pick, team, player, position, best remaining) tuples, where position is None for players
+             without a compiled table and best remaining maps every position to the name of its best breakout candidate
+             left, or None. The list is shorter than teams * rounds if the ADP source lists fewer players.
+    """
+    board_rows = np.full((len(adp_players.index), 2), -1, dtype=np.intp)
+    adp_index = md.identity_index(adp_players['player'])
+    for position_index, table in enumerate(tables.values()):
+        rows, _ = adp_index.resolve(table['player'])
+        matched = np.flatnonzero((rows != -1) & table['ADP'].notna().to_numpy())
+        # The first table row matched to a player of the ADP source keeps them.
+        matched = matched[board_rows[rows[matched], 0] == -1]
+        matched = matched[np.unique(rows[matched], return_index=True)[1]]
+        board_rows[rows[matched]] = np.column_stack([np.full(len(matched), position_index), matched])
+    positions = list(tables)
+    order = np.argsort(adp_players['ADP'].to_numpy(dtype=float), kind='stable')[:teams * rounds]
+    picks = []
+    for pick, player_row in enumerate(order):
+        draft_round, slot = divmod(pick, teams)
+        team = slot + 1 if draft_round % 2 == 0 else teams - slot
+        position_index, row = board_rows[player_row]
+        position = None if position_index == -1 else positions[position_index]
+        if position is not None:
+            board.take(position, int(row))
+        best = {best_position: None if found is None else tables[best_position]['player'].iloc[found[0]] for best_position, found in board.best_remaining().items()}
+        picks.append((pick + 1, team, adp_players['player'].iloc[player_row], position, best))
+    return picks
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Run a mock snake draft and list the best breakout left at every position after each pick.')
+    parser.add_argument('--teams', type = int, default = TEAMS, help = 'The number of teams.')
+    parser.add_argument('--rounds', type = int, default = ROUNDS, help = 'The number of rounds.')
+    arguments = parser.parse_args()
+
+    tables = load_tables()
+    board = DraftBoard(tables, board_tiers())
+    adp_players = load_adp_players()
+    start = time.perf_counter()
+    picks = mock_draft(tables, board, adp_players, arguments.teams, arguments.rounds)
+    elapsed = time.perf_counter() - start
+    for pick, team, player, position, best in picks:
+        remaining = ', '.join(f'{best_position}: {name or "-"}' for best_position, name in best.items())
+        print(f'{pick:>4} Team {team:>2} {player} ({position or "-"})  |  {remaining}')
+    print(f'{len(picks)} picks in {elapsed * 1e3:.1f} ms ({elapsed * 1e6 / max(len(picks), 1):.0f} us per pick and query)')
+    if len(picks) < arguments.teams * arguments.rounds:
+        print(f'The draft stopped after {len(picks)} of {arguments.teams * arguments.rounds} picks: the ADP source only lists {len(adp_players.index)} players with an ADP.')
+
+
+if __name__ == '__main__':
+    main()
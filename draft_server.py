@@ -0,0 +1,357 @@
+"""
+A python module that keeps the compiled position tables in memory and answers draft-day queries over a local HTTP API.
+
+The server builds the compiled CSVs once at startup (only if their inputs changed), then serves every query from memory
+with the same tier masks as the pipeline. ADP moves and drafted players are applied as deltas to a DraftBoard, so a
+query never re-parses a CSV, rewrites a tier CSV or re-evaluates a whole tier. Before any delta, /candidates lists the
+same players in the same order as the master CSV.
+
+ENDPOINTS (JSON bodies and responses):
+- GET /candidates[?position=RB&tier=hero_rb&limit=10]: the breakout candidates still on the board, sorted by ADP.
+- GET /status: the state version, the number of players per position and the number of players drafted.
+- POST /adp {"adp": {"<player>": <adp or null>, ...}[, "position": "RB"]}: set the ADP of some players.
+- POST /taken {"players": ["<player>", ...][, "position": "RB"]}: mark players as drafted.
+- POST /available {"players": ["<player>", ...][, "position": "RB"]}: put drafted players back on the board.
+- POST /reload: rebuild the compiled CSVs if their inputs changed, reload them and re-apply every delta.
+Bodies of any other shape are rejected with a 400 error.
+
+Players are matched through player_identity, so differently spelled names still match. A name is matched in the
+request's position, or else in every position, where an exact or normalized match beats an approximate one. Names that
+match no player with an ADP are returned as 'unresolved', and names that match players in several positions as
+'ambiguous'; neither changes the board.
+"""
+
+
+# Imports
+import argparse
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+import build_graph as bg
+import draft_board as db
+import fantasy_football_analyzer as ffa
+import merge_dataframes as md
+import table_schema as sch
+
+
+# Constants
+HOST = '127.0.0.1'
+PORT = 8765
+COMPILE_FUNCTIONS = {'RB': ffa.create_rb_csv, 'WR': ffa.create_wr_csv, 'QB': ffa.create_qb_csv}
+
+
+class FeatureStore:
+    """
+    The compiled table of every position, with a DraftBoard that keeps the breakout candidates still on the board.
+    Answers to queries are cached until the next change.
+
+    Every change increments the version. Changes are recorded as deltas, so they survive a reload of the tables.
+    The store can be shared between threads; every method holds the store's lock.
+    """
+
+    def __init__(self, rules: dict=ffa.RULES):
+        self.rules = rules
+        self.version = 0
+        self._deltas = []
+        self._positions = {}
+        self._board = None
+        self._answers = {}
+        self._table_cache = md.SourceTableCache()
+        self._table_cache.request_datapoints(ffa.RB_DATAPOINTS + ffa.WR_DATAPOINTS + ffa.QB_DATAPOINTS)
+        self._lock = threading.RLock()
+
+    def load(self) -> None:
+        """
+        Build the compiled CSVs if their inputs changed, load them into memory and re-apply every recorded delta.
+        """
+        with self._lock:
+            manifest = bg.load_manifest()
+            for position, _, _, _ in ffa.POSITION_ANALYSES:
+                COMPILE_FUNCTIONS[position](self._table_cache, manifest)
+            bg.save_manifest(manifest)
+            tables = db.load_tables()
+            self._positions = {position: {'table': table, 'index': md.identity_index(table['player'])} for position, table in tables.items()}
+            self._board = db.DraftBoard(tables, db.board_tiers(), self.rules)
+            self._answers = {}
+            for kind, values, position in self._deltas:
+                self._apply(kind, values, position)
+            self.version += 1
+
+    def update_adp(self, adps: dict, position: str=None) -> dict:
+        """
+        Set the ADP of some players.
+
+        :param adps: A dictionary mapping player names to their new ADP, or None if they no longer have one.
+        :param position: A string containing the position of the players, or None to match them in every position (default None)
+        :return: A dictionary with the 'updated' player names, the 'unresolved' and 'ambiguous' names and the new 'version'.
+        """
+        if not isinstance(adps, dict) or not all(isinstance(name, str) and (adp is None or is_number(adp)) for name, adp in adps.items()):
+            raise ValueError('adp must map player names to numbers or null')
+        values = {name: np.nan if adp is None else float(adp) for name, adp in adps.items()}
+        return self._change('adp', values, position)
+
+    def mark_taken(self, names: list, taken: bool=True, position: str=None) -> dict:
+        """
+        Mark players as drafted, or put them back on the board.
+
+        :param names: A list of player names.
+        :param taken: True to mark the players as drafted, False to make them available (default True)
+        :param position: A string containing the position of the players, or None to match them in every position (default None)
+        :return: A dictionary with the 'updated' player names, the 'unresolved' and 'ambiguous' names and the new 'version'.
+        """
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError('players must be a list of player names')
+        return self._change('taken', dict.fromkeys(names, taken), position)
+
+    def _change(self, kind: str, values: dict, position: str=None) -> dict:
+        """
+        Record a delta, apply it and increment the version.
+
+        :param kind: 'adp' or 'taken'.
+        :param values: A dictionary mapping player names to new values.
+        :param position: A string containing the position of the players, or None to match them in every position (default None)
+        :return: A dictionary with the 'updated' player names, the 'unresolved' and 'ambiguous' names and the new 'version'.
+        """
+        with self._lock:
+            if position is not None and position not in self._positions:
+                raise ValueError(f'Unknown position {position!r}')
+            self._deltas.append((kind, values, position))
+            updated, unresolved, ambiguous = self._apply(kind, values, position)
+            self._answers = {}
+            self.version += 1
+            return {'updated': updated, 'unresolved': unresolved, 'ambiguous': ambiguous, 'version': self.version}
+
+    def _apply(self, kind: str, values: dict, position: str=None) -> tuple:
+        """
+        Apply a delta to the player every name matches, in the given position or else in the only position where the
+        name has the best match: an exact or normalized match beats an approximate one.
+
+        :param kind: 'adp' to set the ADP column, or 'taken' to set availability.
+        :param values: A dictionary mapping player names to new values.
+        :param position: A string containing the position of the players, or None to match them in every position (default None)
+        :return: A tuple containing the list of matched player names, the list of unresolved names and the list of
+                 names that match players in several positions.
+        """
+        names = pd.Series(list(values), dtype=object)
+        new_values = list(values.values())
+        positions = list(self._positions) if position is None else [position]
+        resolved = {}
+        for name_position in positions:
+            rows, report = self._positions[name_position]['index'].resolve(names)
+            approximate = names.isin(report.loc[report['status'] == 'approximate', 'identifier']).to_numpy()
+            resolved[name_position] = (rows, approximate)
+        found = np.array([rows != -1 for rows, _ in resolved.values()]).reshape(len(positions), len(names))
+        close = np.array([(rows != -1) & ~approximate for rows, approximate in resolved.values()]).reshape(found.shape)
+        chosen = np.where(close.any(axis=0), close, found)
+        counts = chosen.sum(axis=0)
+        updated = []
+        for position_index, (name_position, (rows, _)) in enumerate(resolved.items()):
+            selected = np.flatnonzero(chosen[position_index] & (counts == 1))
+            table = self._positions[name_position]['table']
+            if kind == 'adp' and len(selected):
+                table['ADP'] = np.array(sch.column_values(table['ADP']), dtype=float)
+            for name_index in selected:
+                row = int(rows[name_index])
+                if kind == 'adp':
+                    table.iloc[row, table.columns.get_loc('ADP')] = new_values[name_index]
+                    self._board.set_adp(name_position, row, new_values[name_index])
+                else:
+                    self._board.take(name_position, row, new_values[name_index])
+                updated.append(table['player'].iloc[row])
+        return updated, names[counts == 0].tolist(), names[counts > 1].tolist()
+
+    def candidates(self, position: str=None, tier: str=None, limit: int=None) -> tuple:
+        """
+        List the breakout candidates still on the board, sorted by ADP, the way the master CSV lists them.
+
+        :param position: A string containing a position to list, or None for every position (default None)
+        :param tier: A string naming a tier to list, or None for every tier (default None)
+        :param limit: An integer representing the maximum number of players to list, or None for all (default None)
+        :return: A tuple containing the version listed and a DataFrame with the columns of the master CSV and a 'tier' column.
+        """
+        with self._lock:
+            if position is not None and position not in self._positions:
+                raise ValueError(f'Unknown position {position!r}')
+            if tier is not None and tier not in [tier_name for _, tier_name in self._board.tiers]:
+                raise ValueError(f'Unknown tier {tier!r}')
+            key = (position, tier, limit)
+            if key not in self._answers:
+                self._answers[key] = self._board_frame(self._board.top(limit, position, tier))
+            return self.version, self._answers[key]
+
+    def _board_frame(self, candidates: list) -> pd.DataFrame:
+        """
+        Look up the columns of the master CSV for some candidates.
+
+        :param candidates: A list of (position, row, tier_name) tuples returned by DraftBoard.top.
+        :return: A DataFrame with the columns of the master CSV, as float64 rather than float32, and a 'tier' column, in
+                 the order of candidates.
+        """
+        parts, order = [], []
+        for position, state in self._positions.items():
+            selected = [index for index, candidate in enumerate(candidates) if candidate[0] == position]
+            table = state['table']
+            output_columns = [column for column in table.columns if column in ffa.OUTPUT_COLUMNS]
+            codes = np.full(len(selected), ffa.POSITION_DTYPE.categories.get_loc(position))
+            parts.append(table.iloc[[candidates[index][1] for index in selected]][output_columns].assign(
+                tier=[candidates[index][2] for index in selected],
+                Position=pd.Categorical.from_codes(codes, dtype=ffa.POSITION_DTYPE),
+            ))
+            order.extend(selected)
+        board = sch.float64_columns(pd.concat(parts, ignore_index=True))
+        return board.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+
+    def status(self) -> dict:
+        """
+        Describe the store.
+
+        :return: A dictionary with the 'version' and, per position, the number of 'players' and of players 'taken'.
+        """
+        with self._lock:
+            positions = {
+                position: {'players': len(state['table'].index), 'taken': self._board.taken_count(position)}
+                for position, state in self._positions.items()
+            }
+            return {'version': self.version, 'positions': positions}
+
+
+class DraftServer(http.server.ThreadingHTTPServer):
+    """
+    An HTTP server that answers every request from a FeatureStore.
+    """
+
+    def __init__(self, address: tuple, store: FeatureStore):
+        super().__init__(address, DraftRequestHandler)
+        self.store = store
+
+
+class DraftRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Route the requests of the draft API to the server's FeatureStore.
+    """
+
+    def do_GET(self) -> None:
+        """
+        Answer /candidates and /status.
+        """
+        url = urllib.parse.urlparse(self.path)
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        if url.path == '/candidates':
+            self.respond(lambda: candidates_response(self.server.store, query))
+        elif url.path == '/status':
+            self.respond(self.server.store.status)
+        else:
+            self.send_json(404, {'error': f'Unknown path {url.path!r}'})
+
+    def do_POST(self) -> None:
+        """
+        Answer /adp, /taken, /available and /reload.
+        """
+        store = self.server.store
+        routes = {
+            '/adp': lambda body: store.update_adp(body['adp'], body.get('position')),
+            '/taken': lambda body: store.mark_taken(body['players'], position=body.get('position')),
+            '/available': lambda body: store.mark_taken(body['players'], taken=False, position=body.get('position')),
+            '/reload': lambda _: (store.load(), store.status())[1],
+        }
+        path = urllib.parse.urlparse(self.path).path
+        if path not in routes:
+            self.send_json(404, {'error': f'Unknown path {path!r}'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as error:
+            self.send_json(400, {'error': f'Invalid JSON: {error}'})
+            return
+        if not isinstance(body, dict):
+            self.send_json(400, {'error': 'Invalid request: the body must be a JSON object'})
+            return
+        self.respond(lambda: routes[path](body))
+
+    def respond(self, answer) -> None:
+        """
+        Send the answer to a request with its processing time, a 400 error if the request was invalid, or a 500 error if
+        answering it failed.
+
+        :param answer: A function that returns the dictionary to send.
+        """
+        start = time.perf_counter()
+        try:
+            response = answer()
+        except (KeyError, TypeError, ValueError) as error:
+            self.send_json(400, {'error': f'Invalid request: {error}'})
+            return
+        except Exception as error:
+            self.send_json(500, {'error': f'{type(error).__name__}: {error}'})
+            return
+        self.send_json(200, {**response, 'elapsedMs': (time.perf_counter() - start) * 1e3})
+
+    def send_json(self, status: int, response: dict) -> None:
+        """
+        Send a JSON response.
+
+        :param status: An integer representing the HTTP status code.
+        :param response: A dictionary to send as JSON.
+        """
+        content = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def is_number(value) -> bool:
+    """
+    Check whether a value decoded from JSON is a number.
+
+    :param value: A value decoded from JSON.
+    :return: True for integers and floats, otherwise False (including for booleans).
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def candidates_response(store: FeatureStore, query: dict) -> dict:
+    """
+    Answer a /candidates query.
+
+    :param store: A FeatureStore.
+    :param query: A dictionary with the optional 'position', 'tier' and 'limit' query parameters.
+    :return: A dictionary with the 'version' and the 'players' as a list of dictionaries.
+    """
+    limit = int(query['limit']) if 'limit' in query else None
+    version, board = store.candidates(query.get('position'), query.get('tier'), limit)
+    board = board.astype(object).where(board.notna(), None)
+    return {'version': version, 'players': board.to_dict('records')}
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Serve breakout candidates from memory during a live draft.')
+    parser.add_argument('--host', default = HOST, help = 'The address to listen on.')
+    parser.add_argument('--port', type = int, default = PORT, help = 'The port to listen on.')
+    arguments = parser.parse_args()
+
+    store = FeatureStore()
+    store.load()
+    server = DraftServer((arguments.host, arguments.port), store)
+    print(f'Serving draft queries on http://{arguments.host}:{arguments.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
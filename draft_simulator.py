@@ -0,0 +1,275 @@
+"""
+A python module that estimates how much value each flagged breakout player adds over their ADP, by simulating many
+snake drafts and seasons.
+
+DRAFT MODEL:
+- Every simulated league is a snake draft of teams * rounds picks: the order of the teams reverses every round, and
+  every team fills its own roster.
+- In every league, a player's value on the board is their ADP plus normal noise, with a standard deviation of
+  ADP_NOISE_FLOOR + ADP_NOISE_SHARE * ADP picks. At every pick, the team on the clock takes the best available player
+  by that value, among the positions its roster still has room for (ROSTER_LIMITS).
+- Only players from the compiled tables are simulated, so picks keep the gaps left by the other positions: a pick goes
+  to a player of another position until the best available player's rounded value is reached.
+
+SEASON MODEL:
+- A player's finish (their end-of-season rank) is lognormal around their ADP, with a spread of FINISH_SPREAD.
+- A player breaks out with a prior probability of FLAGGED_BREAKOUT_RATE if flagged by a tier, and of
+  BASE_BREAKOUT_RATE otherwise. A breakout finishes at BREAKOUT_FINISH_SHARE of their usual finish.
+- Ranks are turned into value with the curve 100 * exp(-(rank - 1) / VALUE_DECAY). The value added by a pick is the
+  value of the player's finish minus the value of the pick spent on them.
+- The flag edge is the value of a player with the flagged prior minus the value of the same player, in the same
+  simulated season, with the base prior.
+
+Leagues are simulated in batches of NumPy arrays, one row per league, spread over a process pool. Every batch has its
+own seed derived from the main seed, so the results do not depend on the number of processes.
+"""
+
+
+# Imports
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import columnar_store as cs
+import draft_board as db
+import fantasy_football_analyzer as ffa
+import season_config
+import table_schema as sch
+
+
+# Constants
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+SIMULATED_VALUE_FILE = SEASON_FILES['SIMULATED_VALUE_FILE']
+LEAGUES = 100_000
+SEED = 2022
+BATCH_CELLS = 1 << 20
+SIMULATED_VALUE_COLUMNS = ['player', 'Position', 'ADP', 'draftRate', 'meanPick', 'breakoutRate', 'expectedValue', 'expectedValueAdded', 'flagEdge']
+
+# Draft Model
+ADP_NOISE_FLOOR = 1.5
+ADP_NOISE_SHARE = 0.15
+ROSTER_LIMITS = {'QB': 3, 'RB': 8, 'WR': 8}
+
+# Season Model
+FLAGGED_BREAKOUT_RATE = 20 / 30
+BASE_BREAKOUT_RATE = 0.15
+BREAKOUT_FINISH_SHARE = 0.4
+FINISH_SPREAD = 0.5
+VALUE_DECAY = 60.0
+
+# Worker state, set once per process by initialize_worker.
+_WORKER_STATE = {}
+
+
+def player_pool(tables: dict, breakout_players: pd.DataFrame) -> pd.DataFrame:
+    """
+    List every player with an ADP, and whether a tier flagged them.
+
+    :param tables: A dictionary mapping positions to compiled DataFrames with 'player' and 'ADP' columns.
+    :param breakout_players: A DataFrame containing the master CSV, with 'player' and 'Position' columns.
+    :return: A DataFrame with 'player', 'Position', 'ADP' and 'flagged' columns, sorted by ADP.
+    """
+    pool = pd.concat([table[['player', 'ADP']].assign(Position=position) for position, table in tables.items()], ignore_index=True)
+    pool = pool.dropna(subset=['ADP']).sort_values('ADP', kind='stable').reset_index(drop=True)
+    flagged = pd.MultiIndex.from_frame(breakout_players[['player', 'Position']].astype(str))
+    pool['flagged'] = pd.MultiIndex.from_frame(pool[['player', 'Position']]).isin(flagged)
+    return pool[['player', 'Position', 'ADP', 'flagged']]
+
+
+def rank_value(ranks: np.ndarray) -> np.ndarray:
+    """
+    Turn draft or finishing ranks into value.
+
+    :param ranks: A float array of ranks, starting at 1.
+    :return: A float array of values.
+    """
+    return 100.0 * np.exp(-(ranks - 1.0) / VALUE_DECAY)
+
+
+def snake_order(teams: int, rounds: int) -> np.ndarray:
+    """
+    List the team on the clock at every pick of a snake draft.
+
+    :param teams: An integer representing the number of teams per league.
+    :param rounds: An integer representing the number of rounds per draft.
+    :return: An int array of teams (starting at 0), one per pick.
+    """
+    order = np.tile(np.arange(teams), (rounds, 1))
+    order[1::2] = order[1::2, ::-1]
+    return order.ravel()
+
+
+def draft_picks(adps: np.ndarray, positions: np.ndarray, limits: np.ndarray, noise: np.ndarray, teams: int, rounds: int) -> np.ndarray:
+    """
+    Run the snake drafts of several leagues at once, one pick of every league at a time.
+
+    Every team ranks the players of a position the same way, so the players of a position are drafted in the order of
+    their values: the best available player of a position is always the next one in the position's queue.
+
+    :param adps: A float array of ADPs, one per player.
+    :param positions: An int array of the position of every player, as an index into limits.
+    :param limits: An int array of the number of players of every position a roster can hold.
+    :param noise: A float array of standard normal draws, with one row per league and one column per player.
+    :param teams: An integer representing the number of teams per league.
+    :param rounds: An integer representing the number of rounds per draft.
+    :return: An int array of the pick at which every player is drafted (starting at 1, 0 if undrafted), in the shape
+             of noise.
+    """
+    leagues = np.arange(noise.shape[0])
+    noisy = adps + noise * (ADP_NOISE_FLOOR + ADP_NOISE_SHARE * adps)
+    # A last column of infinite values ends every queue, so a position with no player left is never picked.
+    noisy = np.hstack([noisy, np.full((leagues.size, 1), np.inf)])
+    queues = []
+    for position in range(limits.size):
+        columns = np.flatnonzero(positions == position)
+        queue = columns[np.argsort(noisy[:, columns], axis=1, kind='stable')]
+        queues.append(np.hstack([queue, np.full((leagues.size, 1), adps.size)]))
+    heads = np.zeros((leagues.size, limits.size), dtype=np.intp)
+    rosters = np.zeros((leagues.size, teams, limits.size), dtype=np.int64)
+    picks = np.zeros(noisy.shape, dtype=np.int64)
+    for pick, team in enumerate(snake_order(teams, rounds), start=1):
+        best = np.column_stack([queue[leagues, heads[:, position]] for position, queue in enumerate(queues)])
+        values = np.take_along_axis(noisy, best, axis=1)
+        # A full roster skips the position; a value not reached yet leaves the pick to another position.
+        values[(rosters[:, team] >= limits) | (np.maximum(np.rint(values), 1) > pick)] = np.inf
+        chosen = np.argmin(values, axis=1)
+        drafting = np.flatnonzero(np.isfinite(values[leagues, chosen]))
+        chosen = chosen[drafting]
+        picks[drafting, best[drafting, chosen]] = pick
+        heads[drafting, chosen] += 1
+        rosters[drafting, team, chosen] += 1
+    return picks[:, :-1]
+
+
+def simulate_batch(adps: np.ndarray, flagged: np.ndarray, positions: np.ndarray, limits: np.ndarray, leagues: int, seed: np.random.SeedSequence, teams: int, rounds: int) -> dict:
+    """
+    Simulate the drafts and seasons of a batch of leagues.
+
+    :param adps: A float array of ADPs, one per player.
+    :param flagged: A boolean array, True for players flagged by a tier.
+    :param positions: An int array of the position of every player, as an index into limits.
+    :param limits: An int array of the number of players of every position a roster can hold.
+    :param leagues: An integer representing the number of leagues to simulate.
+    :param seed: A SeedSequence used to seed the batch's random number generator.
+    :param teams: An integer representing the number of teams per league.
+    :param rounds: An integer representing the number of rounds per draft.
+    :return: A dictionary mapping statistics to float arrays of per-player totals over the batch.
+    """
+    generator = np.random.default_rng(seed)
+    shape = (leagues, adps.size)
+    picks = draft_picks(adps, positions, limits, generator.standard_normal(shape), teams, rounds)
+    drafted = picks > 0
+    finish = adps * np.exp(generator.standard_normal(shape) * FINISH_SPREAD - FINISH_SPREAD ** 2 / 2)
+    chance = generator.random(shape)
+    breakout = chance < np.where(flagged, FLAGGED_BREAKOUT_RATE, BASE_BREAKOUT_RATE)
+    value = rank_value(np.where(breakout, finish * BREAKOUT_FINISH_SHARE, finish))
+    base_value = rank_value(np.where(chance < BASE_BREAKOUT_RATE, finish * BREAKOUT_FINISH_SHARE, finish))
+    return {
+        'drafted': drafted.sum(axis=0, dtype=float),
+        'pick': picks.sum(axis=0, dtype=float),
+        'breakouts': breakout.sum(axis=0, dtype=float),
+        'value': value.sum(axis=0),
+        'valueAdded': np.where(drafted, value - rank_value(picks), 0.0).sum(axis=0),
+        'flagEdge': (value - base_value).sum(axis=0),
+    }
+
+
+def initialize_worker(adps: np.ndarray, flagged: np.ndarray, positions: np.ndarray, limits: np.ndarray, teams: int, rounds: int) -> None:
+    """
+    Store the player pool and the league format in a worker process, so that they are sent once per process rather
+    than once per batch.
+
+    :param adps: A float array of ADPs, one per player.
+    :param flagged: A boolean array, True for players flagged by a tier.
+    :param positions: An int array of the position of every player, as an index into limits.
+    :param limits: An int array of the number of players of every position a roster can hold.
+    :param teams: An integer representing the number of teams per league.
+    :param rounds: An integer representing the number of rounds per draft.
+    """
+    _WORKER_STATE.update(adps=adps, flagged=flagged, positions=positions, limits=limits, teams=teams, rounds=rounds)
+
+
+def simulate_worker_batch(batch: tuple) -> dict:
+    """
+    Simulate a batch of leagues in a worker process.
+
+    :param batch: A tuple containing the number of leagues and the batch's SeedSequence.
+    :return: A dictionary mapping statistics to float arrays of per-player totals over the batch.
+    """
+    leagues, seed = batch
+    state = _WORKER_STATE
+    return simulate_batch(state['adps'], state['flagged'], state['positions'], state['limits'], leagues, seed, state['teams'], state['rounds'])
+
+
+def simulate(pool: pd.DataFrame, leagues: int=LEAGUES, seed: int=SEED, jobs: int=1, teams: int=db.TEAMS, rounds: int=db.ROUNDS) -> pd.DataFrame:
+    """
+    Simulate many leagues and estimate the draft position, breakout rate and value added of every player.
+
+    :param pool: A DataFrame returned by player_pool.
+    :param leagues: An integer representing the number of leagues to simulate (default LEAGUES)
+    :param seed: An integer used to seed the simulation (default SEED)
+    :param jobs: An integer representing the number of worker processes to use (default 1)
+    :param teams: An integer representing the number of teams per league (default db.TEAMS)
+    :param rounds: An integer representing the number of rounds per draft (default db.ROUNDS)
+    :return: A DataFrame with the SIMULATED_VALUE_COLUMNS and a 'flagged' column, one row per player of the pool.
+    """
+    adps = np.array(sch.column_values(pool['ADP']), dtype=float)
+    flagged = pool['flagged'].to_numpy(dtype=bool)
+    positions, position_names = pd.factorize(pool['Position'])
+    limits = np.array([ROSTER_LIMITS.get(position, rounds) for position in position_names], dtype=np.int64)
+    batch_leagues = max(1, BATCH_CELLS // max(adps.size, 1))
+    sizes = [min(batch_leagues, leagues - start) for start in range(0, leagues, batch_leagues)]
+    batches = list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+    arguments = (adps, flagged, positions, limits, teams, rounds)
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initialize_worker, initargs=arguments) as executor:
+            results = list(executor.map(simulate_worker_batch, batches, chunksize=max(1, len(batches) // (jobs * 4))))
+    else:
+        initialize_worker(*arguments)
+        results = [simulate_worker_batch(batch) for batch in batches]
+    # Batches are added up in order, so the totals do not depend on the number of processes.
+    totals = {statistic: sum(result[statistic] for result in results) for statistic in results[0]}
+
+    simulated = pool.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        simulated['draftRate'] = totals['drafted'] / leagues
+        simulated['meanPick'] = totals['pick'] / totals['drafted']
+        simulated['breakoutRate'] = totals['breakouts'] / leagues
+        simulated['expectedValue'] = totals['value'] / leagues
+        simulated['expectedValueAdded'] = totals['valueAdded'] / totals['drafted']
+        simulated['flagEdge'] = totals['flagEdge'] / leagues
+    return simulated
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Simulate snake drafts and seasons to value the flagged breakout players.')
+    parser.add_argument('--leagues', type = int, default = LEAGUES, help = 'The number of leagues to simulate.')
+    parser.add_argument('--seed', type = int, default = SEED, help = 'The seed of the simulation.')
+    parser.add_argument('--jobs', type = int, default = os.cpu_count(), help = 'The number of worker processes.')
+    parser.add_argument('--teams', type = int, default = db.TEAMS, help = 'The number of teams per league.')
+    parser.add_argument('--rounds', type = int, default = db.ROUNDS, help = 'The number of rounds per draft.')
+    arguments = parser.parse_args()
+
+    pool = player_pool(db.load_tables(), cs.read_table(ffa.ALL_BREAKOUT_PLAYER_FILE, index_col=0))
+    start = time.perf_counter()
+    simulated = simulate(pool, arguments.leagues, arguments.seed, arguments.jobs, arguments.teams, arguments.rounds)
+    elapsed = time.perf_counter() - start
+
+    flagged_players = simulated[simulated['flagged']].sort_values('expectedValueAdded', ascending=False, kind='stable')
+    os.makedirs(os.path.dirname(SIMULATED_VALUE_FILE), exist_ok=True)
+    cs.write_table(flagged_players[SIMULATED_VALUE_COLUMNS].reset_index(drop=True), SIMULATED_VALUE_FILE)
+    other_players = simulated[~simulated['flagged'] & (simulated['draftRate'] > 0)]
+    print(f'{arguments.leagues:,} leagues of {len(pool.index)} players simulated in {elapsed:.1f} s')
+    print(f'Mean value added when drafted: {flagged_players["expectedValueAdded"].mean():.2f} for flagged players, {other_players["expectedValueAdded"].mean():.2f} for the others')
+
+
+if __name__ == '__main__':
+    main()
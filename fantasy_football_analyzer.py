@@ -4,117 +4,250 @@ A python-based application to analyze fantasy football players and project their
 
 
 # Imports
+import argparse
+import heapq
+import itertools
+import numpy as np
 import pandas as pd
 import os
 
+import adp_consensus as ac
+import build_graph as bg
+import columnar_store as cs
 import merge_dataframes as md
-import rb_analysis as rba
-import wr_analysis as wra
-import qb_analysis as qba
+import player_identity as pi
+import profiler
+import query_planner as qp
+import rule_engine
+import season_config
+import table_schema as sch
+import task_scheduler as ts
 
 
 # Year Constants
-YEAR = 2022
-CALCULATIONS_FOLDER = f'./{YEAR}_calculations'
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+CALCULATIONS_FOLDER = SEASON_FILES['CALCULATIONS_FOLDER']
 
 # Team Constants
-TEAM_OL_RANK = f'./{YEAR - 1}_data/data_team_olrank.csv'
-TEAM_TARGETS = f'./{YEAR - 1}_data/data_team_trgt%.csv'
+TEAM_OL_RANK = SEASON_FILES['TEAM_OL_RANK']
+TEAM_TARGETS = SEASON_FILES['TEAM_TARGETS']
 
 # Player Constants
-PLAYER_AGE = f'./{YEAR - 1}_data/data_player_age.csv'
-PLAYER_ADPS = f'./{YEAR - 1}_data/data_player_adp.csv'
-PLAYER_PASS_GRADE = f'./{YEAR - 1}_data/data_player_passgrade.csv'
-PLAYER_RUSH_GRADES = f'./{YEAR - 1}_data/data_player_rushgrade.csv'
-PLAYER_REC_GRADE = f'./{YEAR - 1}_data/data_player_receivinggrade.csv'
+PLAYER_AGE = SEASON_FILES['PLAYER_AGE']
+PLAYER_ADPS = SEASON_FILES['PLAYER_ADPS']
+PLAYER_PASS_GRADE = SEASON_FILES['PLAYER_PASS_GRADE']
+PLAYER_RUSH_GRADES = SEASON_FILES['PLAYER_RUSH_GRADES']
+PLAYER_REC_GRADE = SEASON_FILES['PLAYER_REC_GRADE']
+
+# ADP Constants: the datapoint that adds the 'ADP' column, by season_config.ADP_SOURCE
+ADP_DATAPOINT_SPECS = {
+    'ESPN': ('PLAYER_ADPS', 1, {5: 'ADP'}, 0),
+    'consensus': ('CONSENSUS_ADPS', 0, {1: 'ADP'}, 0),
+}
+ADP_DATAPOINT_SPEC = ADP_DATAPOINT_SPECS[season_config.ADP_SOURCE]
 
 # RB Constants
-COMPILED_RB_DATA = f'./{YEAR - 1}_data/compiled_rb_data.csv'
+COMPILED_RB_DATA = SEASON_FILES['COMPILED_RB_DATA']
+RB_IDENTITY_REPORT = SEASON_FILES['RB_IDENTITY_REPORT']
 NECESSARY_RB_COLUMNS = ['player', 'team', 'games', 'recTarg', 'rushCarries']
-LEGENDARY_RB_FILE = f'./{YEAR}_calculations/legendary_runningbacks.csv'
+LEGENDARY_RB_FILE = SEASON_FILES['LEGENDARY_RB_FILE']
 LEGENDARY_RB_REL_COLUMNS = ['player', 'team', 'games', 'recTarg', 'ADP', 'age', 'olRank', 'teamTargets']
-DEADZONE_RB_FILE = f'./{YEAR}_calculations/deadzone_runningbacks.csv'
+DEADZONE_RB_FILE = SEASON_FILES['DEADZONE_RB_FILE']
 DEADZONE_RB_REL_COLUMNS = ['player', 'team', 'games', 'recTarg', 'ADP', 'age', 'rushCarries', 'olRank', 'teamTargets', 'rushGrade', 'forcedMissedTackles']
-HERO_RB_FILE = f'./{YEAR}_calculations/hero_runningbacks.csv'
+HERO_RB_FILE = SEASON_FILES['HERO_RB_FILE']
 HERO_RB_REL_COLUMNS = ['player', 'team', 'games', 'ADP', 'age', 'rushGrade']
-MAIN_RB_CSV = f'./{YEAR - 1}_data/data_rb_stats.csv'
+MAIN_RB_CSV = SEASON_FILES['MAIN_RB_CSV']
+RB_DATAPOINT_SPECS = [
+    ADP_DATAPOINT_SPEC,
+    ('PLAYER_AGE', 1, {4: 'age'}, 0),
+    ('TEAM_OL_RANK', 0, {1: 'olRank'}, 1),
+    ('TEAM_TARGETS', 0, {7: 'teamTargets'}, 1),
+    ('PLAYER_RUSH_GRADES', 0, {28: 'rushGrade', 6: 'forcedMissedTackles'}, 0),
+]
+RB_DATAPOINTS = season_config.resolve_datapoints(RB_DATAPOINT_SPECS, SEASON_FILES)
 
 # WR Constants
-COMPILED_WR_DATA = f'./{YEAR - 1}_data/compiled_wr_data.csv'
+COMPILED_WR_DATA = SEASON_FILES['COMPILED_WR_DATA']
+WR_IDENTITY_REPORT = SEASON_FILES['WR_IDENTITY_REPORT']
 NECESSARY_WR_COLUMNS = ['player', 'team', 'games', 'recTarg']
-BREAKOUT_WR_FILE = f'./{YEAR}_calculations/breakout_receivers.csv'
+BREAKOUT_WR_FILE = SEASON_FILES['BREAKOUT_WR_FILE']
 BREAKOUT_WR_REL_COLUMNS = ['player', 'team', 'games', 'recTarg', 'ADP', 'age', 'teamTargets', 'recGrade']
-MAIN_WR_CSV = f'./{YEAR - 1}_data/data_wr_stats.csv'
+MAIN_WR_CSV = SEASON_FILES['MAIN_WR_CSV']
+WR_DATAPOINT_SPECS = [
+    ADP_DATAPOINT_SPEC,
+    ('PLAYER_AGE', 1, {4: 'age'}, 0),
+    ('TEAM_TARGETS', 0, {7: 'teamTargets'}, 1),
+    ('PLAYER_REC_GRADE', 0, {21: 'recGrade'}, 0),
+]
+WR_DATAPOINTS = season_config.resolve_datapoints(WR_DATAPOINT_SPECS, SEASON_FILES)
 
 
 # QB Constants
-COMPILED_QB_DATA = f'./{YEAR - 1}_data/compiled_qb_data.csv'
+COMPILED_QB_DATA = SEASON_FILES['COMPILED_QB_DATA']
+QB_IDENTITY_REPORT = SEASON_FILES['QB_IDENTITY_REPORT']
 NECESSARY_QB_COLUMNS = ['player', 'team', 'games', 'rushCarries', 'depthAim']
-MUST_DRAFT_QB_FILE = f'./{YEAR}_calculations/must_draft_quarterbacks.csv'
+MUST_DRAFT_QB_FILE = SEASON_FILES['MUST_DRAFT_QB_FILE']
 MUST_DRAFT_QB_REL_COLUMNS = ['player', 'team', 'games', 'ADP', 'age', 'rushCarries', 'depthAim', 'olRank', 'offenseGrade']
-MAIN_QB_CSV = f'./{YEAR - 1}_data/data_qb_stats.csv'
+MAIN_QB_CSV = SEASON_FILES['MAIN_QB_CSV']
+QB_DATAPOINT_SPECS = [
+    ADP_DATAPOINT_SPEC,
+    ('PLAYER_AGE', 1, {4: 'age'}, 0),
+    ('PLAYER_PASS_GRADE', 0, {23: 'offenseGrade'}, 0),
+    ('TEAM_OL_RANK', 0, {1: 'olRank'}, 1),
+]
+QB_DATAPOINTS = season_config.resolve_datapoints(QB_DATAPOINT_SPECS, SEASON_FILES)
 
 # Breakout Players
-ALL_BREAKOUT_PLAYER_FILE = f'./{YEAR}_calculations/all_breakout_players.csv'
+ALL_BREAKOUT_PLAYER_FILE = SEASON_FILES['ALL_BREAKOUT_PLAYER_FILE']
+OUTPUT_COLUMNS = ['player', 'team', 'age', 'ADP']
+POSITION_DTYPE = pd.CategoricalDtype(['RB', 'WR', 'QB'])
+BREAKOUT_CHUNK_SIZE = 4096
+
+# Identity Resolution
+IDENTITY_REPORT_COLUMNS = ['source', 'column', 'identifier', 'status', 'match']
+IDENTITY_PARAMETERS = {
+    'suffixes': pi.NAME_SUFFIXES,
+    'teamAliases': pi.TEAM_ALIASES,
+    'ambiguityMargin': pi.AMBIGUITY_MARGIN,
+}
+
+# Breakout Rules
+RULES = rule_engine.load_rules()
+
+# Position Pipelines, by file key: (position, main CSV, necessary columns, datapoints, compiled CSV, union of relevant columns, [(tier file, tier name)])
+POSITION_PIPELINES = [
+    ('RB', 'MAIN_RB_CSV', NECESSARY_RB_COLUMNS, RB_DATAPOINT_SPECS, 'COMPILED_RB_DATA', sorted(set(LEGENDARY_RB_REL_COLUMNS + DEADZONE_RB_REL_COLUMNS + HERO_RB_REL_COLUMNS)), [
+        ('LEGENDARY_RB_FILE', 'legendary_rb'),
+        ('DEADZONE_RB_FILE', 'deadzone_rb'),
+        ('HERO_RB_FILE', 'hero_rb'),
+    ]),
+    ('WR', 'MAIN_WR_CSV', NECESSARY_WR_COLUMNS, WR_DATAPOINT_SPECS, 'COMPILED_WR_DATA', BREAKOUT_WR_REL_COLUMNS, [
+        ('BREAKOUT_WR_FILE', 'breakout_wr'),
+    ]),
+    ('QB', 'MAIN_QB_CSV', NECESSARY_QB_COLUMNS, QB_DATAPOINT_SPECS, 'COMPILED_QB_DATA', MUST_DRAFT_QB_REL_COLUMNS, [
+        ('MUST_DRAFT_QB_FILE', 'must_draft_qb'),
+    ]),
+]
+
+# Single-Scan Analyses: (position, compiled file, union of relevant columns, [(tier file, tier name)])
+POSITION_ANALYSES = [
+    (position, SEASON_FILES[compiled_key], rel_columns, [(SEASON_FILES[file_key], tier_name) for file_key, tier_name in tiers])
+    for position, _, _, _, compiled_key, rel_columns, tiers in POSITION_PIPELINES
+]
+
+
+def position_plan(main_csv: str, necessary_columns: list, datapoints: list) -> qp.LazyTable:
+    """
+    Describe how the compiled position data is built: the position data merged with every datapoint, for players with
+    an ADP, sorted by ADP.
+
+    :param main_csv: A string containing the name of the file with the position statistics.
+    :param necessary_columns: A list containing strings representing the names of columns to use from main_csv.
+    :param datapoints: A list of (csv_name, identifier_index, added_indexes, base_index) tuples describing the columns to add.
+    :return: A LazyTable.
+    """
+    plan = qp.scan(main_csv, necessary_columns)
+    for csv_name, identifier_index, added_indexes, base_index in datapoints:
+        plan = plan.join(csv_name, identifier_index, added_indexes, base_index)
+    return plan.drop_missing('ADP').sort('ADP')
+
+
+def analysis_plan(stat_file: str, rel_columns: list, tier_specs: list, rules: dict=RULES) -> qp.LazyTable:
+    """
+    Describe how the players some tiers could qualify are read from a compiled position CSV: only the columns the tiers
+    or the output use, and only the players inside the loosest ADP window of the tiers.
+
+    :param stat_file: A string containing the name of a compiled position CSV.
+    :param rel_columns: A list containing strings representing the union of the columns used by every tier.
+    :param tier_specs: A list of dictionaries describing tiers.
+    :param rules: A dictionary containing the rule specification (default RULES)
+    :return: A LazyTable.
+    """
+    tier_columns, _ = rule_engine.tier_columns(tier_specs, rules['features'])
+    window = [tuple(condition) for condition in rule_engine.window_conditions(tier_specs)]
+    used_columns = [column for column in rel_columns if column in tier_columns or column in OUTPUT_COLUMNS]
+    return qp.scan(stat_file, rel_columns).filter(*window).select(used_columns)
 
 
-def create_rb_csv() -> None:
+def compile_position_data(main_csv: str, necessary_columns: list, datapoints: list, table_cache: md.SourceTableCache, report: list=None) -> pd.DataFrame:
+    """
+    Create a DataFrame containing the position data merged with every datapoint, for players with an ADP, sorted by ADP.
+    The merged columns are typed by table_schema. Players without an ADP are dropped before the other datapoints are
+    merged (see position_plan and query_planner).
+
+    :param main_csv: A string containing the name of the file with the position statistics.
+    :param necessary_columns: A list containing strings representing the names of columns to use from main_csv.
+    :param datapoints: A list of (csv_name, identifier_index, added_indexes, base_index) tuples describing the columns to add.
+    :param table_cache: A SourceTableCache used to read the auxiliary CSVs.
+    :param report: A list to append a DataFrame of the identifiers that did not match exactly to, per datapoint (default None)
+    :return: A DataFrame.
+    """
+    return sch.apply_schema(position_plan(main_csv, necessary_columns, datapoints).collect(table_cache, report))
+
+
+def build_position_csv(compiled_file: str, main_csv: str, necessary_columns: list, datapoints: list, table_cache: md.SourceTableCache=None, manifest: dict=None, report_file: str=None) -> None:
+    """
+    Create a compiled position CSV, unless it was already built from the current inputs and datapoints.
+
+    :param compiled_file: A string containing the name of the compiled CSV to create.
+    :param main_csv: A string containing the name of the file with the position statistics.
+    :param necessary_columns: A list containing strings representing the names of columns to use from main_csv.
+    :param datapoints: A list of (csv_name, identifier_index, added_indexes, base_index) tuples describing the columns to add.
+    :param table_cache: A SourceTableCache shared with the other pipelines, or None to use a private cache (default None)
+    :param manifest: A build manifest shared with the other pipelines, or None to load and save the manifest file (default None)
+    :param report_file: A string containing the name of a CSV to list the identifiers that did not match exactly in (default None)
+    :return: None.
+    """
+    build_manifest = bg.load_manifest() if manifest is None else manifest
+    inputs = [main_csv] + [csv_name for csv_name, _, _, _ in datapoints]
+    parameters = {'columns': necessary_columns, 'datapoints': datapoints, 'identity': IDENTITY_PARAMETERS}
+    if bg.is_stale(build_manifest, compiled_file, inputs, parameters) or (report_file is not None and not os.path.exists(report_file)):
+        report = []
+        primary_dataframe = compile_position_data(main_csv, necessary_columns, datapoints, table_cache or md.SourceTableCache(), report)
+        with profiler.stage(f'write {os.path.basename(compiled_file)}', 'write', len(primary_dataframe.index)):
+            cs.write_table(primary_dataframe, compiled_file)
+        if report_file is not None:
+            pd.concat(report, ignore_index=True)[IDENTITY_REPORT_COLUMNS].to_csv(report_file)
+        bg.record(build_manifest, compiled_file, inputs, parameters)
+        if manifest is None:
+            bg.save_manifest(build_manifest)
+
+
+def create_rb_csv(table_cache: md.SourceTableCache=None, manifest: dict=None) -> None:
     """
     Create a containing all the RB data for RBs with an ADP, sorted by ADP.
 
+    :param table_cache: A SourceTableCache shared with the other pipelines, or None to use a private cache (default None)
+    :param manifest: A build manifest shared with the other pipelines, or None to load and save the manifest file (default None)
     :return: None.
     """
-    if not os.path.exists(COMPILED_RB_DATA):
-        primary_dataframe = pd.read_csv(MAIN_RB_CSV, usecols = NECESSARY_RB_COLUMNS)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_ADPS, 1, 5, 'ADP')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_AGE, 1, 4, 'age')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, TEAM_OL_RANK, 0, 1, 'olRank', base_index = 1)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, TEAM_TARGETS, 0, 7, 'teamTargets', base_index = 1)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_RUSH_GRADES, 0, 28, 'rushGrade', base_index = 0)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_RUSH_GRADES, 0, 6, 'forcedMissedTackles', base_index = 0)
-        primary_dataframe = primary_dataframe.sort_values('ADP')
-        primary_dataframe = primary_dataframe.dropna(subset=['ADP'])
-        primary_dataframe.reset_index(inplace=True)
-        primary_dataframe.drop('index', axis=1, inplace=True)
-        primary_dataframe.to_csv(COMPILED_RB_DATA)
+    with profiler.stage('create_rb_csv'):
+        build_position_csv(COMPILED_RB_DATA, MAIN_RB_CSV, NECESSARY_RB_COLUMNS, RB_DATAPOINTS, table_cache, manifest, RB_IDENTITY_REPORT)
 
 
-def create_wr_csv() -> None:
+def create_wr_csv(table_cache: md.SourceTableCache=None, manifest: dict=None) -> None:
     """
     Create a containing all the WR data for WRs with an ADP, sorted by ADP.
 
+    :param table_cache: A SourceTableCache shared with the other pipelines, or None to use a private cache (default None)
+    :param manifest: A build manifest shared with the other pipelines, or None to load and save the manifest file (default None)
     :return: None.
     """
-    if not os.path.exists(COMPILED_WR_DATA):
-        primary_dataframe = pd.read_csv(MAIN_WR_CSV, usecols = NECESSARY_WR_COLUMNS)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_ADPS, 1, 5, 'ADP')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_AGE, 1, 4, 'age')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, TEAM_TARGETS, 0, 7, 'teamTargets', base_index = 1)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_REC_GRADE, 0, 21, 'recGrade', base_index = 0)
-        primary_dataframe = primary_dataframe.sort_values('ADP')
-        primary_dataframe = primary_dataframe.dropna(subset=['ADP'])
-        primary_dataframe.reset_index(inplace=True)
-        primary_dataframe.drop('index', axis=1, inplace=True)
-        primary_dataframe.to_csv(COMPILED_WR_DATA)
+    with profiler.stage('create_wr_csv'):
+        build_position_csv(COMPILED_WR_DATA, MAIN_WR_CSV, NECESSARY_WR_COLUMNS, WR_DATAPOINTS, table_cache, manifest, WR_IDENTITY_REPORT)
 
     
-def create_qb_csv() -> None:
+def create_qb_csv(table_cache: md.SourceTableCache=None, manifest: dict=None) -> None:
     """
     Create a containing all the QB data for QBs with an ADP, sorted by ADP.
 
+    :param table_cache: A SourceTableCache shared with the other pipelines, or None to use a private cache (default None)
+    :param manifest: A build manifest shared with the other pipelines, or None to load and save the manifest file (default None)
     :return: None.
     """
-    if not os.path.exists(COMPILED_QB_DATA):
-        primary_dataframe = pd.read_csv(MAIN_QB_CSV, usecols = NECESSARY_QB_COLUMNS)
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_ADPS, 1, 5, 'ADP')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_AGE, 1, 4, 'age')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, PLAYER_PASS_GRADE, 0, 23, 'offenseGrade')
-        primary_dataframe = md.add_extra_datapoints(primary_dataframe, TEAM_OL_RANK, 0, 1, 'olRank', base_index = 1)
-        primary_dataframe = primary_dataframe.sort_values('ADP')
-        primary_dataframe = primary_dataframe.dropna(subset=['ADP'])
-        primary_dataframe.reset_index(inplace=True)
-        primary_dataframe.drop('index', axis=1, inplace=True)
-        primary_dataframe.to_csv(COMPILED_QB_DATA)
+    with profiler.stage('create_qb_csv'):
+        build_position_csv(COMPILED_QB_DATA, MAIN_QB_CSV, NECESSARY_QB_COLUMNS, QB_DATAPOINTS, table_cache, manifest, QB_IDENTITY_REPORT)
 
 
 def create_analytical_function(stat_file: str, rel_columns: list, file_name: str, analyzer):
@@ -131,70 +264,230 @@ def create_analytical_function(stat_file: str, rel_columns: list, file_name: str
         """
         Turn a CSV into a DataFrame, analyze it, and create a new CSV containing rows that only meet specific conditions.
         """
-        player_candidates = pd.read_csv(stat_file, usecols = rel_columns, low_memory = True)
-        qualified_players = analyzer(player_candidates)
-        qualified_players.reset_index(inplace=True)
-        qualified_players.drop('index', axis=1, inplace=True)
-        if not os.path.exists(CALCULATIONS_FOLDER):
+        with profiler.stage(f'analysis {os.path.basename(file_name)}') as details:
+            player_candidates = sch.apply_schema(pd.read_csv(stat_file, usecols = rel_columns, low_memory = True))
+            details['rowsIn'] = len(player_candidates.index)
+            qualified_players = analyzer(player_candidates)
+            qualified_players.reset_index(inplace=True)
+            qualified_players.drop('index', axis=1, inplace=True)
+            if not os.path.exists(CALCULATIONS_FOLDER):
+                final_directory = os.path.join(os.getcwd(), CALCULATIONS_FOLDER)
+                os.makedirs(final_directory)
+            qualified_players.to_csv(file_name)
+            details['rowsOut'] = len(qualified_players.index)
+    return analysis
+
+
+def create_position_analysis(stat_file: str, rel_columns: list, tiers: list, rules: dict=RULES):
+    """
+    Create a function that loads a compiled position CSV once and generates a filtered CSV for every tier of that position.
+    Only the columns and the ADP window the tiers use are loaded (see analysis_plan).
+
+    :param stat_file: A string containing the name of a file used to gather initial statistics from.
+    :param rel_columns: A list containing strings representing the union of the columns used by every tier.
+    :param tiers: A list of (file_name, tier_name) tuples, naming tiers in the rule specification.
+    :param rules: A dictionary containing the rule specification (default RULES)
+    :return: A function.
+    """
+    tier_specs = [rules['tiers'][tier_name] for _, tier_name in tiers]
+    masks = [rule_engine.compile_tier(tier_spec, rules['features']) for tier_spec in tier_specs]
+    plan = analysis_plan(stat_file, rel_columns, tier_specs, rules)
+
+    def analysis() -> list:
+        """
+        Turn a CSV into a DataFrame once, evaluate every tier as a boolean mask over it, and create a CSV for each tier.
+
+        :return: A list containing the DataFrame of qualified players for each tier, in the order of tiers.
+        """
+        with profiler.stage(f'analysis {os.path.basename(stat_file)}'):
+            player_candidates = plan.collect()
+            with profiler.stage('features', 'filter', len(player_candidates.index)):
+                arrays = rule_engine.column_arrays(player_candidates, tier_specs, rules['features'])
+            output_columns = [column for column in player_candidates.columns if column in OUTPUT_COLUMNS]
             final_directory = os.path.join(os.getcwd(), CALCULATIONS_FOLDER)
-            os.makedirs(final_directory)
-        qualified_players.to_csv(file_name)
+            os.makedirs(final_directory, exist_ok=True)
+            qualified_tiers = []
+            for (file_name, tier_name), mask in zip(tiers, masks):
+                with profiler.stage(f'tier {tier_name}', 'filter', len(player_candidates.index)) as details:
+                    qualified_players = player_candidates.loc[mask(arrays), output_columns]
+                    qualified_players = qualified_players.reset_index(drop=True)
+                    details['rowsOut'] = len(qualified_players.index)
+                with profiler.stage(f'write {os.path.basename(file_name)}', 'write', len(qualified_players.index)):
+                    cs.write_table(qualified_players, file_name)
+                qualified_tiers.append(qualified_players)
+        return qualified_tiers
     return analysis
 
 
-def all_breakout_players() -> None:
+def merge_breakout_tiers(tiers: list, chunk_size: int=BREAKOUT_CHUNK_SIZE):
+    """
+    Merge tiers that are each sorted by ADP into chunks of a single board sorted by ADP, without re-sorting.
+
+    :param tiers: A list of (position, DataFrame) tuples, where every DataFrame has the same columns and is sorted by ADP.
+    :param chunk_size: An integer representing the number of rows per chunk (default BREAKOUT_CHUNK_SIZE)
+    :return: A generator of DataFrames with an added categorical 'Position' column, yielding at least one chunk.
+    """
+    merged = heapq.merge(*[
+        zip(tier['ADP'].tolist(), itertools.repeat(tier_index), range(len(tier.index)))
+        for tier_index, (_, tier) in enumerate(tiers)
+    ])
+    chunk_number = 0
+    while True:
+        batch = list(itertools.islice(merged, chunk_size))
+        if not batch and chunk_number > 0:
+            return
+        tier_indexes = np.fromiter((tier_index for _, tier_index, _ in batch), dtype=np.intp, count=len(batch))
+        rows = np.fromiter((row for _, _, row in batch), dtype=np.intp, count=len(batch))
+        parts, order = [], []
+        for tier_index, (position, tier) in enumerate(tiers):
+            selected = np.flatnonzero(tier_indexes == tier_index)
+            codes = np.full(len(selected), POSITION_DTYPE.categories.get_loc(position))
+            parts.append(tier.iloc[rows[selected]].assign(Position=pd.Categorical.from_codes(codes, dtype=POSITION_DTYPE)))
+            order.append(selected)
+        chunk = pd.concat(parts, ignore_index=True)
+        yield chunk.iloc[np.argsort(np.concatenate(order), kind='stable')]
+        chunk_number += 1
+
+
+def all_breakout_players(tier_results: list=None, output_file: str=ALL_BREAKOUT_PLAYER_FILE) -> None:
     """
     Create a CSV with all of the breakout players found from the analysis. 
 
+    :param tier_results: A list of (position, file_name, DataFrame) tuples containing every tier, where a DataFrame of None is read from file_name, or None to read the tier CSVs (default None)
+    :param output_file: A string containing the name of the CSV to create (default ALL_BREAKOUT_PLAYER_FILE)
+    :return: None.
+    """
+    if tier_results is None:
+        tier_results = [(position, SEASON_FILES[file_key], None) for position, _, _, _, _, _, tiers in POSITION_PIPELINES for file_key, _ in tiers]
+    with profiler.stage('all_breakout_players') as details:
+        tiers = [(position, cs.read_table(file_name, index_col=0) if tier is None else tier) for position, file_name, tier in tier_results]
+        details['rowsIn'] = sum(len(tier.index) for _, tier in tiers)
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        details['rowsOut'] = cs.write_table_chunks(merge_breakout_tiers(tiers), output_file)
+
+
+def tier_parameters(rel_columns: list, tier_name: str, rules: dict=RULES) -> dict:
+    """
+    Describe everything besides the compiled CSV that determines the contents of a tier CSV.
+
+    :param rel_columns: A list containing strings representing the columns read for the tier.
+    :param tier_name: A string naming the tier in the rule specification.
+    :param rules: A dictionary containing the rule specification (default RULES)
+    :return: A dictionary.
+    """
+    return {'columns': rel_columns, 'tier': rules['tiers'][tier_name], 'features': rules['features'], 'output': OUTPUT_COLUMNS}
+
+
+def analyze_position(position: str, stat_file: str, rel_columns: list, tiers: list, manifest: dict) -> list:
+    """
+    Generate the tier CSVs of a position with a single scan, unless all of them are up to date.
+
+    :param position: A string containing the position label of the tiers.
+    :param stat_file: A string containing the name of the compiled position CSV.
+    :param rel_columns: A list containing strings representing the union of the columns used by every tier.
+    :param tiers: A list of (file_name, tier_name) tuples, naming tiers in the rule specification.
+    :param manifest: A build manifest.
+    :return: A list of (position, file_name, DataFrame) tuples, where the DataFrame is None for tiers that were not rebuilt.
+    """
+    qualified_tiers = [None for _ in tiers]
+    if any(bg.is_stale(manifest, file_name, [stat_file], tier_parameters(rel_columns, tier_name)) for file_name, tier_name in tiers):
+        qualified_tiers = create_position_analysis(stat_file, rel_columns, tiers)()
+        for file_name, tier_name in tiers:
+            bg.record(manifest, file_name, [stat_file], tier_parameters(rel_columns, tier_name))
+    return [(position, file_name, tier) for (file_name, _), tier in zip(tiers, qualified_tiers)]
+
+
+def combine_breakout_players(tier_results: list, manifest: dict) -> None:
+    """
+    Create the master CSV, unless none of the tier CSVs changed.
+
+    :param tier_results: A list of (position, file_name, DataFrame) tuples containing every tier.
+    :param manifest: A build manifest.
     :return: None.
     """
-    legendary_rbs = pd.read_csv(LEGENDARY_RB_FILE)
-    deadzone_rbs = pd.read_csv(DEADZONE_RB_FILE)
-    hero_rbs = pd.read_csv(HERO_RB_FILE)
-    breakout_wr = pd.read_csv(BREAKOUT_WR_FILE)
-    must_draft_qbs = pd.read_csv(MUST_DRAFT_QB_FILE)
-    legendary_rbs['Position'] = ['RB' for _ in range(len(legendary_rbs.index))]
-    deadzone_rbs['Position'] = ['RB' for _ in range(len(deadzone_rbs.index))]
-    hero_rbs['Position'] = ['RB' for _ in range(len(hero_rbs.index))]
-    breakout_wr['Position'] = ['WR' for _ in range(len(breakout_wr.index))]
-    must_draft_qbs['Position'] = ['QB' for _ in range(len(must_draft_qbs.index))]
-    breakout_player_dataframe = pd.concat([legendary_rbs, deadzone_rbs, hero_rbs, breakout_wr, must_draft_qbs])
-    breakout_player_dataframe = breakout_player_dataframe.sort_values('ADP')
-    breakout_player_dataframe.drop('Unnamed: 0', axis=1, inplace=True)
-    breakout_player_dataframe.reset_index(inplace=True)
-    breakout_player_dataframe.drop('index', axis=1, inplace=True)
-    if not os.path.exists(CALCULATIONS_FOLDER):
-        final_directory = os.path.join(os.getcwd(), CALCULATIONS_FOLDER)
-        os.makedirs(final_directory)
-    breakout_player_dataframe.to_csv(ALL_BREAKOUT_PLAYER_FILE)
+    tier_files = [file_name for _, file_name, _ in tier_results]
+    if bg.is_stale(manifest, ALL_BREAKOUT_PLAYER_FILE, tier_files, OUTPUT_COLUMNS):
+        all_breakout_players(tier_results)
+        bg.record(manifest, ALL_BREAKOUT_PLAYER_FILE, tier_files, OUTPUT_COLUMNS)
+
+
+def create_pipeline_tasks(table_cache: md.SourceTableCache, manifest: dict) -> dict:
+    """
+    Describe the pipeline as a graph of tasks, where only the master CSV waits on more than one position.
+
+    :param table_cache: A SourceTableCache shared by every task.
+    :param manifest: A build manifest shared by every task.
+    :return: A dictionary mapping task names to (function, dependencies) tuples.
+    """
+    compile_functions = {'RB': create_rb_csv, 'WR': create_wr_csv, 'QB': create_qb_csv}
+    tasks = {}
+    compile_dependencies = []
+    if season_config.ADP_SOURCE == 'consensus':
+        tasks['adp_consensus'] = (lambda _: ac.build_consensus(SEASON_FILES, manifest = manifest), [])
+        compile_dependencies = ['adp_consensus']
+    for position, stat_file, rel_columns, tiers in POSITION_ANALYSES:
+        tasks[f'compile_{position}'] = (lambda _, create_csv=compile_functions[position]: create_csv(table_cache, manifest), compile_dependencies)
+        tasks[f'analyze_{position}'] = (
+            lambda _, arguments=(position, stat_file, rel_columns, tiers): analyze_position(*arguments, manifest),
+            [f'compile_{position}'],
+        )
+    analysis_tasks = [f'analyze_{position}' for position, _, _, _ in POSITION_ANALYSES]
+    tasks['all_breakout_players'] = (
+        lambda results: combine_breakout_players([tier for name in analysis_tasks for tier in results[name]], manifest),
+        analysis_tasks,
+    )
+    return tasks
+
+
+def explain_pipelines() -> str:
+    """
+    Describe the optimized plan of every compiled table and tier analysis.
+
+    :return: A string.
+    """
+    plans = []
+    for position, main_key, necessary_columns, datapoint_specs, compiled_key, rel_columns, tiers in POSITION_PIPELINES:
+        datapoints = season_config.resolve_datapoints(datapoint_specs, SEASON_FILES)
+        tier_specs = [RULES['tiers'][tier_name] for _, tier_name in tiers]
+        plans.append(f'compile {position}:\n{position_plan(SEASON_FILES[main_key], necessary_columns, datapoints).explain()}')
+        plans.append(f'analyze {position}:\n{analysis_plan(SEASON_FILES[compiled_key], rel_columns, tier_specs).explain()}')
+    return '\n\n'.join(plans)
 
 
 def main() -> None:
     """
     Execute the program.
     """
-    # Create Compiled Data CSVs
-    create_rb_csv()
-    create_wr_csv()
-    create_qb_csv()
-
-    # Create player analysis functions.
-    legendary_runningbacks = create_analytical_function(COMPILED_RB_DATA, LEGENDARY_RB_REL_COLUMNS, LEGENDARY_RB_FILE, rba.remove_non_legendary_rbs)
-    deadzone_runningbacks = create_analytical_function(COMPILED_RB_DATA, DEADZONE_RB_REL_COLUMNS, DEADZONE_RB_FILE, rba.remove_deadzone_rbs)
-    hero_pair_runningbacks = create_analytical_function(COMPILED_RB_DATA, HERO_RB_REL_COLUMNS, HERO_RB_FILE, rba.remove_non_hero_rb_pairs)
-    breakout_receivers = create_analytical_function(COMPILED_WR_DATA, BREAKOUT_WR_REL_COLUMNS, BREAKOUT_WR_FILE, wra.remove_non_breakout_wr)
-    must_draft_quarterbacks = create_analytical_function(COMPILED_QB_DATA, MUST_DRAFT_QB_REL_COLUMNS, MUST_DRAFT_QB_FILE, qba.remove_non_breakout_qbs)
-
-    # Execute player analysis functions.
-    legendary_runningbacks()
-    deadzone_runningbacks()
-    hero_pair_runningbacks()
-    breakout_receivers()
-    must_draft_quarterbacks()
-
-    # Create master CSV.
-    all_breakout_players()
-    
+    parser = argparse.ArgumentParser(description = 'Identify breakout players for the upcoming season.')
+    parser.add_argument('--jobs', type = int, default = os.cpu_count(), help = 'The number of pipeline tasks to run at once.')
+    parser.add_argument('--timings', action = 'store_true', help = 'Print the wall time of every task and the critical path.')
+    parser.add_argument('--profile', nargs = '?', const = profiler.PROFILE_TRACE_FILE, metavar = 'TRACE_FILE', help = f'Record every stage and write a Chrome trace (default {profiler.PROFILE_TRACE_FILE}).')
+    parser.add_argument('--rebuild', action = 'store_true', help = 'Rebuild every CSV, even if its inputs did not change.')
+    parser.add_argument('--explain', action = 'store_true', help = 'Print the optimized plan of every compiled table and tier analysis, then exit.')
+    arguments = parser.parse_args()
+    if arguments.explain:
+        print(explain_pipelines())
+        return
+    if arguments.profile:
+        profiler.enable()
+
+    # Parse each auxiliary CSV once, and only rebuild CSVs whose inputs changed.
+    manifest = bg.load_manifest()
+    if arguments.rebuild:
+        manifest['artifacts'] = {}
+    table_cache = md.SourceTableCache()
+    table_cache.request_datapoints(RB_DATAPOINTS + WR_DATAPOINTS + QB_DATAPOINTS)
+
+    # Run the RB, WR and QB pipelines concurrently, then create the master CSV.
+    tasks = create_pipeline_tasks(table_cache, manifest)
+    with profiler.stage('pipeline'):
+        _, timings = ts.run_tasks(tasks, arguments.jobs)
+    bg.save_manifest(manifest)
+    if arguments.timings:
+        print(ts.format_report(tasks, timings))
+    if arguments.profile:
+        profiler.write_trace(arguments.profile)
+        print(profiler.format_summary())
 
 
 if __name__ == '__main__':
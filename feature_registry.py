@@ -0,0 +1,248 @@
+"""
+A python module that declares every derived metric once and computes it on demand, for every tier and query that uses it.
+
+A FeatureRegistry holds the 'features' of a rule specification: each feature is an arithmetic formula over compiled
+columns and other features, such as "recTarg / ((teamTargets / 17) * games) * 100". The registry:
+- Resolves dependencies: a feature may use other features, which are computed first. Cycles are rejected when the
+  registry is created.
+- Computes features with NumPy on demand: only the requested features and the ones they depend on.
+- Memoizes every column and feature per table version, so any number of tier masks and ad-hoc queries over the same
+  table share one computation. Memoized arrays are read-only, and the table itself is never copied or changed.
+
+A table version is the DataFrame object and a version number chosen by the caller (0 by default). Tables are treated
+as immutable, so a caller that changes a table in place must pass a new version. The memo of a table is freed with it.
+"""
+
+
+# Imports
+import ast
+import json
+import operator
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import table_schema as sch
+
+
+# Constants
+ARITHMETIC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+# Shared registries, by feature specification.
+_REGISTRIES = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+class FeatureRegistry:
+    """
+    The features of a rule specification, with their inputs, in dependency order, and their memoized values per table.
+    """
+
+    def __init__(self, features: dict):
+        """
+        Compile every feature and order them so that every feature comes after the features it uses.
+
+        :param features: A dictionary mapping feature names to formulas.
+        """
+        self.formulas = dict(features)
+        self.inputs = {name: formula_columns(formula) for name, formula in self.formulas.items()}
+        self.order = dependency_order(self.inputs)
+        self._functions = {name: compile_formula(formula) for name, formula in self.formulas.items()}
+        self._memos = {}
+        self._lock = threading.RLock()
+
+    def resolve(self, names) -> tuple:
+        """
+        Find the compiled columns and the features needed to compute some columns and features.
+
+        :param names: An iterable of compiled column and feature names.
+        :return: A tuple containing a list of compiled column names, in order of first use, and a list of feature
+                 names, in dependency order.
+        """
+        columns, features = {}, set()
+
+        def visit(name: str) -> None:
+            """
+            Add a name and, for a feature, everything it uses.
+
+            :param name: A compiled column or feature name.
+            """
+            if name not in self.formulas:
+                columns[name] = None
+            elif name not in features:
+                features.add(name)
+                for input_name in self.inputs[name]:
+                    visit(input_name)
+        for name in names:
+            visit(name)
+        return list(columns), [name for name in self.order if name in features]
+
+    def dependents(self, column: str) -> list:
+        """
+        List the features that use a column, directly or through other features.
+
+        :param column: A compiled column or feature name.
+        :return: A list of feature names, in dependency order.
+        """
+        affected, dependents = {column}, []
+        for name in self.order:
+            if affected.intersection(self.inputs[name]):
+                affected.add(name)
+                dependents.append(name)
+        return dependents
+
+    def evaluate(self, name: str, arrays: dict) -> np.ndarray:
+        """
+        Calculate a feature from arrays of its inputs, without memoizing it.
+
+        :param name: A feature name.
+        :param arrays: A dictionary mapping the feature's inputs to float arrays.
+        :return: A float array.
+        """
+        return self._functions[name](arrays)
+
+    def compute(self, table: pd.DataFrame, names, version: int=0) -> dict:
+        """
+        Return some columns and features of a table, computing only those not yet memoized for the table version.
+
+        Integer columns without missing values keep their narrow type (see table_schema.column_values), so conditions
+        compare the table's own arrays. Every feature input is a float64 array.
+
+        :param table: A DataFrame containing compiled player data.
+        :param names: An iterable of compiled column and feature names.
+        :param version: An integer identifying the contents of the table (default 0)
+        :return: A new dictionary mapping the columns and features needed by names, including the ones they depend on,
+                 to read-only arrays.
+        """
+        columns, features = self.resolve(names)
+        with self._lock:
+            memo = self._memos.get(id(table))
+            if memo is None:
+                weakref.finalize(table, self._memos.pop, id(table), None)
+            if memo is None or memo['version'] != version:
+                memo = self._memos[id(table)] = {'version': version, 'values': {}, 'wide': {}}
+            values, wide = memo['values'], memo['wide']
+            for column in columns:
+                if column not in values:
+                    values[column] = read_only(sch.column_values(table[column]))
+            for name in features:
+                if name not in values:
+                    for input_name in self.inputs[name]:
+                        if input_name not in wide:
+                            wide[input_name] = read_only(values[input_name].astype(np.float64, copy=False))
+                    values[name] = read_only(np.asarray(self.evaluate(name, wide), dtype=np.float64))
+            return {name: values[name] for name in columns + features}
+
+
+def registry(features: dict) -> FeatureRegistry:
+    """
+    Return the registry shared by every user of a feature specification, creating it on first use.
+
+    :param features: A dictionary mapping feature names to formulas.
+    :return: A FeatureRegistry.
+    """
+    key = json.dumps(features, sort_keys=True)
+    with _REGISTRIES_LOCK:
+        if key not in _REGISTRIES:
+            _REGISTRIES[key] = FeatureRegistry(features)
+        return _REGISTRIES[key]
+
+
+def dependency_order(inputs: dict) -> list:
+    """
+    Order features so that every feature comes after the features it uses, keeping the declared order otherwise.
+
+    :param inputs: A dictionary mapping feature names to the names their formulas use.
+    :return: A list of feature names.
+    """
+    order, visiting = [], []
+
+    def visit(name: str) -> None:
+        """
+        Add a feature after every feature it uses.
+
+        :param name: A feature name.
+        """
+        if name in order:
+            return
+        if name in visiting:
+            cycle = visiting[visiting.index(name):] + [name]
+            raise ValueError(f'Features depend on each other in a cycle: {" -> ".join(cycle)}')
+        visiting.append(name)
+        for input_name in inputs[name]:
+            if input_name in inputs:
+                visit(input_name)
+        visiting.pop()
+        order.append(name)
+    for name in inputs:
+        visit(name)
+    return order
+
+
+def read_only(values: np.ndarray) -> np.ndarray:
+    """
+    Protect a memoized array from changes.
+
+    :param values: A NumPy array.
+    :return: A read-only view of values.
+    """
+    view = values.view()
+    view.flags.writeable = False
+    return view
+
+
+def formula_columns(formula: str) -> list:
+    """
+    Find the names of the columns and features a feature formula reads.
+
+    :param formula: A string containing an arithmetic formula.
+    :return: A list containing the names referenced by the formula, in order of appearance.
+    """
+    names = [node.id for node in ast.walk(ast.parse(formula, mode='eval')) if isinstance(node, ast.Name)]
+    return list(dict.fromkeys(names))
+
+
+def compile_formula(formula: str):
+    """
+    Compile an arithmetic feature formula into a function over a dictionary of NumPy arrays.
+
+    :param formula: A string containing an arithmetic formula using +, -, *, /, parentheses, numbers and names.
+    :return: A function that takes a dictionary of arrays and returns the array of feature values.
+    """
+    tree = ast.parse(formula, mode='eval')
+
+    def evaluate(node, arrays: dict):
+        """
+        Evaluate a single node of the formula.
+
+        :param node: An ast node.
+        :param arrays: A dictionary mapping column names to arrays.
+        :return: An array or a number.
+        """
+        if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+            return ARITHMETIC[type(node.op)](evaluate(node.left, arrays), evaluate(node.right, arrays))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -evaluate(node.operand, arrays)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name):
+            return arrays[node.id]
+        raise ValueError(f'Unsupported expression in feature formula: {formula}')
+
+    def feature(arrays: dict) -> np.ndarray:
+        """
+        Calculate the feature.
+
+        :param arrays: A dictionary mapping column names to arrays.
+        :return: An array containing the feature values.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return evaluate(tree.body, arrays)
+    return feature
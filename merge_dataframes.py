@@ -5,22 +5,284 @@ REQUIREMENTS FOR CSVS:
 - CSVs must only contain data for one 'position' (i.e. only RB data, only team data, etc.).
 - CSVs must have unique column headers.
 - All CSVs must have the same players.
+
+Players and teams are matched through player_identity, so names and team codes spelled differently by different
+providers still match, and identifiers that cannot be matched are reported instead of silently becoming NaN. When both
+tables have a team column, an approximate name match must also agree on the team.
 """
 
 
 # Imports
+import os
+import threading
+
+import numpy as np
 import pandas as pd
 
+import columnar_store as cs
+import player_identity as pi
+import profiler
+import season_config
+import table_schema as sch
+
 
 # Constants
-YEAR = 2022
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
 NECESSARY_RB_COLUMNS = ['player', 'team', 'games', 'recTarg', 'rushCarries']
-TEAM_OL_RANK = f'./{YEAR - 1}_data/data_team_olrank.csv'
-TEAM_TARGETS = f'./{YEAR - 1}_data/data_team_trgt%.csv'
-PLAYER_RUSH_GRADES = f'./{YEAR - 1}_data/data_player_rushgrade.csv'
-PLAYER_AGE = f'./{YEAR - 1}_data/data_player_age.csv'
-PLAYER_ADPS = f'./{YEAR - 1}_data/data_player_adp.csv'
-MAIN_RB_CSV = f'./{YEAR - 1}_data/data_rb_stats.csv'
+TEAM_OL_RANK = SEASON_FILES['TEAM_OL_RANK']
+TEAM_TARGETS = SEASON_FILES['TEAM_TARGETS']
+PLAYER_RUSH_GRADES = SEASON_FILES['PLAYER_RUSH_GRADES']
+PLAYER_AGE = SEASON_FILES['PLAYER_AGE']
+PLAYER_ADPS = SEASON_FILES['PLAYER_ADPS']
+MAIN_RB_CSV = SEASON_FILES['MAIN_RB_CSV']
+COMPILED_RB_DATA = SEASON_FILES['COMPILED_RB_DATA']
+
+
+class SourceTableCache:
+    """
+    A run-scoped cache that parses each auxiliary CSV once and shares the resulting DataFrame with every merge.
+
+    Tables are keyed by path and modification time, and only the columns requested by a consumer are kept.
+    The cache can be shared between threads; concurrent reads of the same CSV wait for a single parse.
+    The identity index of each identifier column is built once per table and shared the same way.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.parse_counts = {}
+        self._requested = {}
+        self._tables = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    def request(self, csv_name: str, column_indexes) -> None:
+        """
+        Record that a consumer needs some columns from a CSV, so the CSV is parsed with the union of all requests.
+
+        :param csv_name: A string representing the name of the CSV.
+        :param column_indexes: An iterable of integers representing the indexes of the columns needed from the CSV.
+        """
+        self._requested.setdefault(os.path.abspath(csv_name), set()).update(column_indexes)
+
+    def request_datapoints(self, datapoints: list) -> None:
+        """
+        Record the columns needed by a list of datapoint specifications.
+
+        :param datapoints: A list of (csv_name, identifier_index, added_indexes, base_index) tuples.
+        """
+        for csv_name, identifier_index, added_indexes, _ in datapoints:
+            team_index = team_column_index(csv_name, identifier_index)
+            self.request(csv_name, [identifier_index, *added_indexes] + ([] if team_index is None else [team_index]))
+
+    def read(self, csv_name: str, column_indexes=()) -> tuple:
+        """
+        Return the cached table for a CSV, parsing it only if it has not been parsed since it was last modified.
+
+        :param csv_name: A string representing the name of the CSV.
+        :param column_indexes: An iterable of integers representing indexes that must be present in the table.
+        :return: A tuple containing the DataFrame and a dictionary mapping column indexes in the CSV to column names.
+        """
+        path = os.path.abspath(csv_name)
+        with self._lock:
+            self.request(path, column_indexes)
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+        with path_lock:
+            return self._read(path)
+
+    def _read(self, path: str) -> tuple:
+        """
+        Return the cached table for a CSV, parsing it if needed, while holding the CSV's lock.
+
+        :param path: A string containing the absolute name of the CSV.
+        :return: A tuple containing the DataFrame and a dictionary mapping column indexes in the CSV to column names.
+        """
+        key = (path, os.stat(path).st_mtime_ns)
+        with self._lock:
+            requested = set(self._requested[path])
+            cached = self._tables.get(key)
+            if cached is not None and requested.issubset(cached[1]):
+                self.hits += 1
+                return cached
+            self.misses += 1
+            self.parse_counts[path] = self.parse_counts.get(path, 0) + 1
+        usecols = sorted(requested)
+        with profiler.stage(f'parse {os.path.basename(path)}', 'read') as details:
+            table = cs.read_table(path, usecols=usecols)
+            details['rowsOut'] = len(table.index)
+        cached = (table, dict(zip(usecols, table.columns)))
+        with self._lock:
+            self._tables = {table_key: value for table_key, value in self._tables.items() if table_key[0] != path}
+            self._tables[key] = cached
+            self._indexes = {index_key: value for index_key, value in self._indexes.items() if index_key[0] != path}
+        return cached
+
+    def identity_index(self, csv_name: str, identifier_index: int) -> pi.PlayerIdentityIndex:
+        """
+        Return the identity index of a CSV's identifier column, building it only once per parsed table.
+
+        :param csv_name: A string representing the name of the CSV.
+        :param identifier_index: An integer representing the index of the identifier column.
+        :return: A PlayerIdentityIndex over the identifier column, with the CSV's teams if it has a team column.
+        """
+        path = os.path.abspath(csv_name)
+        team_index = team_column_index(path, identifier_index)
+        table, column_names = self.read(path, [identifier_index] + ([] if team_index is None else [team_index]))
+        with self._path_locks[path]:
+            key = (path, os.stat(path).st_mtime_ns, identifier_index)
+            if key not in self._indexes:
+                teams = None if team_index is None else table[column_names[team_index]]
+                self._indexes[key] = identity_index(table[column_names[identifier_index]], teams)
+            return self._indexes[key]
+
+
+def identity_index(identifiers: pd.Series, teams: pd.Series=None) -> pi.PlayerIdentityIndex:
+    """
+    Build the identity index of an identifier column, resolving team codes if the column holds teams and names otherwise.
+
+    :param identifiers: A series containing the identifier column of a source table.
+    :param teams: A series containing the team column of the source table, to confirm approximate name matches, or
+                  None (default None)
+    :return: A PlayerIdentityIndex over the identifiers.
+    """
+    kind = 'team' if str(identifiers.name).lower() in pi.TEAM_COLUMNS else 'player'
+    return pi.PlayerIdentityIndex(identifiers, kind, None if kind == 'team' else teams)
+
+
+def team_column(columns, identifier_column: str):
+    """
+    Find the team column of a table whose players are identified by another column.
+
+    :param columns: An iterable of column names.
+    :param identifier_column: The name of the identifier column.
+    :return: The name of the first team column other than the identifier column, or None if there is none.
+    """
+    return next((column for column in columns if str(column).lower() in pi.TEAM_COLUMNS and column != identifier_column), None)
+
+
+def team_column_index(csv_name: str, identifier_index: int):
+    """
+    Find the index of the team column of a CSV whose players are identified by another column, from its header.
+
+    :param csv_name: A string representing the name of the CSV.
+    :param identifier_index: An integer representing the index of the identifier column.
+    :return: An integer, or None if the CSV has no other team column.
+    """
+    header = list(pd.read_csv(csv_name, nrows=0).columns)
+    column = team_column(header, header[identifier_index])
+    return None if column is None else header.index(column)
+
+
+def base_teams(base_data: pd.DataFrame, base_index: int, index: pi.PlayerIdentityIndex):
+    """
+    Return the teams of the rows of a base table, if both it and the source of an identity index have teams.
+
+    :param base_data: A Pandas DataFrame.
+    :param base_index: The column in the base DataFrame matched with the source.
+    :param index: A PlayerIdentityIndex over the source.
+    :return: A series of teams, or None.
+    """
+    column = team_column(base_data.columns, base_data.columns[base_index])
+    return None if index.teams is None or column is None else base_data[column]
+
+
+def join_datapoints(base_data: pd.DataFrame, source_data: pd.DataFrame, identifier_column: str, added_columns: dict, base_index: int=0, index: pi.PlayerIdentityIndex=None, report: list=None) -> pd.DataFrame:
+    """
+    Add several columns from source_data to the base_data DataFrame in a single hash-indexed pass.
+
+    :param base_data: A Pandas DataFrame.
+    :param source_data: A Pandas DataFrame containing the additional data.
+    :param identifier_column: The name of the column in source_data to use as an identifier to match with base_data.
+    :param added_columns: A dictionary mapping column names in source_data to the names of the columns to create in base_data.
+    :param base_index: The column in the base DataFrame to match the two DataFrames with (default 0)
+    :param index: A PlayerIdentityIndex over the identifier column of source_data, to match differently spelled
+                  identifiers, or None to match identifiers exactly (default None)
+    :param report: A list to append the DataFrame of identifiers that did not match exactly to (default None)
+    :return: base_data with the added columns, which keep their type in source_data and are missing where the identifier
+             does not exist in source_data.
+    """
+    if index is not None:
+        positions, unmatched = index.resolve(base_data.iloc[:, base_index], base_teams(base_data, base_index, index))
+        matched = source_data[list(added_columns)].reset_index(drop=True).reindex(positions)
+        if report is not None:
+            report.append(unmatched)
+    else:
+        lookup = source_data.dropna(subset=[identifier_column])
+        lookup = lookup.drop_duplicates(subset=[identifier_column], keep='first')
+        lookup = lookup.set_index(identifier_column)[list(added_columns)]
+        matched = lookup.reindex(base_data.iloc[:, base_index].to_numpy())
+    for source_column, column_name in added_columns.items():
+        base_data[column_name] = matched[source_column].array
+    return base_data
+
+
+def add_extra_datapoints_bulk(base_data: pd.DataFrame, csv_name: str, identifier_index: int, added_indexes: dict, base_index: int=0, table_cache: SourceTableCache=None, report: list=None) -> pd.DataFrame:
+    """
+    Add multiple columns from a single CSV to the base_data DataFrame, reading the CSV once.
+
+    :param base_data: A Pandas DataFrame.
+    :param csv_name: A string representing the name of the CSV to add columns from.
+    :param identifier_index: An integer representing the index to use as an identifier to match with base_data.
+    :param added_indexes: A dictionary mapping the indexes of the columns to add to the names they should have in base_data.
+    :param base_index: The column in the base DataFrame to match the two DataFrames with (default 0)
+    :param table_cache: A SourceTableCache to read the CSV through, or None to parse the CSV directly (default None)
+    :param report: A list to append a DataFrame of the identifiers that did not match exactly to (default None)
+    :return: base_data with the added columns.
+    """
+    if table_cache is None:
+        df = sch.apply_schema(pd.read_csv(csv_name))
+        column_names = dict(enumerate(df.columns))
+        teams = team_column(df.columns, column_names[identifier_index])
+        index = identity_index(df[column_names[identifier_index]], None if teams is None else df[teams])
+    else:
+        df, column_names = table_cache.read(csv_name, [identifier_index, *added_indexes])
+        index = table_cache.identity_index(csv_name, identifier_index)
+    added_columns = {column_names[index]: column_name for index, column_name in added_indexes.items()}
+    unmatched = [] if report is not None else None
+    base_data = join_datapoints(base_data, df, column_names[identifier_index], added_columns, base_index, index = index, report = unmatched)
+    if report is not None:
+        report.append(unmatched[0].assign(source = csv_name, column = base_data.columns[base_index]))
+    return base_data
+
+
+def add_grouped_datapoints(base_data: pd.DataFrame, csv_names: dict, identifier_index: int, added_indexes: dict, group_column: str, base_index: int=0, table_cache: SourceTableCache=None, report: list=None) -> pd.DataFrame:
+    """
+    Add multiple columns to a DataFrame that stacks several groups, such as seasons, from a different CSV per group.
+
+    The identifiers of every group are resolved by the identity index of the group's CSV, into one array of positions in
+    the CSVs stacked in group order, so the columns are added to every group in a single pass.
+
+    :param base_data: A Pandas DataFrame.
+    :param csv_names: A dictionary mapping the values of group_column to the names of the CSVs to add columns from.
+    :param identifier_index: An integer representing the index to use as an identifier to match with base_data.
+    :param added_indexes: A dictionary mapping the indexes of the columns to add to the names they should have in base_data.
+    :param group_column: The name of the column of base_data holding the group of every row.
+    :param base_index: The column in the base DataFrame to match the DataFrames with (default 0)
+    :param table_cache: A SourceTableCache to read the CSVs through, or None to use a private cache (default None)
+    :param report: A list to append a DataFrame of the identifiers that did not match exactly to, per group (default None)
+    :return: base_data with the added columns, missing for the rows of groups without a CSV.
+    """
+    table_cache = table_cache or SourceTableCache()
+    group_rows = base_data.groupby(group_column, sort=False).indices
+    positions = np.full(len(base_data.index), -1, dtype=np.intp)
+    sources, offset = [], 0
+    for group, csv_name in csv_names.items():
+        df, column_names = table_cache.read(csv_name, [identifier_index, *added_indexes])
+        rows = group_rows.get(group, np.empty(0, dtype=np.intp))
+        index = table_cache.identity_index(csv_name, identifier_index)
+        teams = base_teams(base_data, base_index, index)
+        found, unmatched = index.resolve(base_data.iloc[rows, base_index], None if teams is None else teams.iloc[rows])
+        positions[rows] = np.where(found == -1, -1, found + offset)
+        sources.append(df[[column_names[index] for index in added_indexes]].set_axis(list(added_indexes.values()), axis=1))
+        offset += len(df.index)
+        if report is not None:
+            report.append(unmatched.assign(source = csv_name, column = base_data.columns[base_index]))
+    matched = pd.concat(sources, ignore_index=True).reindex(positions)
+    for column_name in added_indexes.values():
+        base_data[column_name] = matched[column_name].array
+    return base_data
 
 
 def add_extra_datapoints(base_data: pd.DataFrame, csv_name: str, identifier_index: int, added_index: int, column_name: str, base_index: int=0) -> pd.DataFrame:
@@ -35,26 +297,7 @@ def add_extra_datapoints(base_data: pd.DataFrame, csv_name: str, identifier_inde
     :param base_index: The column in the base DataFrame to match the two DataFrames with (default 0)
     :return: base_data with an added column containing additional data.
     """
-    base_identifiers = base_data.iloc[:, base_index]
-    df = pd.read_csv(csv_name)
-    identifiers_in_csv = [identifier for identifier in df.iloc[:, identifier_index]]
-
-
-    def map_identifiers_in_csv(identifier: str) -> int:
-        """
-        Return the player data from the column being added to the player_data DataFrame.
-
-        :param identifier: A string containing an identifier from the adp DataFrame.
-        :return: A value representing the additional player information, or None if the player does not exist in the additional DataFrame.
-        """
-        if identifier in identifiers_in_csv:
-            return df.iloc[identifiers_in_csv.index(identifier), added_index]
-        else:
-            return
-
-            
-    base_data[column_name] = list(map(map_identifiers_in_csv, base_identifiers))
-    return base_data
+    return add_extra_datapoints_bulk(base_data, csv_name, identifier_index, {added_index: column_name}, base_index)
     
 
 def main() -> None:
@@ -62,15 +305,14 @@ def main() -> None:
     Execute the program.
     """
     # Create primary DataFrame.
-    primary_dataframe = pd.read_csv(MAIN_RB_CSV, usecols = NECESSARY_RB_COLUMNS)
+    primary_dataframe = sch.apply_schema(pd.read_csv(MAIN_RB_CSV, usecols = NECESSARY_RB_COLUMNS))
 
     # Add extra columns.
     primary_dataframe = add_extra_datapoints(primary_dataframe, PLAYER_ADPS, 1, 5, 'ADP')
     primary_dataframe = add_extra_datapoints(primary_dataframe, PLAYER_AGE, 1, 4, 'age')
     primary_dataframe = add_extra_datapoints(primary_dataframe, TEAM_OL_RANK, 0, 1, 'olRank', base_index = 1)
     primary_dataframe = add_extra_datapoints(primary_dataframe, TEAM_TARGETS, 0, 7, 'teamTargets', base_index = 1)
-    primary_dataframe = add_extra_datapoints(primary_dataframe, PLAYER_RUSH_GRADES, 0, 28, 'rushGrade', base_index = 0)
-    primary_dataframe = add_extra_datapoints(primary_dataframe, PLAYER_RUSH_GRADES, 0, 6, 'forcedMissedTackles', base_index = 0)
+    primary_dataframe = add_extra_datapoints_bulk(primary_dataframe, PLAYER_RUSH_GRADES, 0, {28: 'rushGrade', 6: 'forcedMissedTackles'}, base_index = 0)
 
     # Sort by ADP.
     primary_dataframe = primary_dataframe.sort_values('ADP')
@@ -81,7 +323,7 @@ def main() -> None:
     primary_dataframe.drop('index', axis=1, inplace=True)
 
     # Move to csv.
-    primary_dataframe.to_csv(f'./{YEAR - 1}_data/compiled_rb_data.csv')
+    primary_dataframe.to_csv(COMPILED_RB_DATA)
 
 
 if __name__ == "__main__":
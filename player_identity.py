@@ -0,0 +1,396 @@
+"""
+A python module that resolves player and team identifiers written differently by different data providers.
+
+Identifiers are resolved in three stages, each only for the identifiers the previous stage could not match:
+1. Exact: the raw identifier exists in the source.
+2. Normalized: the identifiers match after accents, case, punctuation and suffixes (Jr., III, ...) are removed,
+   and team codes are mapped to one canonical code (e.g. BLT and BAL both become BAL).
+3. Approximate (players only): a source name is a candidate if, compared with the identifier, either its surname is
+   one typo away (one character deleted, inserted or replaced, or two neighbouring characters swapped) and its first
+   name is the same, or its surname is the same and its first name is one typo away (Malcom and Malcolm) or a short
+   form of it (FIRST_NAME_SHORT_FORMS: Josh and Joshua, but not Ty and Tyler). When both the index and the identifiers
+   have teams, a candidate must also play for the same team, and a source player another identifier already matched
+   exactly or after normalization is not a candidate, since a table lists every player once. Candidates less similar than MINIMUM_SIMILARITY to the
+   identifier, with short forms spelled out, are dropped, and the most similar one left is accepted if it is clearly
+   better than the runner-up.
+Identifiers that cannot be resolved, or that match several source players equally well, are reported rather than
+guessed: a player missing from the source stays unmatched rather than taking a namesake's data.
+Within every stage, the first source row with a matching identifier wins.
+
+The blocks of the approximate stage, the source names by surname and by every spelling of their surname and first
+name with one character deleted, are built the first time an index needs them. Unresolved identifiers are deduplicated
+before they are matched, so each distinct name (and team) is looked up in the blocks once, however many rows it
+appears in.
+"""
+
+
+# Imports
+import difflib
+
+import numpy as np
+import pandas as pd
+
+
+# Constants
+TEAM_ALIASES = {
+    'ARZ': 'ARI', 'BLT': 'BAL', 'CLV': 'CLE', 'HST': 'HOU', 'JAC': 'JAX', 'LA': 'LAR', 'STL': 'LAR',
+    'LVR': 'LV', 'OAK': 'LV', 'SD': 'LAC', 'WSH': 'WAS', 'KCC': 'KC', 'GNB': 'GB', 'KAN': 'KC', 'NOR': 'NO',
+    'NWE': 'NE', 'SFO': 'SF', 'TAM': 'TB', 'SDG': 'LAC',
+}
+TEAM_COLUMNS = {'team', 'team_name'}
+NAME_SUFFIXES = r'\b(?:jr|sr|ii|iii|iv|v)\b'
+AMBIGUITY_MARGIN = 0.03
+MINIMUM_SIMILARITY = 0.85
+FIRST_NAME_SHORT_FORMS = {
+    'alex': 'alexander', 'andy': 'andrew', 'ben': 'benjamin', 'cam': 'cameron', 'chris': 'christopher',
+    'dan': 'daniel', 'danny': 'daniel', 'dave': 'david', 'gabe': 'gabriel', 'greg': 'gregory', 'jake': 'jacob',
+    'jeff': 'jeffrey', 'jim': 'james', 'jimmy': 'james', 'joe': 'joseph', 'josh': 'joshua', 'ken': 'kenneth',
+    'matt': 'matthew', 'mike': 'michael', 'mitch': 'mitchell', 'nate': 'nathan', 'nick': 'nicholas',
+    'pat': 'patrick', 'rob': 'robert', 'sam': 'samuel', 'steve': 'steven', 'tom': 'thomas', 'tony': 'anthony',
+    'will': 'william', 'zach': 'zachary',
+}
+FIRST_NAME_VARIANTS = {
+    full: {full} | {short for short, other in FIRST_NAME_SHORT_FORMS.items() if other == full} for full in FIRST_NAME_SHORT_FORMS.values()
+}
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """
+    Normalize player names so that spelling differences between providers disappear.
+
+    :param names: A series of player names.
+    :return: A series of lower case ASCII names without punctuation, suffixes or repeated spaces.
+    """
+    normalized = names.astype('str')
+    accented = ~normalized.str.isascii()
+    if accented.any():
+        normalized[accented] = normalized[accented].str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    normalized = normalized.str.lower().str.replace(r"[.'`]", '', regex=True)
+    normalized = normalized.str.replace(NAME_SUFFIXES, ' ', regex=True).str.replace(r'[^a-z0-9]+', ' ', regex=True)
+    return normalized.str.strip()
+
+
+def normalize_teams(teams: pd.Series) -> pd.Series:
+    """
+    Map team codes from every provider to one canonical code.
+
+    :param teams: A series of team codes.
+    :return: A series of canonical team codes.
+    """
+    normalized = teams.astype('str').str.strip().str.upper()
+    return normalized.replace(TEAM_ALIASES)
+
+
+class PlayerIdentityIndex:
+    """
+    An index over the identifier column of a source table, built once and reused by every join against that source.
+    """
+
+    def __init__(self, identifiers: pd.Series, kind: str='player', teams: pd.Series=None):
+        """
+        Build the exact and normalized lookups for a source's identifiers.
+
+        :param identifiers: A series containing the identifier of every row of the source, in row order.
+        :param kind: 'player' for player names or 'team' for team codes (default 'player')
+        :param teams: A series containing the team of every row of the source, or None if it has no team (default None)
+        """
+        self.kind = kind
+        self.teams = None if teams is None else team_keys(teams)
+        identifiers = identifiers.reset_index(drop=True)
+        present = identifiers[identifiers.notna()]
+        normalized = self.normalize(present)
+        spellings = pd.DataFrame({'key': normalized, 'raw': present}).drop_duplicates()
+        self.collisions = spellings[spellings['key'].duplicated(keep=False)].sort_values('key', kind='stable')
+        self._identifiers = identifiers.to_numpy(dtype=object)
+        self._exact = first_positions(present)
+        self._normalized = first_positions(normalized)
+        self._key_positions = np.full(len(identifiers.index), -1, dtype=np.intp)
+        self._key_positions[normalized.index.to_numpy()] = self._normalized.index.get_indexer(normalized)
+        self._collided = self.collisions.groupby('key', sort=False)['raw'].agg(' | '.join).to_dict()
+        self._blocks = None
+
+    def normalize(self, identifiers: pd.Series) -> pd.Series:
+        """
+        Normalize identifiers the same way as the index.
+
+        :param identifiers: A series of identifiers.
+        :return: A series of normalized identifiers.
+        """
+        return (normalize_teams if self.kind == 'team' else normalize_names)(identifiers)
+
+    @property
+    def blocks(self) -> dict:
+        """
+        Return the blocks of the approximate stage (see name_blocks), building them the first time they are needed.
+
+        :return: A dictionary of arrays.
+        """
+        if self._blocks is None:
+            self._blocks = name_blocks(self._normalized.index)
+        return self._blocks
+
+    def resolve(self, identifiers: pd.Series, teams: pd.Series=None) -> tuple:
+        """
+        Find the source row of every identifier.
+
+        :param identifiers: A series of identifiers to resolve.
+        :param teams: A series containing the team of every identifier, used to confirm approximate matches when the
+                      index has teams, or None (default None)
+        :return: A tuple containing an array of source row positions (-1 where unresolved) and a DataFrame reporting
+                 every identifier that did not match exactly, with 'identifier', 'status' ('normalized', 'approximate',
+                 'ambiguous' or 'unmatched') and 'match' (the source identifier, or the candidates if ambiguous) columns.
+        """
+        identifiers = identifiers.reset_index(drop=True)
+        present = identifiers.notna().to_numpy()
+        positions = np.full(len(identifiers), -1, dtype=np.intp)
+        positions[present] = self._exact.reindex(identifiers[present].to_numpy()).fillna(-1).to_numpy(dtype=np.intp)
+        remaining = np.flatnonzero(present & (positions == -1))
+        status = np.full(len(remaining), 'normalized', dtype=object)
+        candidates = np.full(len(remaining), None, dtype=object)
+
+        normalized = self.normalize(identifiers.iloc[remaining]).to_numpy(dtype=object)
+        found = self._normalized.reindex(normalized).fillna(-1).to_numpy(dtype=np.intp, copy=True)
+        collided = pd.Series(normalized, dtype=object).map(self._collided).to_numpy(dtype=object)
+        ambiguous = (found != -1) & pd.notna(collided)
+        status[ambiguous], candidates[ambiguous], found[ambiguous] = 'ambiguous', collided[ambiguous], -1
+        unresolved = np.flatnonzero((found == -1) & (status == 'normalized'))
+        if self.kind == 'player' and unresolved.size:
+            names = normalized[unresolved]
+            taken = np.zeros(len(self._normalized.index), dtype=bool)
+            taken[self._key_positions[np.concatenate([positions[positions != -1], found[found != -1]])]] = True
+            name_teams = None if teams is None or self.teams is None else team_keys(teams.reset_index(drop=True).iloc[remaining[unresolved]])
+            if name_teams is None:
+                codes, names = pd.factorize(names)
+                name_status, name_candidates, name_found = self.closest(names, taken=taken)
+            else:
+                codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([names, name_teams]))
+                name_status, name_candidates, name_found = self.closest(pairs.get_level_values(0).to_numpy(dtype=object), pairs.get_level_values(1).to_numpy(dtype=object), taken)
+            status[unresolved], candidates[unresolved], found[unresolved] = name_status[codes], name_candidates[codes], name_found[codes]
+        else:
+            status[unresolved] = 'unmatched'
+        positions[remaining] = found
+
+        matched = found != -1
+        candidates[matched] = self._identifiers[found[matched]]
+        report = pd.DataFrame({'identifier': identifiers.iloc[remaining].to_numpy(dtype=object), 'status': status, 'match': candidates})
+        return positions, report
+
+    def closest(self, names: np.ndarray, teams: np.ndarray=None, taken: np.ndarray=None) -> tuple:
+        """
+        Find the source names that most likely belong to the same players as some names, among the candidates in their
+        blocks (see the module docstring). Candidates are generated for all the names at once.
+
+        :param names: An object array of distinct normalized names (distinct with their teams, if any).
+        :param teams: An object array of the team keys (see team_keys) the candidates of every name must play for, or
+                      None to accept any team (default None)
+        :param taken: A boolean array marking the normalized source names, in index order, already matched to other
+                      identifiers, or None (default None)
+        :return: A tuple of three arrays: the status of every name, the candidates if ambiguous, and the source row
+                 position (-1 if none).
+        """
+        status = np.full(len(names), 'unmatched', dtype=object)
+        candidates = np.full(len(names), None, dtype=object)
+        found = np.full(len(names), -1, dtype=np.intp)
+        blocks = self.blocks
+        name_array, names = names, pd.Series(names, dtype=object).astype('str')
+        first_names, surnames = names.str.replace(r' .*', '', regex=True), names.str.replace(r'.* ', '', regex=True)
+        first_codes = blocks['firstNames'].get_indexer(first_names)
+        surname_codes = blocks['surnames'].get_indexer(surnames)
+
+        # Candidate parts: a similar surname with the same first name, a similar first name or a variant of the first
+        # name with the same surname.
+        known = np.flatnonzero(first_codes != -1)
+        rows, similar, _ = similar_words(surnames.iloc[known], blocks['surnameSpellings'])
+        name_rows, part_firsts, part_surnames = [known[rows]], [first_codes[known[rows]]], [similar]
+        known = np.flatnonzero(surname_codes != -1)
+        rows, similar, same = similar_words(first_names.iloc[known], blocks['firstSpellings'])
+        rows, similar = known[rows[~same]], similar[~same]
+        name_rows.append(rows), part_firsts.append(similar), part_surnames.append(surname_codes[rows])
+        variants = first_names.map(FIRST_NAME_SHORT_FORMS).fillna(first_names).map(FIRST_NAME_VARIANTS).dropna().explode()
+        rows = variants.index.to_numpy(dtype=np.intp)
+        name_rows.append(rows), part_firsts.append(blocks['firstNames'].get_indexer(variants)), part_surnames.append(surname_codes[rows])
+        rows, part_firsts, part_surnames = (np.concatenate(parts) for parts in (name_rows, part_firsts, part_surnames))
+        known = (part_firsts != -1) & (part_surnames != -1) & (name_array[rows] != '')
+        rows, pairs = rows[known], part_firsts[known].astype(np.int64) * len(blocks['surnames']) + part_surnames[known]
+
+        # Candidate source names with those parts, once per name, neither taken nor playing for another team.
+        codes = blocks['pairs'].get_indexer(pairs)
+        rows, codes = rows[codes != -1], codes[codes != -1]
+        repeats, keys = expand_ranges(blocks['pairOffsets'][codes], blocks['pairOffsets'][codes + 1])
+        pairs = np.unique(rows[repeats].astype(np.int64) * len(self._normalized.index) + blocks['pairOrder'][keys])
+        rows, keys = pairs // len(self._normalized.index), pairs % len(self._normalized.index)
+        keep = np.ones(len(keys), dtype=bool) if taken is None else ~taken[keys]
+        if teams is not None:
+            keep &= self.teams[self._normalized.to_numpy()[keys]] == teams[rows]
+        rows, keys = rows[keep], keys[keep]
+
+        # The most similar candidate of every name is accepted if it is similar enough and clearly the best.
+        source_names = self._normalized.index.to_numpy(dtype=object)
+        scored = pd.DataFrame({
+            'row': rows,
+            'key': source_names[keys],
+            'score': [difflib.SequenceMatcher(None, spelled_out(name_array[row]), spelled_out(key)).ratio() for row, key in zip(rows, source_names[keys])],
+        })
+        scored = scored[scored['score'] >= MINIMUM_SIMILARITY].sort_values(['row', 'score'], ascending=[True, False], kind='stable')
+        rank = scored.groupby('row', sort=False).cumcount().to_numpy()
+        best = scored[rank == 0]
+        rows = best['row'].to_numpy()
+        runner_up = scored[rank == 1].set_index('row')['score'].reindex(rows).fillna(-1.0).to_numpy()
+        close = best['score'].to_numpy() - runner_up < AMBIGUITY_MARGIN
+        top = scored[rank < 3].groupby('row', sort=False)['key'].agg(' | '.join)
+        status[rows[close]], candidates[rows[close]] = 'ambiguous', top.reindex(rows[close]).to_numpy(dtype=object)
+        collided = best['key'].map(self._collided).to_numpy(dtype=object)
+        collided[close] = None
+        ambiguous = pd.notna(collided)
+        status[rows[ambiguous]], candidates[rows[ambiguous]] = 'ambiguous', collided[ambiguous]
+        accepted = ~close & ~ambiguous
+        status[rows[accepted]] = 'approximate'
+        found[rows[accepted]] = self._normalized.reindex(best['key'].to_numpy(dtype=object)[accepted]).to_numpy(dtype=np.intp)
+        return status, candidates, found
+
+
+def spelled_out(name: str) -> str:
+    """
+    Spell out the first name of a normalized name if it is a short form (see FIRST_NAME_SHORT_FORMS).
+
+    :param name: A normalized name.
+    :return: A string.
+    """
+    first, _, rest = name.partition(' ')
+    return ' '.join([FIRST_NAME_SHORT_FORMS.get(first, first), rest]) if rest else FIRST_NAME_SHORT_FORMS.get(first, first)
+
+
+def team_keys(teams: pd.Series) -> np.ndarray:
+    """
+    Turn the teams of players into the keys compared by the approximate stage.
+
+    :param teams: A series of team codes.
+    :return: An object array of canonical team codes, with an empty string for a missing team.
+    """
+    return normalize_teams(teams.astype('str').fillna('')).to_numpy(dtype=object)
+
+
+def name_blocks(keys: pd.Index) -> dict:
+    """
+    Build the blocks used to limit approximate matching to plausible candidates.
+
+    :param keys: An index of distinct normalized source names.
+    :return: A dictionary containing the distinct first names ('firstNames') and surnames ('surnames') of the source
+             names, their spellings with at most one character deleted ('firstSpellings' and 'surnameSpellings', see
+             word_spellings), the distinct codes of the first names and surnames of the source names ('pairs', the
+             position of the first name times the number of surnames plus the position of the surname) and the
+             positions in keys of the source names sorted by those codes ('pairOrder'). The source names with the codes
+             at position i in pairs are those from pairOffsets[i] to pairOffsets[i + 1] in pairOrder ('pairOffsets').
+    """
+    names = pd.Series(keys, dtype=object).astype('str')
+    first_codes, first_names = pd.factorize(names.str.replace(r' .*', '', regex=True))
+    surname_codes, surnames = pd.factorize(names.str.replace(r'.* ', '', regex=True))
+    pair_codes, pairs = pd.factorize(first_codes.astype(np.int64) * len(surnames) + surname_codes)
+    order = np.argsort(pair_codes, kind='stable')
+    return {
+        'firstNames': pd.Index(first_names),
+        'surnames': pd.Index(surnames),
+        'firstSpellings': word_spellings(pd.Series(first_names, dtype=object)),
+        'surnameSpellings': word_spellings(pd.Series(surnames, dtype=object)),
+        'pairs': pd.Index(pairs),
+        'pairOffsets': np.searchsorted(pair_codes[order], np.arange(len(pairs) + 1)),
+        'pairOrder': order,
+    }
+
+
+def deletions(words: pd.Series) -> tuple:
+    """
+    List the spellings of some words with at most one character deleted.
+
+    :param words: A series of strings.
+    :return: A tuple of four arrays, one entry per spelling: the position of its word in words, the spelling, the
+             position of the deleted character (-1 for the word itself) and the deleted ASCII character (0 for none).
+    """
+    words = words.reset_index(drop=True).astype('str')
+    lengths = words.str.len().to_numpy()
+    characters = words.to_numpy(dtype=object).astype('S')
+    characters = characters.view(np.uint8).reshape(len(characters), characters.itemsize)
+    rows, spellings = [np.arange(len(words))], [words.to_numpy(dtype=object)]
+    positions, letters = [np.full(len(words), -1)], [np.zeros(len(words), dtype=np.uint8)]
+    for position in range(lengths.max(initial=0)):
+        longer = np.flatnonzero(lengths > position)
+        subset = words.iloc[longer]
+        rows.append(longer)
+        spellings.append((subset.str.slice(0, position) + subset.str.slice(position + 1)).to_numpy(dtype=object))
+        positions.append(np.full(len(longer), position))
+        letters.append(characters[longer, position])
+    return tuple(np.concatenate(parts) for parts in (rows, spellings, positions, letters))
+
+
+def word_spellings(words: pd.Series) -> dict:
+    """
+    Index the spellings of some words with at most one character deleted, so that the words one typo away from other
+    words can be looked up (see similar_words).
+
+    :param words: A series of distinct strings.
+    :return: A dictionary containing the words ('vocabulary'), their distinct spellings ('spellings'), and one entry
+             per spelling of every word, sorted by spelling: the position of its word in words ('words'), of the
+             deleted character ('positions') and the deleted character ('letters'). The entries of the spelling at
+             position i in spellings are those from offsets[i] to offsets[i + 1] ('offsets').
+    """
+    rows, spellings, positions, letters = deletions(words)
+    codes, distinct = pd.factorize(spellings)
+    order = np.argsort(codes, kind='stable')
+    return {
+        'vocabulary': words.to_numpy(dtype=object),
+        'spellings': pd.Index(distinct),
+        'offsets': np.searchsorted(codes[order], np.arange(len(distinct) + 1)),
+        'words': rows[order],
+        'positions': positions[order],
+        'letters': letters[order],
+    }
+
+
+def similar_words(words: pd.Series, spellings: dict) -> tuple:
+    """
+    Find the indexed words (see word_spellings) that are the same as or one typo away from some words: one character
+    deleted, inserted or replaced, or two neighbouring characters swapped. Two words one typo apart share a spelling
+    with at most one character deleted, but words sharing a spelling can be two typos apart, so the deleted characters
+    are compared as well.
+
+    :param words: A series of strings.
+    :param spellings: A dictionary returned by word_spellings.
+    :return: A tuple of three arrays, one entry per pair of similar words: the position of the word in words, the
+             position of the similar word in the indexed words, and whether both are the same word.
+    """
+    rows, word_spelling, positions, letters = deletions(words)
+    codes = spellings['spellings'].get_indexer(word_spelling)
+    indexed = codes != -1
+    rows, positions, letters, codes = rows[indexed], positions[indexed], letters[indexed], codes[indexed]
+    repeats, matches = expand_ranges(spellings['offsets'][codes], spellings['offsets'][codes + 1])
+    positions, other_positions = positions[repeats], spellings['positions'][matches]
+    same_letter = letters[repeats] == spellings['letters'][matches]
+    similar = (positions == -1) | (other_positions == -1) | ((positions == other_positions) & ~same_letter)
+    similar |= (np.abs(positions - other_positions) == 1) & same_letter
+    pairs = np.unique(rows[repeats][similar].astype(np.int64) * len(spellings['vocabulary']) + spellings['words'][matches][similar])
+    rows, similar = pairs // len(spellings['vocabulary']), pairs % len(spellings['vocabulary'])
+    return rows, similar, words.to_numpy(dtype=object)[rows] == spellings['vocabulary'][similar]
+
+
+def expand_ranges(starts: np.ndarray, stops: np.ndarray) -> tuple:
+    """
+    Expand ranges of positions into the positions they contain.
+
+    :param starts: An int array of the first position of every range.
+    :param stops: An int array of the position after the last one of every range.
+    :return: A tuple of two int arrays, one entry per position: the range it belongs to and the position.
+    """
+    lengths = stops - starts
+    repeats = np.repeat(np.arange(len(starts)), lengths)
+    return repeats, np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+
+
+def first_positions(identifiers: pd.Series) -> pd.Series:
+    """
+    Map every distinct identifier to the position of the first row it appears in.
+
+    :param identifiers: A series of identifiers, indexed by row position.
+    :return: A series of row positions, indexed by identifier.
+    """
+    first = identifiers[~identifiers.duplicated(keep='first')]
+    return pd.Series(first.index.to_numpy(dtype=np.intp), index=first.to_numpy())
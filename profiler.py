@@ -0,0 +1,159 @@
+"""
+A python module that records the wall time, CPU time, rows in and out and peak memory of every pipeline stage.
+
+Profiling is off by default, and stage() then costs a single check. Once enable() is called, every stage is recorded
+and the recording can be written as a Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev) or
+summarized as text.
+
+Peak memory is the highest memory traced by tracemalloc while a stage ran, above the memory in use when it started.
+Stages that overlap, such as the positions' stages when run with several jobs, share one peak. Peak memory is 0 when
+memory tracing is turned off.
+"""
+
+
+# Imports
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+# Constants
+PROFILE_TRACE_FILE = './pipeline_trace.json'
+
+# Profiler state, set by enable().
+_STATE = {'enabled': False}
+_LOCK = threading.Lock()
+
+
+def enable(trace_memory: bool=True) -> None:
+    """
+    Start recording stages.
+
+    :param trace_memory: True to trace memory allocations to record peak memory, which slows allocations (default True)
+    """
+    with _LOCK:
+        _STATE.update(enabled=True, memory=trace_memory, events=[], threads={}, active=0, origin=time.perf_counter())
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    """
+    Stop recording stages and tracing memory allocations.
+    """
+    with _LOCK:
+        _STATE['enabled'] = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    """
+    Check whether stages are being recorded.
+
+    :return: True if stages are being recorded, otherwise False.
+    """
+    return _STATE['enabled']
+
+
+@contextlib.contextmanager
+def stage(name: str, category: str='pipeline', rows_in: int=None):
+    """
+    Record a pipeline stage. The caller may add details to the record it receives, such as 'rowsOut'.
+
+    :param name: A string naming the stage.
+    :param category: A string grouping similar stages, such as 'read', 'merge' or 'write' (default 'pipeline')
+    :param rows_in: An integer representing the number of rows the stage receives (default None)
+    :return: A dictionary of details to include in the stage's record.
+    """
+    details = {} if rows_in is None else {'rowsIn': int(rows_in)}
+    if not _STATE['enabled']:
+        yield details
+        return
+    tracing = _STATE['memory'] and tracemalloc.is_tracing()
+    with _LOCK:
+        if tracing and _STATE['active'] == 0:
+            tracemalloc.reset_peak()
+        _STATE['active'] += 1
+        thread = _STATE['threads'].setdefault(threading.get_ident(), len(_STATE['threads']) + 1)
+    memory_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+    cpu_start = time.thread_time()
+    start = time.perf_counter()
+    try:
+        yield details
+    finally:
+        end = time.perf_counter()
+        cpu_time = time.thread_time() - cpu_start
+        with _LOCK:
+            peak_memory = tracemalloc.get_traced_memory()[1] if tracing and tracemalloc.is_tracing() else memory_start
+            _STATE['active'] -= 1
+            _STATE['events'].append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - _STATE['origin']) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': os.getpid(),
+                'tid': thread,
+                'args': {'cpuMs': cpu_time * 1e3, 'peakMemoryBytes': max(peak_memory - memory_start, 0), **details},
+            })
+
+
+def events() -> list:
+    """
+    Return the recorded stages as Chrome trace events, in the order they started.
+
+    :return: A list of dictionaries.
+    """
+    with _LOCK:
+        return sorted(_STATE.get('events', []), key=lambda event: event['ts'])
+
+
+def write_trace(file_name: str=PROFILE_TRACE_FILE) -> None:
+    """
+    Write the recorded stages to a JSON file in the Chrome trace-event format.
+
+    :param file_name: A string containing the name of the JSON file (default PROFILE_TRACE_FILE)
+    """
+    directory = os.path.dirname(file_name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_name, 'w') as file:
+        json.dump({'traceEvents': events(), 'displayTimeUnit': 'ms'}, file, indent=1)
+
+
+def nested_events() -> list:
+    """
+    Return the recorded stages with the number of stages each one ran within, in the order they started.
+
+    :return: A list of (depth, event) tuples.
+    """
+    nested = []
+    open_stages = {}
+    for event in events():
+        ends = open_stages.setdefault(event['tid'], [])
+        while ends and ends[-1] <= event['ts']:
+            ends.pop()
+        nested.append((len(ends), event))
+        ends.append(event['ts'] + event['dur'])
+    return nested
+
+
+def format_summary() -> str:
+    """
+    Describe every recorded stage, indented under the stages it ran within.
+
+    :return: A string containing the summary.
+    """
+    lines = [f'{"stage":<48}{"wall":>10}{"cpu":>10}{"rows in":>10}{"rows out":>10}{"peak MB":>10}']
+    for depth, event in nested_events():
+        name = '  ' * depth + event['name']
+        arguments = event['args']
+        lines.append(
+            f'{name[:47]:<48}{event["dur"] / 1e6:>9.3f}s{arguments["cpuMs"] / 1e3:>9.3f}s'
+            f'{arguments.get("rowsIn", ""):>10}{arguments.get("rowsOut", ""):>10}{arguments["peakMemoryBytes"] / 2 ** 20:>10.1f}'
+        )
+    return '\n'.join(lines)
@@ -8,16 +8,25 @@ import pandas as pd
 import os
 
 import merge_dataframes as md
+import rule_engine
+import season_config
+import table_schema as sch
 
 
 # Constants
-YEAR = 2022
-CALCULATIONS_FOLDER = f'./{YEAR}_calculations'
-COMPILED_QB_DATA = f'./{YEAR - 1}_data/compiled_qb_data.csv'
-MUST_DRAFT_QB_FILE = f'./{YEAR}_calculations/must_draft_quarterbacks.csv'
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+CALCULATIONS_FOLDER = SEASON_FILES['CALCULATIONS_FOLDER']
+COMPILED_QB_DATA = SEASON_FILES['COMPILED_QB_DATA']
+MUST_DRAFT_QB_FILE = SEASON_FILES['MUST_DRAFT_QB_FILE']
 MUST_DRAFT_QB_REL_COLUMNS = ['player', 'team', 'games', 'ADP', 'age', 'rushCarries', 'depthAim', 'olRank', 'offenseGrade']
 
 
+# Compiled Tier Masks
+RULES = rule_engine.load_rules()
+breakout_qb_mask = rule_engine.compile_tier(RULES['tiers']['must_draft_qb'], RULES['features'])
+
+
 def remove_non_breakout_qbs(dataframe: pd.DataFrame) -> pd.DataFrame:
     """
     Remove QBs that are unlikely to serve as a QB1/ have good ROI for the upcoming season.
@@ -25,12 +34,7 @@ def remove_non_breakout_qbs(dataframe: pd.DataFrame) -> pd.DataFrame:
     :param dataframe: A dataframe containing QB player data.
     :return: A dataframe, containing the QBs that will have good ROI.
     """
-    dataframe['rushPerGame'] = (dataframe['rushCarries'] / dataframe['games'])
-    dataframe = dataframe[
-        ((dataframe['rushPerGame'] >= 5) & (dataframe['depthAim'] >= 9.0)) |
-        ((dataframe['age'] <= 30) & (dataframe['offenseGrade'] >= 90)) |
-        ((dataframe['ADP'] <= 30))
-        ]
+    dataframe = dataframe[breakout_qb_mask(dataframe)]
     removable_elements = [element for element in dataframe.columns if element not in ['player', 'team', 'age', 'ADP']]
     dataframe = dataframe.drop((element for element in removable_elements), axis=1)
     return dataframe
@@ -39,7 +43,7 @@ def remove_non_breakout_qbs(dataframe: pd.DataFrame) -> pd.DataFrame:
 def main() -> None:
     # MUST DRAFT QBs
     # Read the relevant columns from the QB Data and store as a Pandas DataFrame.
-    must_draft_qb_candidates = pd.read_csv(COMPILED_QB_DATA, usecols = MUST_DRAFT_QB_REL_COLUMNS, low_memory = True)
+    must_draft_qb_candidates = sch.apply_schema(pd.read_csv(COMPILED_QB_DATA, usecols = MUST_DRAFT_QB_REL_COLUMNS, low_memory = True))
 
     # Remove QBs that do not meet the criteria for being Must Drafts.
     must_draft_qbs = remove_non_breakout_qbs(must_draft_qb_candidates)
@@ -0,0 +1,282 @@
+"""
+A python module that describes how a table is built as a lazy plan, optimizes the plan, and only then runs it.
+
+A plan is a list of steps, built with scan and the methods of LazyTable:
+- ('scan', csv_name, columns, predicates): read some columns of a CSV, keeping only the rows that meet every predicate.
+- ('join', csv_name, identifier_index, added_indexes, base_column): add columns from a source CSV, matching its
+  identifier column with a column of the scanned table.
+- ('filter', predicates): keep the rows that meet every predicate.
+- ('sort', column): sort the rows by a column.
+- ('select', columns): keep only some columns: the scanned ones in the order of the CSV, then the joined ones in
+  the order they were joined.
+A predicate is a (column, operator, value) tuple, where operator is one of rule_engine.COMPARISONS, or NOT_MISSING
+(with a value of None) to drop the rows where the column is missing.
+
+OPTIMIZATIONS:
+- Predicate pushdown: the joins that add a filtered column run first, and every predicate runs right after the step
+  that adds its column. Predicates on scanned columns run inside the loader, so rows that fail them are never
+  converted to pandas. Players without an ADP are dropped before any join but the one that adds the ADP.
+- Column pruning: every scan and join keeps only the columns used by a later step or by the final select, and joins
+  that add no used column are removed.
+Joins add columns without adding or removing rows and only match on scanned columns, filters and the sort are stable
+and row by row, so the optimized plan returns the same rows, in the same order, with the same columns in the same
+order, as the plan as written.
+"""
+
+
+# Imports
+import os
+
+import numpy as np
+import pandas as pd
+
+import columnar_store as cs
+import merge_dataframes as md
+import profiler
+import rule_engine
+
+
+# Constants
+NOT_MISSING = 'notna'
+
+
+class LazyTable:
+    """
+    A plan that builds a table. Every method returns a new plan; nothing is read until collect is called.
+    """
+
+    def __init__(self, steps: list):
+        """
+        Create a plan from its steps.
+
+        :param steps: A list of steps, starting with a scan.
+        """
+        self.steps = steps
+
+    def join(self, csv_name: str, identifier_index: int, added_indexes: dict, base_index: int=0) -> 'LazyTable':
+        """
+        Add columns from a source CSV, as merge_dataframes.add_extra_datapoints_bulk does.
+
+        :param csv_name: A string containing the name of the source CSV.
+        :param identifier_index: An integer representing the index of the source's identifier column.
+        :param added_indexes: A dictionary mapping the indexes of the source columns to add to their names in the table.
+        :param base_index: An integer representing the index of the scanned column to match the identifiers with (default 0)
+        :return: A LazyTable.
+        """
+        scan_columns = self.steps[0][2]
+        if base_index >= len(scan_columns):
+            raise ValueError(f'Joins can only match on a scanned column, not on column {base_index} of {scan_columns}')
+        return LazyTable(self.steps + [('join', csv_name, identifier_index, dict(added_indexes), scan_columns[base_index])])
+
+    def filter(self, *predicates: tuple) -> 'LazyTable':
+        """
+        Keep the rows that meet every predicate.
+
+        :param predicates: (column, operator, value) tuples.
+        :return: A LazyTable.
+        """
+        for _, operator, _ in predicates:
+            if operator != NOT_MISSING and operator not in rule_engine.COMPARISONS:
+                raise ValueError(f'Unsupported operator {operator!r}')
+        return LazyTable(self.steps + [('filter', [tuple(predicate) for predicate in predicates])])
+
+    def drop_missing(self, column: str) -> 'LazyTable':
+        """
+        Keep the rows where a column is not missing.
+
+        :param column: A string naming a column.
+        :return: A LazyTable.
+        """
+        return self.filter((column, NOT_MISSING, None))
+
+    def sort(self, column: str) -> 'LazyTable':
+        """
+        Sort the rows by a column, keeping the order of equal rows.
+
+        :param column: A string naming a column.
+        :return: A LazyTable.
+        """
+        return LazyTable(self.steps + [('sort', column)])
+
+    def select(self, columns: list) -> 'LazyTable':
+        """
+        Keep only some columns: the scanned ones in the order of the CSV, then the joined ones in the order they were joined.
+
+        :param columns: A list of column names.
+        :return: A LazyTable.
+        """
+        return LazyTable(self.steps + [('select', list(columns))])
+
+    def columns(self) -> list:
+        """
+        List the columns of the table the plan builds.
+
+        :return: A list of column names: the scanned ones as listed by the scan, then the joined ones in join order.
+        """
+        columns = list(self.steps[0][2])
+        for step in self.steps[1:]:
+            if step[0] == 'join':
+                columns.extend(name for name in step[3].values() if name not in columns)
+            elif step[0] == 'select':
+                columns = [column for column in columns if column in step[1]]
+        return columns
+
+    def optimize(self) -> 'LazyTable':
+        """
+        Push the predicates down to the earliest step that has their columns and prune every unused column.
+
+        :return: A LazyTable that builds the same table.
+        """
+        scan, steps = self.steps[0], self.steps[1:]
+        joins = [step for step in steps if step[0] == 'join']
+        predicates = [predicate for step in steps if step[0] == 'filter' for predicate in step[1]]
+        sorts = [step for step in steps if step[0] == 'sort']
+        output_columns = self.columns()
+        used = set(output_columns) | {column for column, _, _ in predicates} | {step[1] for step in sorts}
+        available = set(scan[2])
+        for join in joins:
+            available.update(join[3].values())
+        missing = sorted(used - available)
+        if missing:
+            raise ValueError(f'The plan uses columns that no step adds: {missing}')
+
+        joins = [pruned_join(join, used) for join in joins]
+        joins = [join for join in joins if join[3]]
+        filtered = {column for column, _, _ in predicates}
+        joins = [join for join in joins if filtered & set(join[3].values())] + [join for join in joins if not filtered & set(join[3].values())]
+        scan_columns = [column for column in scan[2] if column in used or any(join[4] == column for join in joins)]
+        pending = list(predicates)
+        scan_predicates = [predicate for predicate in pending if predicate[0] in scan_columns]
+        pending = [predicate for predicate in pending if predicate not in scan_predicates]
+        optimized = [('scan', scan[1], scan_columns, list(scan[3]) + scan_predicates)]
+        for join in joins:
+            optimized.append(join)
+            added = [predicate for predicate in pending if predicate[0] in join[3].values()]
+            if added:
+                optimized.append(('filter', added))
+                pending = [predicate for predicate in pending if predicate not in added]
+        optimized.extend(sorts)
+        optimized.append(('select', output_columns))
+        return LazyTable(optimized)
+
+    def explain(self, optimized: bool=True) -> str:
+        """
+        Describe the plan, one step per line, in the order the steps run.
+
+        :param optimized: True to describe the optimized plan, False to describe the plan as written (default True)
+        :return: A string.
+        """
+        plan = self.optimize() if optimized else self
+        return '\n'.join(describe_step(step) for step in plan.steps)
+
+    def collect(self, table_cache: md.SourceTableCache=None, report: list=None) -> pd.DataFrame:
+        """
+        Optimize the plan and run it.
+
+        :param table_cache: A SourceTableCache to read the source CSVs through, or None to use a private cache (default None)
+        :param report: A list to append a DataFrame of the identifiers that did not match exactly to, per join (default None)
+        :return: A DataFrame, with a default index.
+        """
+        table_cache = table_cache or md.SourceTableCache()
+        table = None
+        for step in self.optimize().steps:
+            kind = step[0]
+            if kind == 'scan':
+                _, csv_name, columns, predicates = step
+                with profiler.stage(f'read {os.path.basename(csv_name)}', 'read') as details:
+                    row_filter = None
+                    if predicates:
+                        row_filter = (list(dict.fromkeys(column for column, _, _ in predicates)), lambda rows: predicate_mask(rows, predicates))
+                    table = cs.read_table(csv_name, usecols = columns, row_filter = row_filter)
+                    details['rowsOut'] = len(table.index)
+            elif kind == 'join':
+                _, csv_name, identifier_index, added_indexes, base_column = step
+                with profiler.stage(f'merge {os.path.basename(csv_name)}', 'merge', len(table.index)) as details:
+                    table = md.add_extra_datapoints_bulk(table, csv_name, identifier_index, added_indexes, base_index = table.columns.get_loc(base_column), table_cache = table_cache, report = report)
+                    details['rowsOut'] = len(table.index)
+            elif kind == 'filter':
+                with profiler.stage(f'filter {", ".join(describe_predicate(predicate) for predicate in step[1])}', 'filter', len(table.index)) as details:
+                    table = table[predicate_mask(table, step[1])].reset_index(drop=True)
+                    details['rowsOut'] = len(table.index)
+            elif kind == 'sort':
+                with profiler.stage(f'sort by {step[1]}', 'filter', len(table.index)):
+                    table = table.sort_values(step[1], kind='stable').reset_index(drop=True)
+            else:
+                scanned = [column for column in table.columns if column in step[1] and column in self.steps[0][2]]
+                table = table[scanned + [column for column in step[1] if column not in scanned]]
+        return table
+
+
+def scan(csv_name: str, columns: list) -> LazyTable:
+    """
+    Start a plan by reading some columns of a CSV.
+
+    :param csv_name: A string containing the name of the CSV.
+    :param columns: A list of column names, which the table has in the order of the CSV.
+    :return: A LazyTable.
+    """
+    return LazyTable([('scan', csv_name, list(columns), [])])
+
+
+def pruned_join(join: tuple, used: set) -> tuple:
+    """
+    Remove the columns a join adds that no step uses.
+
+    :param join: A join step.
+    :param used: A set of the column names used by the plan.
+    :return: A join step.
+    """
+    kind, csv_name, identifier_index, added_indexes, base_column = join
+    return (kind, csv_name, identifier_index, {index: name for index, name in added_indexes.items() if name in used}, base_column)
+
+
+def predicate_mask(table: pd.DataFrame, predicates: list) -> np.ndarray:
+    """
+    Evaluate predicates over a table, comparing values the same way as the tier masks.
+
+    :param table: A DataFrame with the columns of the predicates.
+    :param predicates: A list of (column, operator, value) tuples.
+    :return: A boolean array, True for the rows that meet every predicate.
+    """
+    mask = np.ones(len(table.index), dtype=bool)
+    for column, operator, _ in predicates:
+        if operator == NOT_MISSING:
+            mask &= table[column].notna().to_numpy()
+    comparisons = [list(predicate) for predicate in predicates if predicate[1] != NOT_MISSING]
+    if comparisons:
+        mask &= rule_engine.compile_tier({'all': comparisons}, {})(table)
+    return mask
+
+
+def describe_predicate(predicate: tuple) -> str:
+    """
+    Describe a predicate.
+
+    :param predicate: A (column, operator, value) tuple.
+    :return: A string.
+    """
+    column, operator, value = predicate
+    return f'{column} IS NOT MISSING' if operator == NOT_MISSING else f'{column} {operator} {value}'
+
+
+def describe_step(step: tuple) -> str:
+    """
+    Describe a step of a plan.
+
+    :param step: A step.
+    :return: A string.
+    """
+    kind = step[0]
+    if kind == 'scan':
+        description = f'SCAN {os.path.basename(step[1])} [{", ".join(step[2])}]'
+        if step[3]:
+            description += f' WHERE {" AND ".join(describe_predicate(predicate) for predicate in step[3])}'
+        return description
+    if kind == 'join':
+        return f'  JOIN {os.path.basename(step[1])} ON {step[4]} ADD [{", ".join(step[3].values())}]'
+    if kind == 'filter':
+        return f'  FILTER {" AND ".join(describe_predicate(predicate) for predicate in step[1])}'
+    if kind == 'sort':
+        return f'  SORT BY {step[1]}'
+    return f'  SELECT [{", ".join(step[1])}]'
+
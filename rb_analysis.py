@@ -8,26 +8,37 @@ import pandas as pd
 import os
 
 import merge_dataframes as md
+import rule_engine
+import season_config
+import table_schema as sch
 
 
 # Constants
-YEAR = 2022
-CALCULATIONS_FOLDER = f'./{YEAR}_calculations'
-COMPILED_RB_DATA = f'./{YEAR - 1}_data/compiled_rb_data.csv'
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+CALCULATIONS_FOLDER = SEASON_FILES['CALCULATIONS_FOLDER']
+COMPILED_RB_DATA = SEASON_FILES['COMPILED_RB_DATA']
 
 # Legendary RBs
-LEGENDARY_RB_FILE = f'./{YEAR}_calculations/legendary_runningbacks.csv'
+LEGENDARY_RB_FILE = SEASON_FILES['LEGENDARY_RB_FILE']
 LEGENDARY_RB_REL_COLUMNS = ['player', 'team', 'games', 'recTarg', 'ADP', 'age', 'olRank', 'teamTargets']
 
 # Deadzone RBs
-DEADZONE_RB_FILE = f'./{YEAR}_calculations/deadzone_runningbacks.csv'
+DEADZONE_RB_FILE = SEASON_FILES['DEADZONE_RB_FILE']
 DEADZONE_RB_REL_COLUMNS = ['player', 'team', 'games', 'recTarg', 'ADP', 'age', 'rushCarries', 'olRank', 'teamTargets', 'rushGrade', 'forcedMissedTackles']
 
 # Hero RB Pairs
-HERO_RB_FILE = f'./{YEAR}_calculations/hero_runningbacks.csv'
+HERO_RB_FILE = SEASON_FILES['HERO_RB_FILE']
 HERO_RB_REL_COLUMNS = ['player', 'team', 'games', 'ADP', 'age', 'rushGrade']
 
 
+# Compiled Tier Masks
+RULES = rule_engine.load_rules()
+legendary_rb_mask = rule_engine.compile_tier(RULES['tiers']['legendary_rb'], RULES['features'])
+deadzone_rb_mask = rule_engine.compile_tier(RULES['tiers']['deadzone_rb'], RULES['features'])
+hero_rb_mask = rule_engine.compile_tier(RULES['tiers']['hero_rb'], RULES['features'])
+
+
 def remove_non_legendary_rbs(dataframe: pd.DataFrame) -> pd.DataFrame:
     """
     Remove RBs that do not have legendary upside from a DataFrame.
@@ -35,15 +46,7 @@ def remove_non_legendary_rbs(dataframe: pd.DataFrame) -> pd.DataFrame:
     :param dataframe: A dataframe containing RB player data.
     :return: A dataframe, containing the RBs that have 'Legendary Upside'.
     """
-    dataframe['trgt%'] = (dataframe['recTarg'] / ((dataframe['teamTargets'] / 17) * dataframe['games'])) * 100
-    dataframe = dataframe[dataframe['ADP'] <= 26]
-    dataframe = dataframe[ 
-        ((dataframe['trgt%'] >= 7) & (dataframe['age'] <= 22)) |
-        ((dataframe['trgt%'] >= 11) & (dataframe['age'] <= 23)) |
-        ((dataframe['trgt%'] >= 13) & (dataframe['age'] <= 25)) |
-        ((dataframe['trgt%'] >= 15) & (dataframe['age'] <= 27))
-        ]
-    dataframe = dataframe[dataframe['olRank'] <= 24]
+    dataframe = dataframe[legendary_rb_mask(dataframe)]
     removable_elements = [element for element in dataframe.columns if element not in ['player', 'team', 'age', 'ADP']]
     dataframe = dataframe.drop((element for element in removable_elements), axis=1)
     return dataframe
@@ -56,15 +59,7 @@ def remove_deadzone_rbs(dataframe: pd.DataFrame) -> pd.DataFrame:
     :param dataframe: A dataframe containing RB player data.
     :return: A dataframe, containing the RBs that have the upside to overcome the 'Deadzone'.
     """
-    dataframe['trgt%'] = (dataframe['recTarg'] / ((dataframe['teamTargets'] / 17) * dataframe['games'])) * 100
-    dataframe['evadeRate'] = (dataframe['forcedMissedTackles'] / dataframe['rushCarries']) * 100
-    dataframe = dataframe[(dataframe['ADP'] >= 27) & (dataframe['ADP'] <= 80)]
-    dataframe = dataframe[ 
-        (dataframe['trgt%'] >= 12) |
-        ((dataframe['rushGrade'] >= 80) & (dataframe['olRank'] <= 16)) |
-        ((dataframe['rushGrade'] >= 70) & (dataframe['evadeRate'] >= 15) & (dataframe['olRank'] <= 10))
-        ]
-    dataframe = dataframe[dataframe['age'] <= 27]
+    dataframe = dataframe[deadzone_rb_mask(dataframe)]
     removable_elements = [element for element in dataframe.columns if element not in ['player', 'team', 'age', 'ADP']]
     dataframe = dataframe.drop((element for element in removable_elements), axis=1)
     return dataframe
@@ -77,9 +72,7 @@ def remove_non_hero_rb_pairs(dataframe: pd.DataFrame) -> pd.DataFrame:
     :param dataframe: A dataframe containing RB player data.
     :return: A dataframe, containing the RBs that can be 'Hero RB' pairings.
     """
-    dataframe = dataframe[(dataframe['ADP'] >= 81) & (dataframe['ADP'] <= 120)]
-    dataframe = dataframe[dataframe['age'] <= 26]
-    dataframe = dataframe[dataframe['rushGrade'] >= 80]
+    dataframe = dataframe[hero_rb_mask(dataframe)]
     removable_elements = [element for element in dataframe.columns if element not in ['player', 'team', 'age', 'ADP']]
     dataframe = dataframe.drop((element for element in removable_elements), axis=1)
     return dataframe
@@ -91,7 +84,7 @@ def main() -> None:
     """
     # LEGENDARY RUNNINGBACKS
     # Read the relevant columns from the RB Data and store as a Pandas DataFrame.
-    legendary_runningback_candidates = pd.read_csv(COMPILED_RB_DATA, usecols = LEGENDARY_RB_REL_COLUMNS, low_memory = True)
+    legendary_runningback_candidates = sch.apply_schema(pd.read_csv(COMPILED_RB_DATA, usecols = LEGENDARY_RB_REL_COLUMNS, low_memory = True))
 
     # Remove RBs that do not meet the criteria for Legendary Upside.
     legendary_runningbacks = remove_non_legendary_rbs(legendary_runningback_candidates)
@@ -109,7 +102,7 @@ def main() -> None:
 
     # DEADZONE RUNNINGBACKS
     # Read the relevant columns from the RB Data and store as a Pandas DataFrame.
-    deadzone_runningback_candidates = pd.read_csv(COMPILED_RB_DATA, usecols = DEADZONE_RB_REL_COLUMNS, low_memory = True)
+    deadzone_runningback_candidates = sch.apply_schema(pd.read_csv(COMPILED_RB_DATA, usecols = DEADZONE_RB_REL_COLUMNS, low_memory = True))
 
     # Remove RBs that do not meet the criteria for Deadzone Upside.
     deadzone_runningback = remove_deadzone_rbs(deadzone_runningback_candidates)
@@ -123,7 +116,7 @@ def main() -> None:
 
     # HERO RUNNINGBACK PAIRS
     # Read the relevant columns from the RB Data and store as a Pandas DataFrame.
-    hero_runningback_candidates = pd.read_csv(COMPILED_RB_DATA, usecols = HERO_RB_REL_COLUMNS, low_memory = True)
+    hero_runningback_candidates = sch.apply_schema(pd.read_csv(COMPILED_RB_DATA, usecols = HERO_RB_REL_COLUMNS, low_memory = True))
     
     # Remove RBs that do not meet the criteria for Deadzone Upside.
     hero_runningback = remove_non_hero_rb_pairs(hero_runningback_candidates)
@@ -0,0 +1,186 @@
+"""
+A python module that compiles the declarative breakout rules in breakout_rules.json into fused NumPy mask functions.
+
+RULE FORMAT:
+- 'features' maps the name of a derived column to an arithmetic formula over the columns of a compiled CSV and other
+  features. Features are computed and memoized by feature_registry.
+- Each tier in 'tiers' has an optional 'adp' window [min, max] (null for no bound, both inclusive), an optional
+  'all' list of conditions that must all hold, and an optional 'any' list of clauses (lists of conditions), at least
+  one of which must hold in full.
+- A condition is a [column, operator, value] triple, where column is a compiled column or a feature.
+"""
+
+
+# Imports
+import json
+
+import numpy as np
+import pandas as pd
+
+import feature_registry as fr
+
+
+# Constants
+RULES_FILE = './breakout_rules.json'
+COMPARISONS = {
+    '>=': np.greater_equal,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '<': np.less,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+
+def load_rules(rules_file: str=RULES_FILE) -> dict:
+    """
+    Read a rule specification from a JSON file.
+
+    :param rules_file: A string containing the name of the JSON file (default RULES_FILE)
+    :return: A dictionary containing 'features' and 'tiers'.
+    """
+    with open(rules_file) as file:
+        return json.load(file)
+
+
+def required_conditions(tier_spec: dict) -> list:
+    """
+    List the conditions of a tier that must all hold, including the ADP window.
+
+    :param tier_spec: A dictionary describing a tier.
+    :return: A list of [column, operator, value] conditions.
+    """
+    minimum, maximum = tier_spec.get('adp', [None, None])
+    conditions = []
+    if minimum is not None:
+        conditions.append(['ADP', '>=', minimum])
+    if maximum is not None:
+        conditions.append(['ADP', '<=', maximum])
+    conditions.extend(tier_spec.get('all', []))
+    return conditions
+
+
+def window_conditions(tier_specs: list) -> list:
+    """
+    List the ADP conditions met by every player of at least one of some tiers: the loosest ADP window of the tiers.
+
+    :param tier_specs: A list of dictionaries describing tiers.
+    :return: A list of [column, operator, value] conditions, empty if a tier has no ADP bound on a side.
+    """
+    windows = [tier_spec.get('adp', [None, None]) for tier_spec in tier_specs]
+    conditions = []
+    minimums = [minimum for minimum, _ in windows]
+    if minimums and None not in minimums:
+        conditions.append(['ADP', '>=', min(minimums)])
+    maximums = [maximum for _, maximum in windows]
+    if maximums and None not in maximums:
+        conditions.append(['ADP', '<=', max(maximums)])
+    return conditions
+
+
+def tier_conditions(tier_spec: dict) -> list:
+    """
+    List every condition of a tier, including the ADP window.
+
+    :param tier_spec: A dictionary describing a tier.
+    :return: A list of [column, operator, value] conditions.
+    """
+    conditions = required_conditions(tier_spec)
+    for clause in tier_spec.get('any', []):
+        conditions.extend(clause)
+    return conditions
+
+
+def tier_columns(tier_specs: list, features: dict) -> tuple:
+    """
+    Find the compiled columns and the features needed to evaluate some tiers.
+
+    :param tier_specs: A list of dictionaries describing tiers.
+    :param features: A dictionary mapping feature names to formulas.
+    :return: A tuple containing a list of compiled column names and a list of feature names, in dependency order.
+    """
+    return fr.registry(features).resolve(column for tier_spec in tier_specs for column, _, _ in tier_conditions(tier_spec))
+
+
+def column_arrays(dataframe: pd.DataFrame, tier_specs: list, features: dict, version: int=0) -> dict:
+    """
+    Return the columns and features needed by some tiers as NumPy arrays, from the feature registry's memo of the table.
+
+    Integer columns without missing values keep their narrow type, so their conditions compare the table's own arrays.
+    Every other column, and every feature, is a float64 array. The arrays are read-only.
+
+    :param dataframe: A DataFrame containing compiled player data.
+    :param tier_specs: A list of dictionaries describing tiers.
+    :param features: A dictionary mapping feature names to formulas.
+    :param version: An integer identifying the contents of the table (default 0, see feature_registry)
+    :return: A dictionary mapping column and feature names to arrays.
+    """
+    return fr.registry(features).compute(dataframe, (column for tier_spec in tier_specs for column, _, _ in tier_conditions(tier_spec)), version)
+
+
+def compile_tier(tier_spec: dict, features: dict):
+    """
+    Compile a tier into a function that evaluates all of its conditions as a single fused boolean mask.
+
+    :param tier_spec: A dictionary describing a tier.
+    :param features: A dictionary mapping feature names to formulas.
+    :return: A function that takes a DataFrame (or a dictionary from column_arrays) and returns a boolean array.
+    """
+    required = required_conditions(tier_spec)
+    alternatives = tier_spec.get('any', [])
+    for column, comparison, _ in tier_conditions(tier_spec):
+        if comparison not in COMPARISONS:
+            raise ValueError(f'Unsupported comparison {comparison!r} for column {column!r}')
+
+    def mask(source, out: np.ndarray=None) -> np.ndarray:
+        """
+        Evaluate the tier.
+
+        :param source: A DataFrame, or a dictionary mapping column and feature names to arrays.
+        :param out: A boolean array to write the mask into, or None to allocate one (default None)
+        :return: A boolean array, True for players that belong to the tier.
+        """
+        arrays = column_arrays(source, [tier_spec], features) if isinstance(source, pd.DataFrame) else source
+        row_count = len(next(iter(arrays.values())))
+        result = np.ones(row_count, dtype=bool) if out is None else out
+        result.fill(True)
+        scratch = np.empty(row_count, dtype=bool)
+        for column, comparison, value in required:
+            result &= COMPARISONS[comparison](arrays[column], value, out=scratch)
+        if alternatives:
+            matched = np.zeros(row_count, dtype=bool)
+            clause_mask = np.empty(row_count, dtype=bool)
+            for clause in alternatives:
+                clause_mask.fill(True)
+                for column, comparison, value in clause:
+                    clause_mask &= COMPARISONS[comparison](arrays[column], value, out=scratch)
+                matched |= clause_mask
+            result &= matched
+        return result
+    return mask
+
+
+def compile_rules(rules: dict) -> dict:
+    """
+    Compile every tier of a rule specification.
+
+    :param rules: A dictionary containing 'features' and 'tiers'.
+    :return: A dictionary mapping tier names to mask functions.
+    """
+    return {name: compile_tier(tier_spec, rules['features']) for name, tier_spec in rules['tiers'].items()}
+
+
+def evaluate_variants(dataframe: pd.DataFrame, tier_specs: list, features: dict) -> np.ndarray:
+    """
+    Evaluate many candidate tier variants against a DataFrame, sharing the extracted columns and features.
+
+    :param dataframe: A DataFrame containing compiled player data.
+    :param tier_specs: A list of dictionaries describing tier variants.
+    :param features: A dictionary mapping feature names to formulas.
+    :return: A boolean array with one row per variant and one column per player.
+    """
+    arrays = column_arrays(dataframe, tier_specs, features)
+    masks = np.empty((len(tier_specs), len(dataframe.index)), dtype=bool)
+    for row, tier_spec in enumerate(tier_specs):
+        compile_tier(tier_spec, features)(arrays, out=masks[row])
+    return masks
@@ -0,0 +1,91 @@
+"""
+A python module that defines the season being analyzed and the location of every file used for a season.
+
+The analysis for a season uses the data from the season before it, so season YEAR reads './{YEAR - 1}_data' and
+writes './{YEAR}_calculations'. Any file can be overridden per season, for example to share one age table between
+several seasons.
+"""
+
+
+# Constants
+YEAR = 2022
+# The ADP of the compiled tables and the tier windows: 'ESPN' (the ESPN column of PLAYER_ADPS) or 'consensus' (the
+# weighted consensus of every ADP provider and snapshot, built by adp_consensus).
+ADP_SOURCE = 'ESPN'
+DATA_FILES = {
+    # Team Files
+    'TEAM_OL_RANK': 'data_team_olrank.csv',
+    'TEAM_TARGETS': 'data_team_trgt%.csv',
+
+    # Player Files
+    'PLAYER_AGE': 'data_player_age.csv',
+    'PLAYER_ADPS': 'data_player_adp.csv',
+    'PLAYER_PASS_GRADE': 'data_player_passgrade.csv',
+    'PLAYER_RUSH_GRADES': 'data_player_rushgrade.csv',
+    'PLAYER_REC_GRADE': 'data_player_receivinggrade.csv',
+
+    # Position Files
+    'MAIN_RB_CSV': 'data_rb_stats.csv',
+    'MAIN_WR_CSV': 'data_wr_stats.csv',
+    'MAIN_QB_CSV': 'data_qb_stats.csv',
+    'COMPILED_RB_DATA': 'compiled_rb_data.csv',
+    'COMPILED_WR_DATA': 'compiled_wr_data.csv',
+    'COMPILED_QB_DATA': 'compiled_qb_data.csv',
+    'RB_IDENTITY_REPORT': 'identity_report_rb.csv',
+    'WR_IDENTITY_REPORT': 'identity_report_wr.csv',
+    'QB_IDENTITY_REPORT': 'identity_report_qb.csv',
+
+    # Weekly Files
+    'WEEKLY_PLAYER_STATS': 'data_player_weekly.csv',
+    'WEEKLY_TEAM_STATS': 'data_team_weekly.csv',
+    'RECENT_RB_STATS': 'recent_rb_stats.csv',
+    'RECENT_WR_STATS': 'recent_wr_stats.csv',
+    'RECENT_QB_STATS': 'recent_qb_stats.csv',
+    'COMPILED_RECENT_RB_DATA': 'compiled_recent_rb_data.csv',
+    'COMPILED_RECENT_WR_DATA': 'compiled_recent_wr_data.csv',
+    'COMPILED_RECENT_QB_DATA': 'compiled_recent_qb_data.csv',
+
+    # ADP Consensus Files
+    'ADP_SNAPSHOTS': 'adp_snapshots',
+    'ADP_SNAPSHOT_STATE': 'adp_snapshot_state.csv',
+    'ADP_SNAPSHOT_INDEX': 'adp_snapshot_state.json',
+    'CONSENSUS_ADPS': 'data_consensus_adp.csv',
+}
+CALCULATION_FILES = {
+    'LEGENDARY_RB_FILE': 'legendary_runningbacks.csv',
+    'DEADZONE_RB_FILE': 'deadzone_runningbacks.csv',
+    'HERO_RB_FILE': 'hero_runningbacks.csv',
+    'BREAKOUT_WR_FILE': 'breakout_receivers.csv',
+    'MUST_DRAFT_QB_FILE': 'must_draft_quarterbacks.csv',
+    'ALL_BREAKOUT_PLAYER_FILE': 'all_breakout_players.csv',
+    'SIMULATED_VALUE_FILE': 'simulated_value.csv',
+}
+
+
+def season_files(year: int=YEAR, overrides: dict=None) -> dict:
+    """
+    Return the name of every file used to analyze a season.
+
+    :param year: An integer representing the season to analyze (default YEAR)
+    :param overrides: A dictionary mapping file keys to file names that replace the default names (default None)
+    :return: A dictionary mapping file keys, and 'DATA_FOLDER' and 'CALCULATIONS_FOLDER', to file names.
+    """
+    files = {
+        'DATA_FOLDER': f'./{year - 1}_data',
+        'CALCULATIONS_FOLDER': f'./{year}_calculations',
+    }
+    files.update({key: f'./{year - 1}_data/{name}' for key, name in DATA_FILES.items()})
+    files.update({key: f'./{year}_calculations/{name}' for key, name in CALCULATION_FILES.items()})
+    files.update(overrides or {})
+    return files
+
+
+def resolve_datapoints(datapoint_specs: list, files: dict) -> list:
+    """
+    Replace the file keys of datapoint specifications with the file names of a season.
+
+    :param datapoint_specs: A list of (file_key, identifier_index, added_indexes, base_index) tuples.
+    :param files: A dictionary returned by season_files.
+    :return: A list of (csv_name, identifier_index, added_indexes, base_index) tuples.
+    """
+    return [(files[file_key], identifier_index, added_indexes, base_index) for file_key, identifier_index, added_indexes, base_index in datapoint_specs]
@@ -0,0 +1,170 @@
+"""
+A python module that declares the in-memory types of the columns of every source and compiled table.
+
+Every table is typed once, when it is loaded, and its Feather sidecar stores the typed columns:
+- Player names stay strings (pandas stores them in one Arrow buffer per column, not as one object per name).
+- Team and position codes become categoricals.
+- Counts become the narrowest nullable integer type that holds them (Int8, Int16, ...), so a missing value, such as a
+  player missing from a merged source, no longer turns a whole column into float64.
+- Measurements become float32 when every value survives the round trip at FLOAT32_DECIMALS decimals, and stay float64
+  otherwise.
+Columns missing from COLUMN_TYPES are typed by their values: whole numbers as counts, other numbers as measurements.
+Strings are left as they are.
+
+column_values turns a typed column back into a NumPy array for the rule engine. float32 measurements are restored to
+the float64 value of their decimals, so tier comparisons give the same results as on float64 columns.
+"""
+
+
+# Imports
+import numpy as np
+import pandas as pd
+
+
+# Constants
+STRING = 'string'
+CATEGORY = 'category'
+INTEGER = 'integer'
+FLOAT = 'float'
+FLOAT32_DECIMALS = 4
+INTEGER_DTYPES = [pd.Int8Dtype(), pd.Int16Dtype(), pd.Int32Dtype(), pd.Int64Dtype()]
+COLUMN_TYPES = {
+    # Identifiers
+    'player': STRING,
+    'Player': STRING,
+    'Name': STRING,
+    'team': CATEGORY,
+    'Team': CATEGORY,
+    'team_name': CATEGORY,
+    'position': CATEGORY,
+    'Position': CATEGORY,
+    'POS': CATEGORY,
+
+    # Counts
+    'season': INTEGER,
+    'week': INTEGER,
+    'games': INTEGER,
+    'recTarg': INTEGER,
+    'rushCarries': INTEGER,
+    'olRank': INTEGER,
+    'OLRank': INTEGER,
+    'teamTargets': INTEGER,
+    'Rank': INTEGER,
+    'ByeWeek': INTEGER,
+    'player_id': INTEGER,
+    'player_game_count': INTEGER,
+
+    # Measurements
+    'ADP': FLOAT,
+    'age': FLOAT,
+    'Age': FLOAT,
+    'depthAim': FLOAT,
+    'offenseGrade': FLOAT,
+    'rushGrade': FLOAT,
+    'forcedMissedTackles': FLOAT,
+    'recGrade': FLOAT,
+}
+
+
+def apply_schema(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give every column of a table its declared type, or the type inferred from its values if it has none.
+
+    :param dataframe: A DataFrame.
+    :return: A new DataFrame with the same columns and index, with typed columns.
+    """
+    typed = {column: typed_column(dataframe[column], COLUMN_TYPES.get(column)) for column in dataframe.columns}
+    return pd.DataFrame(typed, index=dataframe.index, columns=dataframe.columns, copy=False)
+
+
+def typed_column(series: pd.Series, kind: str=None) -> pd.Series:
+    """
+    Convert a column to the compact type of its kind.
+
+    :param series: A series.
+    :param kind: STRING, CATEGORY, INTEGER or FLOAT, or None to infer the kind from the values (default None)
+    :return: A series, which is series itself if it already has the right type.
+    """
+    if kind == CATEGORY:
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if kind == STRING:
+        return series if pd.api.types.is_string_dtype(series.dtype) else series.astype('str')
+    if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    if series.dtype == np.float32:
+        if kind != INTEGER:
+            return series
+        series = pd.Series(column_values(series), index=series.index, name=series.name)
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if kind != FLOAT and is_whole(values):
+        return series.astype(narrowest_integer(values))
+    if is_float32_exact(values):
+        return series.astype(np.float32)
+    return series.astype(np.float64)
+
+
+def is_whole(values: np.ndarray) -> bool:
+    """
+    Check whether every value of a float array is a whole number that a float64 holds exactly, or NaN.
+
+    :param values: A float64 array.
+    :return: True if the values can be stored as integers, otherwise False.
+    """
+    present = values[~np.isnan(values)]
+    return bool(np.all(np.abs(present) < 2 ** 53) and np.array_equal(present, np.round(present)))
+
+
+def narrowest_integer(values: np.ndarray) -> pd.api.extensions.ExtensionDtype:
+    """
+    Find the narrowest nullable integer type that holds every value of a float array of whole numbers.
+
+    :param values: A float64 array of whole numbers or NaN.
+    :return: A pandas nullable integer dtype.
+    """
+    present = values[~np.isnan(values)]
+    low, high = (present.min(), present.max()) if present.size else (0, 0)
+    for dtype in INTEGER_DTYPES:
+        limits = np.iinfo(dtype.numpy_dtype)
+        if limits.min <= low and high <= limits.max:
+            return dtype
+    return INTEGER_DTYPES[-1]
+
+
+def is_float32_exact(values: np.ndarray) -> bool:
+    """
+    Check whether every value of a float array is restored exactly from float32 by rounding to FLOAT32_DECIMALS decimals.
+
+    :param values: A float64 array.
+    :return: True if the values can be stored as float32, otherwise False.
+    """
+    with np.errstate(over='ignore', invalid='ignore'):
+        restored = np.round(values.astype(np.float32).astype(np.float64), FLOAT32_DECIMALS)
+    return np.array_equal(restored, values, equal_nan=True)
+
+
+def column_values(series: pd.Series) -> np.ndarray:
+    """
+    Return the values of a numeric column as a NumPy array the rule engine can compare exactly.
+
+    :param series: A numeric series.
+    :return: A float64 array with NaN for missing values, except for integer columns without missing values, which keep
+             their integer type. float32 values are restored to the float64 value of their decimals.
+    """
+    if series.dtype == np.float32:
+        return np.round(series.to_numpy(dtype=np.float64), FLOAT32_DECIMALS)
+    if pd.api.types.is_integer_dtype(series.dtype) and not series.hasnans:
+        return series.to_numpy(dtype=getattr(series.dtype, 'numpy_dtype', series.dtype))
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def float64_columns(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Restore the float32 columns of a table to float64, for exports that print every digit of a float, such as JSON.
+
+    :param dataframe: A DataFrame.
+    :return: A DataFrame, which is dataframe itself if it has no float32 column.
+    """
+    narrow = [column for column in dataframe.columns if dataframe[column].dtype == np.float32]
+    if not narrow:
+        return dataframe
+    return dataframe.assign(**{column: column_values(dataframe[column]) for column in narrow})
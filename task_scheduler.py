@@ -0,0 +1,125 @@
+"""
+A python module with a small dependency-graph scheduler that runs independent pipeline tasks concurrently.
+
+A task is a function that takes a dictionary of the results of its dependencies. Tasks run on a thread pool as soon
+as all of their dependencies have finished, and the scheduler reports each task's wall time and the critical path.
+"""
+
+
+# Imports
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def validate_tasks(tasks: dict) -> None:
+    """
+    Check that every dependency exists and that the tasks do not contain a cycle.
+
+    :param tasks: A dictionary mapping task names to (function, dependencies) tuples.
+    """
+    visiting, visited = set(), set()
+
+    def visit(name: str) -> None:
+        """
+        Visit a task and its dependencies depth first.
+
+        :param name: A string naming the task.
+        """
+        if name not in tasks:
+            raise ValueError(f'Unknown task: {name!r}')
+        if name in visiting:
+            raise ValueError(f'Dependency cycle through task {name!r}')
+        if name not in visited:
+            visiting.add(name)
+            for dependency in tasks[name][1]:
+                visit(dependency)
+            visiting.remove(name)
+            visited.add(name)
+
+    for name in tasks:
+        visit(name)
+
+
+def critical_path(tasks: dict, timings: dict) -> list:
+    """
+    Find the chain of dependent tasks with the longest total wall time.
+
+    :param tasks: A dictionary mapping task names to (function, dependencies) tuples.
+    :param timings: A dictionary mapping task names to (start, end) times.
+    :return: A list containing the task names on the critical path, in execution order.
+    """
+    longest = {}
+
+    def path_to(name: str) -> tuple:
+        """
+        Return the longest path ending at a task.
+
+        :param name: A string naming the task.
+        :return: A tuple containing the total wall time and the list of task names.
+        """
+        if name not in longest:
+            start, end = timings[name]
+            previous = max((path_to(dependency) for dependency in tasks[name][1]), default=(0.0, []))
+            longest[name] = (previous[0] + end - start, previous[1] + [name])
+        return longest[name]
+
+    return max((path_to(name) for name in tasks), default=(0.0, []))[1]
+
+
+def run_tasks(tasks: dict, jobs: int=1) -> tuple:
+    """
+    Run a graph of tasks, starting each one as soon as its dependencies have finished.
+
+    :param tasks: A dictionary mapping task names to (function, dependencies) tuples.
+    :param jobs: An integer representing the number of tasks that may run at once (default 1)
+    :return: A tuple containing a dictionary of results and a dictionary of (start, end) times, both keyed by task name.
+    """
+    validate_tasks(tasks)
+    results, timings = {}, {}
+    remaining = {name: set(dependencies) for name, (_, dependencies) in tasks.items()}
+
+    def run(name: str):
+        """
+        Run a single task and record its wall time.
+
+        :param name: A string naming the task.
+        :return: The result of the task.
+        """
+        function, dependencies = tasks[name]
+        start = time.perf_counter()
+        result = function({dependency: results[dependency] for dependency in dependencies})
+        timings[name] = (start, time.perf_counter())
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        running = {}
+        while remaining or running:
+            for name in [name for name, waiting in remaining.items() if not waiting]:
+                del remaining[name]
+                running[executor.submit(run, name)] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                results[name] = future.result()
+                for waiting in remaining.values():
+                    waiting.discard(name)
+    return results, timings
+
+
+def format_report(tasks: dict, timings: dict) -> str:
+    """
+    Describe the wall time of every task and the critical path.
+
+    :param tasks: A dictionary mapping task names to (function, dependencies) tuples.
+    :param timings: A dictionary mapping task names to (start, end) times.
+    :return: A string containing the report.
+    """
+    origin = min(start for start, _ in timings.values())
+    finish = max(end for _, end in timings.values())
+    lines = [f'{"task":<24}{"start":>10}{"wall":>10}']
+    for name, (start, end) in sorted(timings.items(), key=lambda item: item[1][0]):
+        lines.append(f'{name:<24}{start - origin:>9.3f}s{end - start:>9.3f}s')
+    path = critical_path(tasks, timings)
+    path_time = sum(timings[name][1] - timings[name][0] for name in path)
+    lines.append(f'Total: {finish - origin:.3f}s, critical path: {" -> ".join(path)} ({path_time:.3f}s)')
+    return '\n'.join(lines)
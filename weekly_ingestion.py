@@ -0,0 +1,266 @@
+"""
+A python module that ingests weekly player and team statistics and compiles tables of recent form: the same tables as
+the compiled position CSVs, with the statistics of the last weeks in place of the statistics of the last season.
+
+WEEKLY FILES:
+- WEEKLY_PLAYER_STATS: one row per player and week played, with 'player', 'team', 'position' and 'week' columns and
+  the WEEKLY_SUMS and WEEKLY_MEANS columns the player has (the others may be missing).
+- WEEKLY_TEAM_STATS: one row per team and week, with 'team', 'week' and 'teamTargets' columns.
+
+ROLLING WINDOWS:
+- The rows of a position are scattered into a dense grid with one row per player and one column per week, and the
+  window of every player is the sum of the last WINDOW columns of the grid, computed for all players at once.
+- Counts (WEEKLY_SUMS) are summed over the window, and 'games' counts the weeks played in it. Measurements
+  (WEEKLY_MEANS) are averaged over the weeks they were recorded in, to FLOAT32_DECIMALS decimals.
+- teamTargets is the mean of the team's weekly targets in the weeks the player played, times SEASON_GAMES, so that the
+  trgt% feature (recTarg / ((teamTargets / 17) * games)) is the player's share of their team's targets in the window.
+- A player's team is their team in the last week they played in the window.
+
+The recent statistics of a position are written to RECENT_<POS>_STATS, then compiled by
+fantasy_football_analyzer.position_plan with only the datapoints that add a column the weekly files do not have (ADP,
+age, OL rank) into COMPILED_RECENT_<POS>_DATA. The compiled tables have the columns of the season tables in the same
+order, so the rb_analysis, wr_analysis and qb_analysis filters run on them unchanged.
+"""
+
+
+# Imports
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import build_graph as bg
+import columnar_store as cs
+import fantasy_football_analyzer as ffa
+import merge_dataframes as md
+import player_identity as pi
+import profiler
+import season_config
+import table_schema as sch
+
+
+# Constants
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+WEEKLY_PLAYER_STATS = SEASON_FILES['WEEKLY_PLAYER_STATS']
+WEEKLY_TEAM_STATS = SEASON_FILES['WEEKLY_TEAM_STATS']
+WINDOW = 4
+SEASON_GAMES = 17
+
+# Weekly columns, by how they are aggregated over a window.
+WEEKLY_SUMS = ['recTarg', 'rushCarries', 'forcedMissedTackles']
+WEEKLY_MEANS = ['depthAim', 'rushGrade', 'recGrade', 'offenseGrade']
+WEEKLY_COLUMNS = ['games', 'teamTargets'] + WEEKLY_SUMS + WEEKLY_MEANS
+
+
+def week_grid(rows: np.ndarray, weeks: np.ndarray, values: np.ndarray, shape: tuple) -> np.ndarray:
+    """
+    Scatter weekly values into a grid with one row per player and one column per week, adding up duplicate rows.
+
+    :param rows: An int array of the grid row of every value.
+    :param weeks: An int array of the grid column of every value, starting at 0 for week 1.
+    :param values: A float array of values.
+    :param shape: A tuple containing the number of rows and the number of weeks of the grid.
+    :return: A float array of the given shape, 0 where there is no value.
+    """
+    return np.bincount(rows * shape[1] + weeks, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def window_sums(grid: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum every row of a grid over its last weeks.
+
+    :param grid: A float array with one column per week.
+    :param window: An integer representing the number of weeks in the window.
+    :return: A float array with the sum of the last window columns of every row, added from the last week back.
+    """
+    sums = np.zeros(grid.shape[0])
+    for column in range(grid.shape[1] - 1, max(grid.shape[1] - window, 0) - 1, -1):
+        sums += grid[:, column]
+    return sums
+
+
+def window_mean(rows: np.ndarray, weeks: np.ndarray, values: np.ndarray, shape: tuple, window: int) -> np.ndarray:
+    """
+    Average weekly values over the last weeks of a grid, ignoring missing values.
+
+    :param rows: An int array of the grid row of every value.
+    :param weeks: An int array of the grid column of every value.
+    :param values: A float array of values, with NaN for missing values.
+    :param shape: A tuple containing the number of rows and the number of weeks of the grid.
+    :param window: An integer representing the number of weeks in the window.
+    :return: A float array with one value per row, rounded to FLOAT32_DECIMALS decimals, NaN where the window has no value.
+    """
+    present = ~np.isnan(values)
+    sums = window_sums(week_grid(rows[present], weeks[present], values[present], shape), window)
+    counts = window_sums(week_grid(rows[present], weeks[present], np.ones(int(present.sum())), shape), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.round(np.where(counts > 0, sums / counts, np.nan), sch.FLOAT32_DECIMALS)
+
+
+def team_targets(player_weeks: pd.DataFrame, team_weeks: pd.DataFrame) -> np.ndarray:
+    """
+    Find the targets of the player's team in the week of every weekly row, matching team codes as the datapoints do.
+
+    :param player_weeks: A DataFrame of weekly player rows, with 'team' and 'week' columns.
+    :param team_weeks: A DataFrame of weekly team rows, with 'team', 'week' and 'teamTargets' columns.
+    :return: A float array with one value per player row, NaN where the team or week is not in team_weeks.
+    """
+    team_codes, teams = pd.factorize(team_weeks['team'].astype(str))
+    team_week_numbers = team_weeks['week'].to_numpy(dtype=np.int64)
+    weeks = max(int(team_week_numbers.max(initial=0)), int(player_weeks['week'].max()))
+    targets = np.full((len(teams), weeks), np.nan)
+    targets[team_codes, team_week_numbers - 1] = sch.column_values(team_weeks['teamTargets'])
+
+    player_codes, player_teams = pd.factorize(player_weeks['team'].astype(str))
+    positions, _ = pi.PlayerIdentityIndex(pd.Series(teams, name='team'), 'team').resolve(pd.Series(player_teams))
+    rows = positions[player_codes]
+    found = rows != -1
+    row_targets = np.full(len(rows), np.nan)
+    row_targets[found] = targets[rows[found], player_weeks['week'].to_numpy(dtype=np.int64)[found] - 1]
+    return row_targets
+
+
+def recent_stats(player_weeks: pd.DataFrame, team_weeks: pd.DataFrame, columns: list, window: int=WINDOW, week: int=None) -> pd.DataFrame:
+    """
+    Aggregate the weekly statistics of every player over the window of weeks ending at a week.
+
+    :param player_weeks: A DataFrame of weekly player rows, with 'player', 'team', 'week' and the weekly columns.
+    :param team_weeks: A DataFrame of weekly team rows, with 'team', 'week' and 'teamTargets' columns.
+    :param columns: A list containing the names of the WEEKLY_COLUMNS to compute.
+    :param window: An integer representing the number of weeks in the window (default WINDOW)
+    :param week: An integer representing the last week of the window, or None for the last week of the data (default None)
+    :return: A DataFrame with 'player', 'team' and the columns, with one row per player who played in the window.
+    """
+    week = int(player_weeks['week'].max()) if week is None else week
+    played = player_weeks[(player_weeks['week'] <= week).to_numpy(dtype=bool)]
+    rows, players = pd.factorize(played['player'])
+    weeks = played['week'].to_numpy(dtype=np.int64) - 1
+    shape = (len(players), week)
+
+    games = window_sums((week_grid(rows, weeks, np.ones(len(rows)), shape) > 0).astype(np.float64), window)
+    recent = {'games': games}
+    for column in columns:
+        if column in WEEKLY_SUMS:
+            values = np.nan_to_num(sch.column_values(played[column]).astype(np.float64))
+            recent[column] = window_sums(week_grid(rows, weeks, values, shape), window)
+        elif column in WEEKLY_MEANS:
+            recent[column] = window_mean(rows, weeks, sch.column_values(played[column]).astype(np.float64), shape, window)
+        elif column == 'teamTargets':
+            means = window_mean(rows, weeks, team_targets(played, team_weeks), shape, window)
+            recent[column] = np.round(means * SEASON_GAMES, sch.FLOAT32_DECIMALS)
+
+    in_window = played[(weeks >= week - window).astype(bool)]
+    teams = in_window.sort_values('week', kind='stable').drop_duplicates('player', keep='last').set_index('player')['team']
+    stats = pd.DataFrame({'player': players, 'team': teams.reindex(players).to_numpy()})
+    for column in columns:
+        stats[column] = recent[column]
+    return stats[games > 0].reset_index(drop=True)
+
+
+def recent_pipeline(pipeline: tuple, files: dict) -> tuple:
+    """
+    Describe how the recent table of a position is built from its season pipeline.
+
+    :param pipeline: A tuple of fantasy_football_analyzer.POSITION_PIPELINES.
+    :param files: A dictionary returned by season_config.season_files.
+    :return: A tuple containing the weekly columns to compute, the datapoints still joined from the season files, and
+             the columns of the season table, in order.
+    """
+    _, main_key, necessary_columns, datapoint_specs, _, _, _ = pipeline
+    datapoints = season_config.resolve_datapoints(datapoint_specs, files)
+    season_columns = ffa.position_plan(files[main_key], necessary_columns, datapoints).columns()
+    weekly_columns = [column for column in season_columns if column in WEEKLY_COLUMNS]
+    recent_datapoints = []
+    for csv_name, identifier_index, added_indexes, base_index in datapoints:
+        added = {index: name for index, name in added_indexes.items() if name not in weekly_columns}
+        if added:
+            recent_datapoints.append((csv_name, identifier_index, added, base_index))
+    return weekly_columns, recent_datapoints, season_columns
+
+
+def build_recent_table(pipeline: tuple, files: dict, weekly_tables: dict, window: int=WINDOW, week: int=None, table_cache: md.SourceTableCache=None, manifest: dict=None) -> bool:
+    """
+    Create the recent stats CSV and the compiled recent CSV of a position, unless they were already built from the
+    current weekly files, datapoints, window and week.
+
+    :param pipeline: A tuple of fantasy_football_analyzer.POSITION_PIPELINES.
+    :param files: A dictionary returned by season_config.season_files.
+    :param weekly_tables: A dictionary caching the weekly files by file key, filled on first use.
+    :param window: An integer representing the number of weeks in the window (default WINDOW)
+    :param week: An integer representing the last week of the window, or None for the last week of the data (default None)
+    :param table_cache: A SourceTableCache shared with the other positions, or None to use a private cache (default None)
+    :param manifest: A build manifest shared with the other positions, or None to load and save the manifest file (default None)
+    :return: True if the CSVs were rebuilt, otherwise False.
+    """
+    position = pipeline[0]
+    stats_file, compiled_file = files[f'RECENT_{position}_STATS'], files[f'COMPILED_RECENT_{position}_DATA']
+    weekly_columns, datapoints, season_columns = recent_pipeline(pipeline, files)
+    build_manifest = bg.load_manifest() if manifest is None else manifest
+    inputs = [files['WEEKLY_PLAYER_STATS'], files['WEEKLY_TEAM_STATS']] + [csv_name for csv_name, _, _, _ in datapoints]
+    parameters = {'columns': weekly_columns, 'datapoints': datapoints, 'window': window, 'week': week}
+    if not bg.is_stale(build_manifest, compiled_file, inputs, parameters) and os.path.exists(stats_file):
+        return False
+
+    for file_key in ['WEEKLY_PLAYER_STATS', 'WEEKLY_TEAM_STATS']:
+        if file_key not in weekly_tables:
+            with profiler.stage(f'read {os.path.basename(files[file_key])}', 'read') as details:
+                weekly_tables[file_key] = cs.read_table(files[file_key])
+                details['rowsOut'] = len(weekly_tables[file_key].index)
+    player_weeks = weekly_tables['WEEKLY_PLAYER_STATS']
+    with profiler.stage(f'rolling {position} stats', 'compute', len(player_weeks.index)) as details:
+        position_weeks = player_weeks[(player_weeks['position'] == position).to_numpy(dtype=bool)]
+        stats = recent_stats(position_weeks, weekly_tables['WEEKLY_TEAM_STATS'], weekly_columns, window, week)
+        details['rowsOut'] = len(stats.index)
+    cs.write_table(sch.apply_schema(stats), stats_file)
+
+    plan = ffa.position_plan(stats_file, ['player', 'team'] + weekly_columns, datapoints)
+    compiled = sch.apply_schema(plan.collect(table_cache or md.SourceTableCache())[season_columns])
+    with profiler.stage(f'write {os.path.basename(compiled_file)}', 'write', len(compiled.index)):
+        cs.write_table(compiled, compiled_file)
+    bg.record(build_manifest, compiled_file, inputs, parameters)
+    if manifest is None:
+        bg.save_manifest(build_manifest)
+    return True
+
+
+def build_recent_tables(window: int=WINDOW, week: int=None, files: dict=SEASON_FILES) -> list:
+    """
+    Create the recent stats CSV and the compiled recent CSV of every position.
+
+    :param window: An integer representing the number of weeks in the window (default WINDOW)
+    :param week: An integer representing the last week of the window, or None for the last week of the data (default None)
+    :param files: A dictionary returned by season_config.season_files (default SEASON_FILES)
+    :return: A list containing the positions whose CSVs were rebuilt.
+    """
+    manifest, table_cache, weekly_tables = bg.load_manifest(), md.SourceTableCache(), {}
+    rebuilt = [pipeline[0] for pipeline in ffa.POSITION_PIPELINES if build_recent_table(pipeline, files, weekly_tables, window, week, table_cache, manifest)]
+    bg.save_manifest(manifest)
+    return rebuilt
+
+
+def main() -> None:
+    """
+    Execute the program.
+    """
+    parser = argparse.ArgumentParser(description = 'Compile the position tables from the last weeks of weekly statistics.')
+    parser.add_argument('--window', type = int, default = WINDOW, help = 'The number of weeks to aggregate.')
+    parser.add_argument('--week', type = int, help = 'The last week to aggregate; the last week of the data by default.')
+    arguments = parser.parse_args()
+    if arguments.window < 1:
+        parser.error('--window must be at least 1')
+
+    start = time.perf_counter()
+    rebuilt = build_recent_tables(arguments.window, arguments.week)
+    elapsed = time.perf_counter() - start
+    for position, *_ in ffa.POSITION_PIPELINES:
+        compiled_file = SEASON_FILES[f'COMPILED_RECENT_{position}_DATA']
+        status = 'built' if position in rebuilt else 'up to date'
+        print(f'{compiled_file}: {len(cs.read_table(compiled_file, usecols=["player"]).index)} players ({status})')
+    print(f'Done in {elapsed:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,16 +8,25 @@ import pandas as pd
 import os
 
 import merge_dataframes as md
+import rule_engine
+import season_config
+import table_schema as sch
 
 
 # Constants
-YEAR = 2022
-CALCULATIONS_FOLDER = f'./{YEAR}_calculations'
-COMPILED_WR_DATA = f'./{YEAR - 1}_data/compiled_wr_data.csv'
-BREAKOUT_WR_FILE = f'./{YEAR}_calculations/breakout_receivers.csv'
+YEAR = season_config.YEAR
+SEASON_FILES = season_config.season_files(YEAR)
+CALCULATIONS_FOLDER = SEASON_FILES['CALCULATIONS_FOLDER']
+COMPILED_WR_DATA = SEASON_FILES['COMPILED_WR_DATA']
+BREAKOUT_WR_FILE = SEASON_FILES['BREAKOUT_WR_FILE']
 BREAKOUT_WR_REL_COLUMNS = ['player', 'team', 'games', 'recTarg', 'ADP', 'age', 'teamTargets', 'recGrade']
 
 
+# Compiled Tier Masks
+RULES = rule_engine.load_rules()
+breakout_wr_mask = rule_engine.compile_tier(RULES['tiers']['breakout_wr'], RULES['features'])
+
+
 def remove_non_breakout_wr(dataframe: pd.DataFrame) -> pd.DataFrame:
     """
     Remove WRs that do not have breakout potential from a DataFrame.
@@ -25,11 +34,7 @@ def remove_non_breakout_wr(dataframe: pd.DataFrame) -> pd.DataFrame:
     :param dataframe: A dataframe containing WR player data.
     :return: A dataframe, containing the WRs that have breakout potential.
     """
-    dataframe['trgt%'] = (dataframe['recTarg'] / ((dataframe['teamTargets'] / 17) * dataframe['games'])) * 100
-    dataframe = dataframe[(dataframe['ADP'] >= 30) & (dataframe['ADP'] <= 100)]
-    dataframe = dataframe[dataframe['trgt%'] >= 20]
-    dataframe = dataframe[dataframe['recGrade'] >= 75]
-    dataframe = dataframe[dataframe['age'] <= 25]
+    dataframe = dataframe[breakout_wr_mask(dataframe)]
     removable_elements = [element for element in dataframe.columns if element not in ['player', 'team', 'age', 'ADP']]
     dataframe = dataframe.drop((element for element in removable_elements), axis=1)
     return dataframe
@@ -38,7 +43,7 @@ def remove_non_breakout_wr(dataframe: pd.DataFrame) -> pd.DataFrame:
 def main() -> None:
     # BREAKOUT RECEIVERS
     # Read the relevant columns from the WR Data and store as a Pandas DataFrame.
-    breakout_receiver_candidates = pd.read_csv(COMPILED_WR_DATA, usecols = BREAKOUT_WR_REL_COLUMNS, low_memory = True)
+    breakout_receiver_candidates = sch.apply_schema(pd.read_csv(COMPILED_WR_DATA, usecols = BREAKOUT_WR_REL_COLUMNS, low_memory = True))
 
     # Remove WRs that do not meet the criteria for Breakout Potential.
     breakout_receivers = remove_non_breakout_wr(breakout_receiver_candidates)